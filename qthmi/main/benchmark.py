@@ -0,0 +1,284 @@
+"""Benchmarks of the poll engine.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+Measures how polling, signal dispatch and the BufferConnector scale with the
+number of tags. The PLC is a SimulatedPLCConnector, widgets are created on
+the offscreen Qt platform, so no display or hardware is needed::
+
+    $ python -m qthmi.main.benchmark --tags 100 1000 10000 -o results.json
+
+The JSON output of runs on different commits can be compared directly.
+With C{--modbus} the throughput of the ModbusTCPConnector is measured
+against an in-process ModbusServer.
+
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+from .connector import BufferConnector
+from .modbus import ModbusServer, ModbusTCPConnector, holding_register
+from .simulation import SimulatedPLCConnector
+from .tag import Tag
+
+
+DEFAULT_TAG_COUNTS = (100, 1000, 10000, 100000)
+
+
+def _application() -> QApplication:
+    """Return the QApplication, create one on the offscreen platform if needed."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return QApplication.instance() or QApplication([])
+
+
+def _create_tags(tag_count: int) -> List[Tag]:
+    return [Tag("tag{}".format(i), i, datatype=float) for i in range(tag_count)]
+
+
+def _time_cycles(
+    cycle: Callable[[], Any],
+    min_time: float,
+    min_cycles: int = 3,
+    setup: Optional[Callable[[], Any]] = None,
+) -> float:
+    """Call C{cycle} repeatedly and return the mean time per call in seconds.
+
+    :param setup: called before every cycle, not included in the time
+
+    """
+    count = 0
+    elapsed = 0.0
+    while True:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        cycle()
+        elapsed += time.perf_counter() - start
+        count += 1
+        if count >= min_cycles and elapsed >= min_time:
+            return elapsed / count
+
+
+def memory_per_tag(tag_count: int) -> float:
+    """Return the Python heap used per tag added to a connector in bytes.
+
+    Memory allocated by Qt outside of the Python heap is not included.
+
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        connector = SimulatedPLCConnector(size=tag_count)
+        connector.add_tags(_create_tags(tag_count))
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return used / tag_count
+
+
+def bench_poll(
+    tag_count: int,
+    widgets: bool = False,
+    latency: float = 0.0,
+    min_time: float = 0.5,
+) -> Dict[str, Any]:
+    """Benchmark C{poll()} of a connector with C{tag_count} tags.
+
+    Every tag is polled twice per measurement: once with unchanged values and
+    once with all values changed. The difference is the cost of dispatching
+    the change signals.
+
+    :param widgets: bind a HMILabel to every tag
+    :param latency: latency of every PLC request in seconds
+    :param min_time: minimum measuring time per phase in seconds
+
+    """
+    from .widgets import HMILabel
+
+    app = _application()  # noqa: F841
+    connector = SimulatedPLCConnector(size=tag_count, latency=latency)
+    tags = _create_tags(tag_count)
+    connector.add_tags(tags)
+    labels = [HMILabel(tag) for tag in tags] if widgets else []
+
+    connector.poll()
+    idle = _time_cycles(connector.poll, min_time)
+
+    def changing_cycle() -> None:
+        connector.memory += 1.0
+        connector.poll()
+
+    busy = _time_cycles(changing_cycle, min_time)
+    del labels
+
+    return {
+        "benchmark": "poll",
+        "tags": tag_count,
+        "widgets": widgets,
+        "latency": latency,
+        "cycle_time": idle,
+        "cycles_per_second": 1.0 / idle,
+        "seconds_per_tag": idle / tag_count,
+        "changed_cycle_time": busy,
+        "dispatch_per_tag": max(0.0, busy - idle) / tag_count,
+    }
+
+
+def bench_buffer(tag_count: int, min_time: float = 0.5) -> Dict[str, Any]:
+    """Benchmark C{poll()} of a BufferConnector buffering C{tag_count} tags.
+
+    All values of the source change before every cycle, so every buffered
+    tag is copied. Polling the source is not included in the time.
+
+    """
+    source = SimulatedPLCConnector(size=tag_count)
+    source.add_tags(_create_tags(tag_count))
+    source.poll()
+
+    buffer = BufferConnector(source)
+    buffer.add_tags([Tag(name, name) for name in source.tags])
+
+    def change_source() -> None:
+        source.memory += 1.0
+        source.poll()
+
+    cycle_time = _time_cycles(buffer.poll, min_time, setup=change_source)
+
+    return {
+        "benchmark": "buffer",
+        "tags": tag_count,
+        "cycle_time": cycle_time,
+        "cycles_per_second": 1.0 / cycle_time,
+        "seconds_per_tag": cycle_time / tag_count,
+    }
+
+
+def bench_modbus(
+    tag_count: int,
+    latency: float = 0.0,
+    min_time: float = 0.5,
+    max_in_flight: int = 8,
+) -> Dict[str, Any]:
+    """Benchmark C{poll()} of a ModbusTCPConnector over the loopback device.
+
+    :param latency: delay of each response of the server in seconds
+    :param max_in_flight: requests sent before waiting for responses
+
+    """
+    server = ModbusServer(latency=latency)
+    server.start()
+    connector = ModbusTCPConnector(*server.address, max_in_flight=max_in_flight)
+    try:
+        connector.add_tags([
+            Tag("tag{}".format(i), holding_register(i % 65536), datatype=int)
+            for i in range(tag_count)
+        ])
+        connector.poll()
+        requests = connector.requests
+        cycle_time = _time_cycles(connector.poll, min_time)
+    finally:
+        connector.close()
+        server.stop()
+
+    return {
+        "benchmark": "modbus",
+        "tags": tag_count,
+        "latency": latency,
+        "max_in_flight": max_in_flight,
+        "cycle_time": cycle_time,
+        "cycles_per_second": 1.0 / cycle_time,
+        "seconds_per_tag": cycle_time / tag_count,
+        "requests_per_cycle": requests,
+        "requests_per_second": requests / cycle_time,
+    }
+
+
+def run(
+    tag_counts: Sequence[int] = DEFAULT_TAG_COUNTS,
+    latencies: Sequence[float] = (0.0,),
+    min_time: float = 0.5,
+    widgets: bool = True,
+    log: Optional[Callable[[str], Any]] = None,
+    modbus: bool = False,
+) -> Dict[str, Any]:
+    """Run all benchmarks and return the results.
+
+    :param tag_counts: numbers of tags to benchmark
+    :param latencies: simulated PLC latencies in seconds
+    :param min_time: minimum measuring time per phase in seconds
+    :param widgets: also benchmark with a widget bound to every tag
+    :param log: called with a line of text after each benchmark
+    :param modbus: also benchmark the ModbusTCPConnector
+
+    """
+    app = _application()  # noqa: F841
+    results: List[Dict[str, Any]] = []
+
+    def add(result: Dict[str, Any]) -> None:
+        results.append(result)
+        if log is not None:
+            name = result["benchmark"] + ("+widgets" if result.get("widgets") else "")
+            log("{:>12} {:>7} tags: {:10.1f} cycles/s, {:8.3f} us/tag".format(
+                name, result["tags"], result["cycles_per_second"],
+                result["seconds_per_tag"] * 1e6))
+
+    for tag_count in tag_counts:
+        for latency in latencies:
+            for bound in ((False, True) if widgets else (False,)):
+                result = bench_poll(tag_count, bound, latency, min_time)
+                result["bytes_per_tag"] = memory_per_tag(tag_count)
+                add(result)
+        add(bench_buffer(tag_count, min_time))
+        if modbus:
+            for latency in latencies:
+                add(bench_modbus(tag_count, latency, min_time))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, nargs="+", default=DEFAULT_TAG_COUNTS,
+                        help="numbers of tags")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0],
+                        help="simulated PLC latencies in seconds")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="minimum measuring time per benchmark in seconds")
+    parser.add_argument("--no-widgets", action="store_true",
+                        help="skip the benchmarks with bound widgets")
+    parser.add_argument("--modbus", action="store_true",
+                        help="benchmark the Modbus/TCP connector, the latencies "
+                        "are applied to the server responses")
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    results = run(args.tags, args.latency, args.min_time, not args.no_widgets,
+                  log=lambda line: print(line, file=sys.stderr),
+                  modbus=args.modbus)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
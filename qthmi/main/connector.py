@@ -8,9 +8,26 @@
 :last modified time: 2018-07-10 08:31:59
 
 """
-from typing import Callable, Any, Dict, Iterable
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+from typing import Callable, Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from functools import reduce
+from math import gcd
+import threading
+import time
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal, pyqtSlot
+import numpy as np
 from .tag import Tag
+from .tagtable import TableTag, TagTable, plan_table_blocks
+from .datatypes import DatatypeRegistry
+from .history import TagHistory
+from .diagnostics import CycleRecord, PollStatistics
+
+
+SpanFunction = Callable[[Tag], Tuple[int, int]]
+DEFAULT_SCAN_GROUP = "default"
+
+CONNECTED = "connected"
+DEGRADED = "degraded"
+DOWN = "down"
 
 
 class ConnectionError(Exception):
@@ -19,6 +36,19 @@ class ConnectionError(Exception):
     pass
 
 
+class TransportError(ConnectionError):
+    """Error class for failures of the connection itself, e.g. timeouts.
+
+    Other connection errors only affect the tag or block that raised them,
+    a TransportError aborts the cycle in C{fail_fast} mode and counts as a
+    failed cycle of the connection, see
+    C{AbstractPLCConnector.update_connection_state()}.
+
+    """
+
+    pass
+
+
 def abstractmethod(method: Callable) -> Callable:
     """Make a function an abstact method.
 
@@ -33,6 +63,339 @@ def abstractmethod(method: Callable) -> Callable:
     return default_abstract_method
 
 
+class ReadBlock(object):
+    """Contiguous range of PLC addresses that is read with one request.
+
+    :type start: int
+    :ivar start: first address of the block
+
+    :type length: int
+    :ivar length: number of address units covered by the block
+
+    :type tags: list(Tag)
+    :ivar tags: Tags located inside the block, sorted by address
+
+    """
+
+    def __init__(self, start: int, length: int, tags: List[Tag] = None) -> None:
+        self.start = start
+        self.length = length
+        self.tags: List[Tag] = [] if tags is None else tags
+
+    def __repr__(self) -> str:
+        """Return readable representation."""
+        return "<ReadBlock start={} length={} tags={}>".format(
+            self.start, self.length, len(self.tags)
+        )
+
+
+def plan_blocks(
+    tags: Iterable[Tag],
+    span: SpanFunction,
+    max_gap: int = 0,
+    max_length: Optional[int] = None,
+) -> List[ReadBlock]:
+    """Merge the addresses of the given tags into contiguous blocks.
+
+    Tags are sorted by their start address. A tag is appended to the current
+    block if the gap between the end of the block and the tag is not bigger
+    than C{max_gap} and the resulting block does not exceed C{max_length}.
+
+    :param tags: tags to be planned
+    :param span: function returning the tuple (start, size) of a tag
+    :param max_gap: maximum number of unused address units inside a block
+    :param max_length: maximum length of a block, None for no limit
+    :return: list of ReadBlock objects
+
+    """
+    spans = sorted(((span(tag), tag) for tag in tags), key=lambda x: x[0][0])
+    blocks: List[ReadBlock] = []
+    end = 0
+
+    for (start, size), tag in spans:
+        if blocks:
+            block = blocks[-1]
+            new_end = max(end, start + size)
+            if start - end <= max_gap and (
+                max_length is None or new_end - block.start <= max_length
+            ):
+                block.tags.append(tag)
+                block.length = new_end - block.start
+                end = new_end
+                continue
+
+        blocks.append(ReadBlock(start, size, [tag]))
+        end = start + size
+
+    return blocks
+
+
+class ScanGroup(object):
+    """Named group of tags that is polled with its own interval.
+
+    Tags are assigned to a group by setting C{Tag.scan_group} to the group
+    name. All times are measured in seconds with a monotonic clock.
+
+    :type name: str
+    :ivar name: group name
+
+    :type interval: int
+    :ivar interval: poll interval in ms, 0 disables polling of the group
+
+    :type cycles: int
+    :ivar cycles: number of finished cycles
+
+    :type last_cycle_time: float
+    :ivar last_cycle_time: duration of the last cycle
+
+    :type max_cycle_time: float
+    :ivar max_cycle_time: longest cycle duration
+
+    :type overruns: int
+    :ivar overruns: number of cycles that took longer than the interval or
+                    missed their scheduled time
+
+    """
+
+    def __init__(self, name: str, interval: int = 0) -> None:
+        self.name = name
+        self.interval = interval
+        self.next_due = time.monotonic()
+        self.reset_statistics()
+
+    def reset_statistics(self) -> None:
+        """Reset the cycle statistics."""
+        self.cycles = 0
+        self.last_cycle_time = 0.0
+        self.max_cycle_time = 0.0
+        self.total_cycle_time = 0.0
+        self.overruns = 0
+
+    @property
+    def mean_cycle_time(self) -> float:
+        """Return mean cycle duration."""
+        return self.total_cycle_time / self.cycles if self.cycles else 0.0
+
+    def is_due(self, now: float, tolerance: float) -> bool:
+        """Return True if the group needs to be polled at time C{now}."""
+        return self.interval > 0 and now >= self.next_due - tolerance
+
+    def schedule(self, now: float, scale: float = 1.0) -> None:
+        """Calculate the next due time after the group has been started.
+
+        Missed due times are skipped and counted as overrun.
+
+        :param now: start time of the group
+        :param scale: factor applied to the interval
+
+        """
+        interval = self.interval * scale / 1000.0
+        self.next_due += interval
+        if self.next_due < now:
+            self.overruns += 1
+            self.next_due = now + interval
+
+    def add_cycle(self, cycle_time: float) -> None:
+        """Add the duration of a finished cycle to the statistics."""
+        self.cycles += 1
+        self.last_cycle_time = cycle_time
+        self.total_cycle_time += cycle_time
+        self.max_cycle_time = max(self.max_cycle_time, cycle_time)
+        if cycle_time > self.interval / 1000.0:
+            self.overruns += 1
+
+
+class PollCycle(object):
+    """Data exchanged with the PLC during one poll cycle.
+
+    :type reads: list(Tag)
+    :ivar reads: tags to be read
+
+    :type writes: list
+    :ivar writes: (tag, raw_value) tuples to be written
+
+    :type values: list
+    :ivar values: (tag, raw_value) tuples read from the PLC
+
+    :type failed_writes: list(Tag)
+    :ivar failed_writes: tags that could not be written
+
+    :type errors: list(str)
+    :ivar errors: messages of all connection errors
+
+    :type groups: list(ScanGroup)
+    :ivar groups: scan groups polled in this cycle
+
+    :type started: float
+    :ivar started: start time of the cycle, see C{time.perf_counter()}
+
+    :type read_time: float
+    :ivar read_time: time spent reading in seconds
+
+    :type write_time: float
+    :ivar write_time: time spent writing in seconds
+
+    :type jitter: float
+    :ivar jitter: deviation of the timer tick from the timer interval in
+                  seconds, None if the cycle has not been started by the timer
+
+    :type dirty_since: dict
+    :ivar dirty_since: time of the first change of each written tag
+
+    :type write_done: float
+    :ivar write_done: time all writes were finished
+
+    :type table_reads: list
+    :ivar table_reads: (table, rows) tuples of TagTable rows to be read
+
+    :type table_values: list
+    :ivar table_values: (table, rows, values) tuples read from the PLC
+
+    :type aborted: bool
+    :ivar aborted: set if the cycle was aborted after a TransportError
+
+    :type transport_failed: bool
+    :ivar transport_failed: set if a TransportError occurred
+
+    :type retry: bool
+    :ivar retry: set for the first cycle after the connection went down,
+                 C{reconnect()} is called before the exchange
+
+    """
+
+    def __init__(
+        self,
+        reads: List[Tag],
+        writes: List[Tuple[Tag, Any]],
+        groups: List[ScanGroup] = None,
+    ) -> None:
+        self.reads = reads
+        self.writes = writes
+        self.groups: List[ScanGroup] = [] if groups is None else groups
+        self.started = time.perf_counter()
+        self.read_time = 0.0
+        self.write_time = 0.0
+        self.jitter: Optional[float] = None
+        self.values: List[Tuple[Tag, Any]] = []
+        self.failed_writes: List[Tag] = []
+        self.errors: List[str] = []
+        self.dirty_since: Dict[Tag, float] = {}
+        self.write_done = 0.0
+        self.table_reads: List[Tuple[TagTable, np.ndarray]] = []
+        self.table_values: List[Tuple[TagTable, np.ndarray, Any]] = []
+        self.aborted = False
+        self.transport_failed = False
+        self.retry = False
+
+    @property
+    def tag_count(self) -> int:
+        """Return number of tags and table rows read and written."""
+        rows = sum(len(rows) for _, rows in self.table_reads)
+        return len(self.reads) + len(self.writes) + rows
+
+
+class ChangeSet(object):
+    """Tags and table rows whose raw values changed in one poll cycle.
+
+    :type tags: list(Tag)
+    :ivar tags: changed tags
+
+    :type rows: list
+    :ivar rows: (table, indices) tuples of changed TagTable rows
+
+    """
+
+    def __init__(self, tags: List[Tag] = None) -> None:
+        self.tags: List[Tag] = [] if tags is None else tags
+        self.rows: List[Tuple[TagTable, np.ndarray]] = []
+
+    def __bool__(self) -> bool:
+        """Return True if anything changed."""
+        return bool(self.tags or self.rows)
+
+    def __len__(self) -> int:
+        """Return number of changed tags and rows."""
+        return len(self.tags) + sum(len(rows) for _, rows in self.rows)
+
+
+class TagDispatcher(QObject):
+    """Route the changes of a poll cycle to bound callbacks.
+
+    The dispatcher listens to C{tags_changed()} of a connector and calls the
+    callbacks of all changed tags. Together with
+    C{AbstractPLCConnector.emit_tag_signals = False} this replaces one
+    C{value_changed()} emission per changed tag by one signal per cycle::
+
+        >>> dispatcher = TagDispatcher(connector)
+        >>> dispatcher.bind_widget(label)
+
+    """
+
+    def __init__(self, connector: 'AbstractPLCConnector') -> None:
+        super(TagDispatcher, self).__init__(connector)
+        self._callbacks: Dict[Tag, List[Callable[[], Any]]] = {}
+        self._table_views: Dict[TagTable, Dict[int, Tag]] = {}
+        connector.tags_changed.connect(self.dispatch)
+
+    def bind(self, tag: Tag, callback: Callable[[], Any]) -> None:
+        """Call callback whenever the raw value of the tag changes."""
+        self._callbacks.setdefault(tag, []).append(callback)
+        table = getattr(tag, "table", None)
+        if table is not None:
+            self._table_views.setdefault(table, {})[tag.index] = tag  # type: ignore
+
+    def bind_widget(self, widget: Any) -> None:
+        """Bind C{widget.read_value_from_tag()} to the tag of a HMI object."""
+        self.bind(widget.tag, widget.read_value_from_tag)
+
+    def unbind(self, tag: Tag) -> None:
+        """Remove all callbacks of the tag."""
+        self._callbacks.pop(tag, None)
+        table = getattr(tag, "table", None)
+        if table is not None:
+            self._table_views.get(table, {}).pop(tag.index, None)  # type: ignore
+
+    def dispatch(self, changes: ChangeSet) -> None:
+        """Call the callbacks of all changed tags and table rows."""
+        callbacks = self._callbacks
+        for tag in changes.tags:
+            for callback in callbacks.get(tag, ()):
+                callback()
+
+        for table, rows in changes.rows:
+            views = self._table_views.get(table)
+            if not views:
+                continue
+            bound = np.fromiter(views, np.int64, len(views))
+            for index in bound[np.isin(bound, rows)].tolist():
+                for callback in callbacks.get(views[index], ()):
+                    callback()
+
+
+class PollWorker(QObject):
+    """Exchange the data of poll cycles in a worker thread."""
+
+    finished = pyqtSignal(object)
+    written = pyqtSignal(object)
+
+    def __init__(self, connector: 'AbstractPLCConnector') -> None:
+        super(PollWorker, self).__init__()
+        self.connector = connector
+
+    @pyqtSlot(object)
+    def run(self, cycle: PollCycle) -> None:
+        """Exchange the data of the cycle and emit C{finished(cycle)}."""
+        self.connector.exchange(cycle)
+        self.finished.emit(cycle)
+
+    @pyqtSlot(object)
+    def write(self, cycle: PollCycle) -> None:
+        """Write the data of the cycle and emit C{written(cycle)}."""
+        with self.connector._io_lock:
+            self.connector.write_tags(cycle)
+        self.written.emit(cycle)
+
+
 class AbstractPLCConnector(QObject, object):
     """Connector with buffered PLC access.
 
@@ -45,58 +408,890 @@ class AbstractPLCConnector(QObject, object):
 
     :type poll_interval: int
     :ivar poll_interval: interval for auto-polling in ms
+
+    :type block_gap: int
+    :ivar block_gap: maximum number of unused addresses merged into one block
+                     read, only used if C{read_block()} is implemented
+
+    :type max_block_length: int
+    :ivar max_block_length: maximum length of one block read, None for no
+                            limit
+
+    :type datatypes: DatatypeRegistry
+    :ivar datatypes: decodes and encodes the buffers of block reads and
+                     writes according to C{Tag.plc_datatype}, None to use
+                     the buffer items as raw values
+
+    :type emit_tag_signals: bool
+    :ivar emit_tag_signals: emit C{value_changed()} of every changed tag after
+                            a cycle, C{tags_changed()} is always emitted
+
+    :type write_through: bool
+    :ivar write_through: write changed tags with C{Tag.high_priority} set
+                         immediately instead of waiting for the next cycle
+
+    :type tables: list(TagTable)
+    :ivar tables: array-backed tag tables polled by the connector
+
+    :type processors: list
+    :ivar processors: objects with a C{process(changes)} method called after
+                      each cycle before any signal is emitted, see
+                      C{add_processor()}
+
+    :type statistics: PollStatistics
+    :ivar statistics: rolling metrics of the last poll cycles
+
+    :type emit_statistics: bool
+    :ivar emit_statistics: emit C{cycleMeasured(record)} after each cycle
+
+    :type poll_subscribed_only: bool
+    :ivar poll_subscribed_only: only read tags with subscribers or the
+                                C{always_poll} flag set, see
+                                C{Tag.subscribe()}
+
+    :type interval_scale: float
+    :ivar interval_scale: factor applied to the intervals of all scan groups,
+                          set in adaptive mode
+
+    :type scan_groups: dict
+    :ivar scan_groups: holds the ScanGroup objects, the key is the group name.
+                       Tags without a valid C{scan_group} belong to the
+                       C{DEFAULT_SCAN_GROUP}.
+
+    :type fail_fast: bool
+    :ivar fail_fast: abort a cycle on the first C{TransportError} instead of
+                     trying every remaining tag, other connection errors
+                     never abort a cycle
+
+    :type connection_state: str
+    :ivar connection_state: C{CONNECTED}, C{DEGRADED} after failed cycles or
+                            C{DOWN} after C{failure_threshold} failed cycles
+                            in a row
+
+    :type failure_count: int
+    :ivar failure_count: number of failed cycles in a row
+
+    :type failure_threshold: int
+    :ivar failure_threshold: failed cycles in a row until the connection is
+                             considered down
+
+    :type backoff_initial: float
+    :ivar backoff_initial: time in seconds until the first retry after the
+                           connection went down
+
+    :type backoff_max: float
+    :ivar backoff_max: maximum time in seconds between two retries, the time
+                       is doubled after each failed retry
+
+    :type notified_tags: dict
+    :ivar notified_tags: tags updated by change notifications of the PLC
+                         instead of polling, see C{add_notification()}
     """
 
     polled = pyqtSignal()
+    tags_changed = pyqtSignal(object)
     connectionError = pyqtSignal(str)
+    connectionStateChanged = pyqtSignal(str)
+    cycleMeasured = pyqtSignal(object)
+    intervalChanged = pyqtSignal(int)
+    _cycle_requested = pyqtSignal(object)
+    _writes_requested = pyqtSignal(object)
+    _notifications_ready = pyqtSignal()
 
     def __init__(self) -> None:
         super(AbstractPLCConnector, self).__init__()
         self.tags: Dict[str, Tag] = dict()
+        self.tables: List[TagTable] = []
+        self.processors: List[Any] = []
+        self.emit_tag_signals = True
+        self.write_through = False
+        self._pending_writes: Dict[Tag, None] = {}
+        self.block_gap = 16
+        self.poll_subscribed_only = False
+        self.max_block_length: Optional[int] = None
+        self.datatypes: Optional[DatatypeRegistry] = None
         self.autopoll_timer = QTimer(self)
-        self.autopoll_timer.timeout.connect(self.poll)
+        self.autopoll_timer.timeout.connect(self._on_autopoll_timeout)
+        self.scan_groups: Dict[str, ScanGroup] = {
+            DEFAULT_SCAN_GROUP: ScanGroup(DEFAULT_SCAN_GROUP)
+        }
+        self._thread: Optional[QThread] = None
+        self._worker: Optional[PollWorker] = None
+        self._pending_cycle = False
+        self._last_tick: Optional[float] = None
+        self.statistics = PollStatistics()
+        self.emit_statistics = False
+        self.interval_scale = 1.0
+        self._adaptive: Optional[Tuple[int, int]] = None
+        self.fail_fast = True
+        self.connection_state = CONNECTED
+        self.failure_count = 0
+        self.failure_threshold = 3
+        self.backoff_initial = 0.5
+        self.backoff_max = 30.0
+        self._retry_at = 0.0
+        self.notified_tags: Dict[Tag, None] = {}
+        self._notifications: Dict[Tag, Any] = {}
+        self._notify_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._notifications_ready.connect(
+            self._apply_notifications, Qt.QueuedConnection
+        )
 
     def add_tag(self, tag: Tag) -> Tag:
         """Add a Tag to the list."""
         self.tags[tag.name] = tag
+        tag.dirtied.connect(self._on_tag_dirtied)
         return tag
 
     def add_tags(self, tags: Iterable) -> None:
         """Add multiple tags to the internal list."""
         list(map(self.add_tag, tags))
 
+    def add_table(self, table: TagTable) -> TagTable:
+        """Add a TagTable, all its rows are polled with the connector."""
+        self.tables.append(table)
+        return table
+
+    def add_processor(self, processor: Any) -> Any:
+        """Add an object processing the changes of every cycle.
+
+        C{processor.process(changes)} is called with the ChangeSet of each
+        finished cycle after all raw values have been updated and before any
+        signal is emitted. Processors may add tags to the ChangeSet.
+
+        """
+        self.processors.append(processor)
+        return processor
+
+    def remove_processor(self, processor: Any) -> None:
+        """Remove a processor added with C{add_processor()}."""
+        self.processors.remove(processor)
+
     @property
     def cycletime(self) -> int:
-        """Return current cycletime."""
-        return self.autopoll_timer.interval()
+        """Return current cycletime of the default scan group."""
+        return self.scan_groups[DEFAULT_SCAN_GROUP].interval
 
     def remove_tag(self, tag_name: str) -> None:
         """Remove a Tag from the list."""
-        self.tags.pop(tag_name)
+        if self.tags[tag_name] in self.notified_tags:
+            self.remove_notification(self.tags[tag_name])
+        tag = self.tags.pop(tag_name)
+        tag.dirtied.disconnect(self._on_tag_dirtied)
+        self._pending_writes.pop(tag, None)
 
-    def poll(self) -> None:
+    @property
+    def suppressed_count(self) -> int:
+        """Return number of suppressed C{value_changed()} emissions of all tags."""
+        return sum(tag.suppressed_count for tag in self.tags.values())
+
+    @property
+    def supports_block_read(self) -> bool:
+        """Return True if the connector implements C{read_block()}."""
+        return type(self).read_block is not AbstractPLCConnector.read_block
+
+    @property
+    def supports_block_write(self) -> bool:
+        """Return True if the connector implements C{write_block()}."""
+        return type(self).write_block is not AbstractPLCConnector.write_block
+
+    def add_scan_group(self, name: str, interval: int) -> ScanGroup:
+        """Add or replace a scan group.
+
+        :param name: group name, assign tags via C{Tag.scan_group}
+        :param interval: poll interval of the group in ms
+
+        """
+        group = ScanGroup(name, interval)
+        self.scan_groups[name] = group
+        self._update_scheduler()
+        return group
+
+    def remove_scan_group(self, name: str) -> None:
+        """Remove a scan group, its tags fall back to the default group."""
+        if name != DEFAULT_SCAN_GROUP:
+            self.scan_groups.pop(name)
+            self._update_scheduler()
+
+    @property
+    def supports_notifications(self) -> bool:
+        """Return True if the connector implements C{subscribe_notification()}."""
+        return (
+            type(self).subscribe_notification
+            is not AbstractPLCConnector.subscribe_notification
+        )
+
+    def add_notification(self, tag: Tag) -> None:
+        """Update a tag by change notifications of the PLC instead of polling.
+
+        The tag is no longer read by auto-polling and C{poll()}, changes of
+        its value are still written by the poll cycles.
+
+        :raises NotImplementedError: if the connector does not support
+                                     notifications
+
+        """
+        if not self.supports_notifications:
+            raise NotImplementedError(
+                "{} does not support notifications".format(type(self).__name__)
+            )
+        self.subscribe_notification(tag)
+        self.notified_tags[tag] = None
+
+    def remove_notification(self, tag: Tag) -> None:
+        """Poll a tag added with C{add_notification()} again."""
+        del self.notified_tags[tag]
+        self.unsubscribe_notification(tag)
+        with self._notify_lock:
+            self._notifications.pop(tag, None)
+
+    def subscribe_notification(self, tag: Tag) -> None:
+        """Register a change notification for the tag at the PLC.
+
+        Overwrite to support notifications. The connector calls
+        C{notify(tag, raw_value)} whenever the PLC reports a new value, from
+        any thread.
+
+        """
+        raise NotImplementedError
+
+    def unsubscribe_notification(self, tag: Tag) -> None:
+        """Remove the change notification of the tag at the PLC."""
+        pass
+
+    def notify(self, tag: Tag, raw_value: Any) -> None:
+        """Queue a value reported by a change notification.
+
+        Thread-safe, usually called from the I/O thread of the connector. The
+        queued values are applied as one batch by the event loop of the GUI
+        thread, only the last value of a tag is kept until then.
+
+        """
+        with self._notify_lock:
+            first = not self._notifications
+            self._notifications[tag] = raw_value
+        if first:
+            self._notifications_ready.emit()
+
+    def _apply_notifications(self) -> None:
+        """Apply all queued notifications like the values of a poll cycle."""
+        with self._notify_lock:
+            notifications = self._notifications
+            self._notifications = {}
+
+        changes = ChangeSet()
+        for tag, raw_value in notifications.items():
+            if not tag.dirty and tag.update_raw_value(raw_value):
+                changes.tags.append(tag)
+        self._emit_changes(changes)
+
+    def is_polled(self, tag: Tag) -> bool:
+        """Return True if the tag is read by auto-polling and C{poll()}."""
+        if tag.write_only or tag in self.notified_tags:
+            return False
+        if self.poll_subscribed_only:
+            return tag.always_poll or tag.subscribed
+        return True
+
+    def scan_group_of(self, tag: Union[Tag, TagTable]) -> ScanGroup:
+        """Return the scan group the tag or table belongs to."""
+        group = self.scan_groups.get(tag.scan_group)  # type: ignore
+        if group is None:
+            return self.scan_groups[DEFAULT_SCAN_GROUP]
+        return group
+
+    def poll(self, tags: Iterable[Tag] = None) -> None:
         """Exchange data with PLC.
 
-        If a Tag value has been modified in the GUI the value is first written
-        to the PLC and then read again.
+        All Tag values that have been modified in the GUI are written to the
+        PLC first, see C{write_tags()}. Afterwards all tags selected by
+        C{is_polled()} are read in one pass, see C{read_tags()}.
+
+        The PLC is always accessed from the calling thread. Use
+        C{request_poll()} to respect the threaded mode. In threaded mode a
+        cycle running in the worker thread is finished first, see
+        C{exchange()}.
+
+        The pyqtSignal C{polled()} is emitted when finished. Nothing is done
+        while the connection is down and the next retry is not due, see
+        C{circuit_open}.
 
-        The pyqtSignal C{polled()} is emitted when finished.
+        :param tags: tags to be read, all tags if None
 
         """
+        if not self.circuit_open:
+            cycle = self.prepare_cycle(tags)
+            self.exchange(cycle)
+            self.finish_cycle(cycle)
+
+    def request_poll(self, tags: Iterable[Tag] = None) -> None:
+        """Start a poll cycle.
+
+        In threaded mode the PLC is accessed by the worker thread and the
+        results are applied when the cycle is finished. If the previous cycle
+        is still running no new cycle is started. Otherwise C{poll()} is
+        called.
+
+        :param tags: tags to be read, all tags if None
+
+        """
+        if self.circuit_open:
+            return
+        if self._worker is None or not self._pending_cycle:
+            self._poll(self.prepare_cycle(tags))
+
+    def _poll(self, cycle: PollCycle) -> None:
+        if self._worker is None:
+            self.exchange(cycle)
+            self.finish_cycle(cycle)
+        else:
+            self._pending_cycle = True
+            self._cycle_requested.emit(cycle)
+
+    def _on_worker_finished(self, cycle: PollCycle) -> None:
+        self._pending_cycle = False
+        self.finish_cycle(cycle)
+
+    def _on_autopoll_timeout(self) -> None:
+        """Poll all scan groups that are due in one cycle."""
+        now = time.monotonic()
+        jitter = None
+        if self._last_tick is not None:
+            jitter = now - self._last_tick - self.autopoll_timer.interval() / 1000.0
+        self._last_tick = now
+
+        tolerance = self.autopoll_timer.interval() / 2000.0
+        due = [g for g in self.scan_groups.values() if g.is_due(now, tolerance)]
+        if not due:
+            return
+
+        for group in due:
+            group.schedule(now, self.interval_scale)
+
+        if self.circuit_open:
+            return
+
+        if self._worker is not None and self._pending_cycle:
+            for group in due:
+                group.overruns += 1
+            return
+
+        if len(due) == len(self.scan_groups) and not self.tables:
+            tags: Optional[List[Tag]] = None
+        else:
+            tags = [
+                tag for tag in self.tags.values()
+                if self.scan_group_of(tag) in due and self.is_polled(tag)
+            ]
+
+        cycle = self.prepare_cycle(tags, due)
+        cycle.jitter = jitter
+        self._poll(cycle)
+
+    def prepare_cycle(
+        self, tags: Iterable[Tag] = None, groups: List[ScanGroup] = None
+    ) -> PollCycle:
+        """Collect the tags to be exchanged in the next cycle.
+
+        The raw values of all dirty tags are copied so the GUI can go on
+        changing them while the cycle is running. Dirty tags are always
+        written, regardless of the tags to be read. Must be called from the
+        GUI thread.
+
+        :param tags: tags to be read, all tags selected by C{is_polled()} if
+                     None
+        :param groups: scan groups polled with this cycle
+
+        """
+        if tags is None:
+            reads = [tag for tag in self.tags.values() if self.is_polled(tag)]
+        else:
+            reads = [tag for tag in tags if not tag.write_only]
+
+        cycle = PollCycle(reads, [], groups)
+        cycle.retry = self.connection_state == DOWN
+        self._pending_writes.clear()
+
         for tag in self.tags.values():
+            if tag.dirty:
+                self._take_write(cycle, tag)
+
+        for table in self.tables:
+            for view in table.views:
+                if view.dirty:
+                    self._take_write(cycle, view)
+
+        if tags is None or groups is not None:
+            for table in self.tables:
+                if groups is None or self.scan_group_of(table) in groups:
+                    rows = table.rows(self.poll_subscribed_only)
+                    if len(rows):
+                        cycle.table_reads.append((table, rows))
+
+        return cycle
+
+    def _take_write(self, cycle: PollCycle, tag: Tag) -> None:
+        """Copy the raw value of a dirty tag to the cycle and mark it clean."""
+        cycle.writes.append((tag, tag.raw_value))
+        if tag.dirty_since is not None:
+            cycle.dirty_since[tag] = tag.dirty_since
+        tag.dirty = False
+        tag.dirty_since = None
+
+    def _on_tag_dirtied(self) -> None:
+        tag = self.sender()
+        if not self.write_through or not tag.high_priority:
+            return
+
+        if not self._pending_writes:
+            QTimer.singleShot(0, self.flush_writes)
+        self._pending_writes[tag] = None
+
+    def flush_writes(self) -> None:
+        """Write all high-priority tags changed since the last flush.
+
+        Called automatically in write-through mode as soon as control returns
+        to the event loop, so several changes of one tag are merged into one
+        write. In threaded mode the writes are done by the worker thread.
+
+        """
+        pending = [tag for tag in self._pending_writes if tag.dirty]
+        self._pending_writes.clear()
+        if not pending or self.circuit_open:
+            return
+
+        cycle = PollCycle([], [])
+        for tag in pending:
+            self._take_write(cycle, tag)
+
+        if self._worker is None:
+            with self._io_lock:
+                self.write_tags(cycle)
+            self._finish_writes(cycle)
+        else:
+            self._writes_requested.emit(cycle)
+
+    def _finish_writes(self, cycle: PollCycle) -> None:
+        self._apply_writes(cycle)
+        if cycle.errors:
+            self.connectionError.emit(cycle.errors[0])
+        if cycle.transport_failed:
+            self.update_connection_state(False)
+
+    def _apply_writes(self, cycle: PollCycle) -> None:
+        """Mark failed writes dirty again and record the write latencies."""
+        failed = set(cycle.failed_writes)
+        for tag in failed:
+            tag.dirty = True
+            tag.dirty_since = cycle.dirty_since.get(tag, tag.dirty_since)
+
+        for tag, since in cycle.dirty_since.items():
+            if tag not in failed:
+                self.statistics.add_write_latency(cycle.write_done - since)
+
+    def exchange(self, cycle: PollCycle) -> None:
+        """Write and read the data of the given cycle.
+
+        Only accesses the PLC and the cycle object, so it may be called from
+        a worker thread. Calls from several threads are serialized, so the
+        PLC is never accessed by two threads at once. In C{fail_fast} mode
+        nothing is read after a TransportError while writing.
+
+        """
+        with self._io_lock:
+            t0 = time.perf_counter()
+            if cycle.retry:
+                try:
+                    self.reconnect()
+                except ConnectionError as e:
+                    cycle.errors.append(str(e))
+                    cycle.aborted = True
+                    cycle.transport_failed = True
+                    cycle.failed_writes.extend(tag for tag, _ in cycle.writes)
+                    cycle.write_done = time.perf_counter()
+                    return
+
+            self.write_tags(cycle)
+            t1 = cycle.write_done
+            if not cycle.aborted:
+                self.read_tags(cycle)
+            cycle.write_time = t1 - t0
+            cycle.read_time = time.perf_counter() - t1
+
+    def finish_cycle(self, cycle: PollCycle) -> None:
+        """Apply the results of a cycle to the tags.
+
+        Tags that could not be written are marked dirty again. Read values of
+        dirty tags are dropped, so values changed in the GUI while the cycle
+        was running are not overwritten. Must be called from the GUI thread.
+
+        All raw values are updated and the C{processors} are run before any
+        signal is emitted. Then C{value_changed()} is emitted for every
+        changed tag, unless C{emit_tag_signals} is False, and
+        C{tags_changed(changes)} once with a ChangeSet of all changed tags and
+        table rows.
+
+        C{connectionError()} is emitted once with the first error of the
+        cycle and the C{connection_state} is updated, see
+        C{update_connection_state()}.
+
+        The metrics of the cycle are added to C{statistics}. The pyqtSignal
+        C{polled()} is emitted when finished.
+
+        """
+        cycle_time = time.perf_counter() - cycle.started
+        for group in cycle.groups:
+            group.add_cycle(cycle_time)
+
+        if self._adaptive is not None and cycle.groups:
+            self._adapt_interval(cycle_time, cycle.groups)
+
+        self._apply_writes(cycle)
+
+        changes = ChangeSet()
+        changed_tags = changes.tags
+        for tag, raw_value in cycle.values:
+            if not tag.dirty and tag.update_raw_value(raw_value):
+                changed_tags.append(tag)
+
+        for table, rows, values in cycle.table_values:
+            changed_rows = table.update(rows, values, False)
+            if len(changed_rows):
+                changes.rows.append((table, changed_rows))
+
+        self._emit_changes(changes)
+
+        if cycle.errors:
+            self.connectionError.emit(cycle.errors[0])
+        self.update_connection_state(not cycle.transport_failed)
+
+        record = CycleRecord(
+            cycle_time,
+            cycle.read_time,
+            cycle.write_time,
+            cycle.tag_count,
+            len(cycle.errors),
+            cycle.jitter,
+        )
+        self.statistics.add(record)
+        if self.emit_statistics:
+            self.cycleMeasured.emit(record)
+
+        self.polled.emit()
+
+    def _emit_changes(self, changes: ChangeSet) -> None:
+        """Run the processors and emit the signals of changed tags and rows."""
+        for processor in self.processors:
+            processor.process(changes)
+
+        if self.emit_tag_signals:
+            for tag in changes.tags:
+                tag.value_changed.emit()
+            for table, rows in changes.rows:
+                table.notify_views(rows)
+
+        if changes:
+            self.tags_changed.emit(changes)
+
+    def write_tags(self, cycle: PollCycle) -> None:
+        """Write the dirty tags of the cycle to the PLC.
+
+        If the connector implements C{write_block()} dirty tags with adjacent
+        integer addresses are merged and written with one request. All other
+        tags are written one by one via C{write_to_plc()}. In C{fail_fast}
+        mode the first TransportError aborts the cycle and all tags not
+        written yet count as failed.
+
+        """
+        single_tags: List[Tag] = []
+        block_tags: List[Tag] = []
+        block_write = self.supports_block_write
+        raw_values = dict(cycle.writes)
+
+        for tag in raw_values:
+            if block_write and isinstance(tag.address, int) and (
+                self.datatypes is None or not self.datatypes.is_bit(tag.plc_datatype)
+            ):
+                block_tags.append(tag)
+            else:
+                single_tags.append(tag)
+
+        written: List[Tag] = []
+        for block in plan_blocks(block_tags, self.tag_span, 0, self.max_block_length):
+            if len(block.tags) == 1:
+                single_tags.extend(block.tags)
+                continue
             try:
-                if tag.dirty:
-                    self.write_to_plc(tag.address, tag.raw_value,
-                                      tag.plc_datatype)
-                    tag.dirty = False
+                self.write_block(block.start, self.encode_block(block, raw_values))
+            except ConnectionError as e:
+                cycle.failed_writes.extend(block.tags)
+                if self._connection_failed(cycle, e):
+                    break
+            else:
+                written.extend(block.tags)
+        else:
+            for tag in single_tags:
+                try:
+                    self.write_to_plc(tag.address, raw_values[tag], tag.plc_datatype)
+                except ConnectionError as e:
+                    cycle.failed_writes.append(tag)
+                    if self._connection_failed(cycle, e):
+                        break
+                else:
+                    written.append(tag)
+
+        if cycle.aborted:
+            done = set(written)
+            cycle.failed_writes = [tag for tag in raw_values if tag not in done]
+
+        cycle.write_done = time.perf_counter()
+
+    def _connection_failed(self, cycle: PollCycle, error: ConnectionError) -> bool:
+        """Record a connection error, return True if the cycle is aborted."""
+        cycle.errors.append(str(error))
+        if isinstance(error, TransportError):
+            cycle.transport_failed = True
+            if self.fail_fast:
+                cycle.aborted = True
+        return cycle.aborted
 
-                tag.raw_value = self.read_from_plc(tag.address,
-                                                   tag.plc_datatype)
+    def read_tags(self, cycle: PollCycle) -> None:
+        """Read the raw values of the tags of the cycle from the PLC.
 
+        If the connector implements C{read_block()} all tags with an integer
+        address are read in as few contiguous blocks as possible, see
+        C{plan_blocks()}, a block failing with another error than
+        TransportError is read again tag by tag. All other tags are read one
+        by one via C{read_from_plc()}. The results are stored in
+        C{cycle.values}. In C{fail_fast} mode reading stops at the first
+        TransportError.
+
+        """
+        values = cycle.values
+        block_tags: List[Tag] = []
+        block_read = self.supports_block_read
+
+        for tag in cycle.reads:
+            if block_read and isinstance(tag.address, int):
+                block_tags.append(tag)
+                continue
+            try:
+                values.append(
+                    (tag, self.read_from_plc(tag.address, tag.plc_datatype))
+                )
             except ConnectionError as e:
-                self.connectionError.emit(str(e))
+                if self._connection_failed(cycle, e):
+                    return
 
-        self.polled.emit()
+        if self._read_planned(cycle, self.plan_read(block_tags)):
+            return
+
+        for table, rows in cycle.table_reads:
+            self.read_table(cycle, table, rows)
+            if cycle.aborted:
+                return
+
+    def _read_planned(self, cycle: PollCycle, blocks: List[ReadBlock],
+                      split: bool = True) -> bool:
+        """Read planned blocks, return True if the cycle is aborted.
+
+        A block of several tags failing with an error other than
+        TransportError is read again tag by tag, so one invalid address does
+        not hide the valid tags next to it.
+
+        """
+        buffers = self.read_blocks([(block.start, block.length) for block in blocks])
+        failed: List[ReadBlock] = []
+        for block, buffer in zip(blocks, buffers):
+            if isinstance(buffer, ConnectionError):
+                if (split and len(block.tags) > 1
+                        and not isinstance(buffer, TransportError)):
+                    failed.extend(ReadBlock(*self.tag_span(tag), [tag])
+                                  for tag in block.tags)
+                elif self._connection_failed(cycle, buffer):
+                    return True
+                continue
+
+            cycle.values.extend(self.decode_block(block, buffer))
+
+        return bool(failed) and self._read_planned(cycle, failed, False)
+
+    def read_table(self, cycle: PollCycle, table: TagTable, rows: np.ndarray) -> None:
+        """Read the given rows of a TagTable.
+
+        With C{read_block()} the rows are planned by C{plan_table_blocks()}
+        and decoded by C{decode_table_block()}, otherwise every row is read
+        via C{read_from_plc()}. The results are stored in
+        C{cycle.table_values}.
+
+        """
+        if not self.supports_block_read:
+            addresses = table.addresses[rows].tolist()
+            plc_datatypes = table.plc_datatypes[rows].tolist()
+            read_rows: List[int] = []
+            values: List[Any] = []
+            for row, address, plc_datatype in zip(rows.tolist(), addresses,
+                                                  plc_datatypes):
+                try:
+                    value = self.read_from_plc(
+                        address, None if plc_datatype < 0 else plc_datatype
+                    )
+                except ConnectionError as e:
+                    if self._connection_failed(cycle, e):
+                        break
+                    continue
+                read_rows.append(row)
+                values.append(value)
+            cycle.table_values.append((table, np.array(read_rows, np.int64), values))
+            return
+
+        starts, sizes = self.table_spans(table, rows)
+        blocks = plan_table_blocks(starts, sizes, self.block_gap, self.max_block_length)
+        buffers = self.read_blocks([(start, length) for start, length, _ in blocks])
+        for (start, length, positions), buffer in zip(blocks, buffers):
+            if isinstance(buffer, ConnectionError):
+                if self._connection_failed(cycle, buffer):
+                    return
+                continue
+
+            block_rows = rows[positions]
+            raw_values = self.decode_table_block(table, block_rows, start, buffer)
+            cycle.table_values.append((table, block_rows, raw_values))
+
+    def plan_read(self, tags: Iterable[Tag]) -> List[ReadBlock]:
+        """Return the block reads needed for the given tags."""
+        return plan_blocks(tags, self.tag_span, self.block_gap,
+                           self.max_block_length)
+
+    def tag_span(self, tag: Tag) -> Tuple[int, int]:
+        """Return start address and size of the given tag.
+
+        By default every tag occupies exactly one address unit. With a
+        DatatypeRegistry in C{datatypes} the size depends on C{plc_datatype}.
+
+        """
+        if self.datatypes is not None:
+            return tag.address, self.datatypes.units(tag.plc_datatype)
+        return tag.address, 1
+
+    def decode_block(self, block: ReadBlock, buffer: Sequence) -> List[Tuple[Tag, Any]]:
+        """Slice the raw values of all tags in the block out of the buffer.
+
+        :param block: the block that has been read
+        :param buffer: data returned by C{read_block()}
+        :return: list of (tag, raw_value) tuples
+
+        """
+        start = block.start
+        if self.datatypes is not None:
+            tags = block.tags
+            values = self.datatypes.decode(
+                buffer,
+                [tag.address - start for tag in tags],
+                [tag.plc_datatype for tag in tags],
+            )
+            return list(zip(tags, values.tolist()))
+        return [(tag, buffer[tag.address - start]) for tag in block.tags]
+
+    def table_spans(
+        self, table: TagTable, rows: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return start addresses and sizes of the given table rows.
+
+        Vectorized version of C{tag_span()}.
+
+        """
+        if self.datatypes is not None:
+            return (table.addresses[rows],
+                    self.datatypes.units_array(table.plc_datatypes[rows]))
+        return table.addresses[rows], np.ones(len(rows), np.int64)
+
+    def decode_table_block(
+        self, table: TagTable, rows: np.ndarray, start: int, buffer: Sequence
+    ) -> np.ndarray:
+        """Return the raw values of the table rows read with one block.
+
+        Vectorized version of C{decode_block()}.
+
+        """
+        if self.datatypes is not None:
+            return self.datatypes.decode(
+                buffer, table.addresses[rows] - start, table.plc_datatypes[rows],
+                table.dtype,
+            )
+        return np.asarray(buffer)[table.addresses[rows] - start]
+
+    def encode_block(self, block: ReadBlock, raw_values: Dict[Tag, Any]) -> Sequence:
+        """Return the raw values of all tags in the block as one buffer.
+
+        :param block: contiguous block of dirty tags
+        :param raw_values: raw values to be written, the key is the Tag
+        :return: list of raw values, index 0 corresponds to C{block.start},
+                 bytes if C{datatypes} is set
+
+        """
+        start = block.start
+        if self.datatypes is not None:
+            tags = block.tags
+            return self.datatypes.encode(
+                block.length,
+                [tag.address - start for tag in tags],
+                [tag.plc_datatype for tag in tags],
+                [raw_values[tag] for tag in tags],
+            )
+        buffer: List[Any] = [None] * block.length
+        for tag in block.tags:
+            buffer[tag.address - start] = raw_values[tag]
+        return buffer
+
+    def read_block(self, start: int, length: int) -> Sequence:
+        """Read a contiguous block of data from the plc.
+
+        B{Optional. Overwrite when inherited to enable block reads.}
+
+        :param start: first address
+        :param length: number of address units
+        :return: indexable buffer, index 0 corresponds to C{start}, a
+                 bytes-like object if C{datatypes} is set
+
+        """
+        raise NotImplementedError('call to optional method read_block')
+
+    def read_blocks(
+        self, spans: List[Tuple[int, int]]
+    ) -> List[Union[Sequence, ConnectionError]]:
+        """Read several blocks, e.g. with pipelined requests.
+
+        By default C{read_block()} is called for every block. In
+        C{fail_fast} mode no further block is read after a TransportError.
+        Overwrite to send the requests of all blocks at once.
+
+        :param spans: (start, length) tuples of the blocks
+        :return: one buffer or ConnectionError per block, the list ends early
+                 if reading has been stopped
+
+        """
+        buffers: List[Union[Sequence, ConnectionError]] = []
+        for start, length in spans:
+            try:
+                buffers.append(self.read_block(start, length))
+            except ConnectionError as e:
+                buffers.append(e)
+                if self.fail_fast and isinstance(e, TransportError):
+                    break
+        return buffers
+
+    def write_block(self, start: int, values: Sequence) -> None:
+        """Write a contiguous block of data to the plc.
+
+        B{Optional. Overwrite when inherited to enable block writes.}
+
+        :param start: first address
+        :param values: raw values, index 0 corresponds to C{start}
+
+        """
+        raise NotImplementedError('call to optional method write_block')
 
     @abstractmethod
     def write_to_plc(self, *args: Any, **kwargs: Any) -> None:
@@ -116,13 +1311,202 @@ class AbstractPLCConnector(QObject, object):
         """
         pass
 
+    def reconnect(self) -> None:
+        """Re-establish the connection before retrying a down connection.
+
+        Called by C{exchange()}, so it may run in the worker thread. Does
+        nothing by default, overwrite e.g. to reopen a socket. Raise
+        ConnectionError if the PLC can not be reached, it always counts as
+        TransportError.
+
+        """
+        pass
+
+    @property
+    def circuit_open(self) -> bool:
+        """Return True if the connection is down and no retry is due."""
+        return self.connection_state == DOWN and time.monotonic() < self._retry_at
+
+    def update_connection_state(self, success: bool) -> None:
+        """Update C{connection_state} with the result of a cycle.
+
+        The first failed cycle makes the connection C{DEGRADED}, after
+        C{failure_threshold} failed cycles in a row it is C{DOWN}: all tags
+        and tables are marked stale and cycles are skipped until the next
+        retry. The time until the retry starts at C{backoff_initial} and is
+        doubled after each failed retry up to C{backoff_max}. A successful
+        cycle makes the connection C{CONNECTED} again.
+
+        The pyqtSignal C{connectionStateChanged(state)} is emitted if the
+        state changed.
+
+        """
+        if success:
+            self.failure_count = 0
+            state = CONNECTED
+        else:
+            self.failure_count += 1
+            retries = self.failure_count - self.failure_threshold
+            if retries < 0:
+                state = DEGRADED
+            else:
+                state = DOWN
+                backoff = min(self.backoff_initial * 2 ** retries, self.backoff_max)
+                self._retry_at = time.monotonic() + backoff
+
+        if state == self.connection_state:
+            return
+
+        if state == DOWN or self.connection_state == DOWN:
+            self._set_stale(state == DOWN)
+        self.connection_state = state
+        self.connectionStateChanged.emit(state)
+
+    def _set_stale(self, stale: bool) -> None:
+        for tag in self.tags.values():
+            tag.stale = stale
+        for table in self.tables:
+            table.stale = stale
+            for view in table.views:
+                view.stale = stale
+
+    @property
+    def threaded(self) -> bool:
+        """Return True if the PLC is accessed by a worker thread."""
+        return self._worker is not None
+
+    def set_threaded(self, threaded: bool) -> None:
+        """Enable or disable the threaded mode.
+
+        In threaded mode C{request_poll()} and auto-polling access the PLC
+        from a worker thread, so slow connections do not block the GUI. The
+        finished cycles are applied in the GUI thread, so C{value_changed()}
+        and C{polled()} are still emitted there.
+
+        Disable the threaded mode before the connector is deleted.
+
+        """
+        if threaded == self.threaded:
+            return
+
+        if threaded:
+            self._thread = QThread()
+            self._worker = PollWorker(self)
+            self._worker.moveToThread(self._thread)
+            self._cycle_requested.connect(self._worker.run)
+            self._writes_requested.connect(self._worker.write)
+            self._worker.finished.connect(self._on_worker_finished)
+            self._worker.written.connect(self._finish_writes)
+            self._thread.start()
+        else:
+            self._cycle_requested.disconnect(self._worker.run)
+            self._writes_requested.disconnect(self._worker.write)
+            self._thread.quit()
+            self._thread.wait()
+            self._worker = None
+            self._thread = None
+            self._pending_cycle = False
+
+    @property
+    def effective_interval(self) -> int:
+        """Return the current interval of the autopoll timer in ms."""
+        return self.autopoll_timer.interval()
+
+    def enable_adaptive_interval(self, floor: int, ceiling: int) -> None:
+        """Adapt the poll intervals to the duration of the poll cycles.
+
+        If a cycle takes longer than the timer interval, the interval is
+        stretched to 1.5 times its value or 1.25 times the cycle duration,
+        whatever is longer. Ticks missed during a long cycle are skipped. If
+        a cycle takes less than half of the interval, the interval shrinks
+        to 0.8 times its value, but never below the nominal interval. The
+        intervals of all scan groups are scaled by the same factor, see
+        C{interval_scale}.
+
+        The pyqtSignal C{intervalChanged(interval)} is emitted with the new
+        timer interval whenever the rate changes.
+
+        :param floor: minimum timer interval in ms, applies if the nominal
+                      interval is shorter
+        :param ceiling: maximum timer interval in ms, the interval is not
+                        stretched beyond it
+
+        """
+        if not 0 < floor <= ceiling:
+            raise ValueError("invalid interval limits: {}, {}".format(floor, ceiling))
+
+        self._adaptive = (floor, ceiling)
+        self._set_interval_scale(self._clamped_scale(self.effective_interval))
+
+    def disable_adaptive_interval(self) -> None:
+        """Poll with the nominal intervals of the scan groups again."""
+        self._adaptive = None
+        self._set_interval_scale(1.0)
+
+    def _adapt_interval(self, cycle_time: float, groups: List[ScanGroup]) -> None:
+        interval = self.effective_interval
+        elapsed = cycle_time * 1000.0
+        if elapsed > interval:
+            interval = max(interval * 1.5, elapsed * 1.25)
+        elif elapsed < interval * 0.5:
+            interval = interval * 0.8
+        self._set_interval_scale(self._clamped_scale(interval))
+
+        now = time.monotonic()
+        for group in groups:
+            if group.next_due < now:
+                group.next_due = now + group.interval * self.interval_scale / 1000.0
+
+    def _clamped_scale(self, interval: float) -> float:
+        """Return the scale for the interval limited to the adaptive range.
+
+        The interval is never shorter than the nominal interval or C{floor}
+        and only stretched up to C{ceiling}.
+
+        """
+        nominal = self._tick_interval()
+        if self._adaptive is None or not nominal:
+            return 1.0
+        floor, ceiling = self._adaptive
+        interval = min(ceiling, round(interval or nominal))
+        return max(floor, nominal, interval) / nominal
+
+    def _set_interval_scale(self, scale: float) -> None:
+        old_interval = self.effective_interval
+        self.interval_scale = scale
+        self._update_scheduler()
+        if self.autopoll_timer.isActive() and self.effective_interval != old_interval:
+            self.intervalChanged.emit(self.effective_interval)
+
     def start_autopoll(self, poll_interval: int) -> None:
         """Enable auto-polling data.
 
-        :param poll_interval: interval for autopolling in ms
+        One timer drives all scan groups. It ticks with the greatest common
+        divisor of all group intervals and all groups that are due at a tick
+        are read in one merged cycle.
+
+        :param poll_interval: interval for autopolling of the default scan
+                              group in ms
 
         """
-        self.autopoll_timer.start(poll_interval)
+        self.scan_groups[DEFAULT_SCAN_GROUP].interval = poll_interval
+        now = time.monotonic()
+        for group in self.scan_groups.values():
+            group.next_due = now
+        self.interval_scale = self._clamped_scale(self._tick_interval())
+        self._last_tick = None
+        self.autopoll_timer.start(self._scaled_tick_interval())
+
+    def _tick_interval(self) -> int:
+        intervals = [g.interval for g in self.scan_groups.values() if g.interval > 0]
+        return reduce(gcd, intervals) if intervals else 0
+
+    def _scaled_tick_interval(self) -> int:
+        return int(round(self._tick_interval() * self.interval_scale))
+
+    def _update_scheduler(self) -> None:
+        if self.autopoll_timer.isActive():
+            self.autopoll_timer.setInterval(self._scaled_tick_interval())
 
     def stop_autopoll(self) -> None:
         """Disable auto-polling data."""
@@ -137,20 +1521,224 @@ class BufferConnector(AbstractPLCConnector):
     collected continuously while some HMIWidgets like plotters or loggers are
     only refreshed when asked for.
 
+    The address of a buffered tag is the name of its source tag, which is a
+    tag or a TagTable row of the source connector, or the source Tag object
+    itself. A TableTag view as address is bound to its row. Buffered tags
+    are bound to their source when they are added, or by the first C{poll()}
+    after the source has been added to the source connector. The
+    C{tags_changed()} signal of the source marks the buffered tags whose
+    source changed, only these are copied by the next C{poll()}.
+
+    In history mode every cycle of the source is appended to a TagHistory,
+    so no value is lost between two polls of the buffer, see
+    C{enable_history()}.
+
     :ivar connector: data source
 
+    :type history: TagHistory
+    :ivar history: samples of all source cycles, None if history mode is
+                   disabled
+
     """
 
     def __init__(self, connector: AbstractPLCConnector) -> None:
         super(BufferConnector, self).__init__()
         self.connector = connector
+        self._sources: Dict[Tag, Tag] = {}
+        self._buffered: Dict[Tag, List[Tag]] = {}
+        self._rows: Dict[Tag, Tuple[TagTable, int]] = {}
+        self._table_tags: Dict[TagTable, Tuple[List[Tag], np.ndarray]] = {}
+        self._changed: Dict[Tag, None] = {}
+        self._unbound: Dict[Tag, None] = {}
+        self.history: Optional[TagHistory] = None
+        connector.tags_changed.connect(self._on_source_changed)
+
+    def add_tag(self, tag: Tag) -> Tag:
+        """Add a Tag and bind it to its source.
+
+        If the source connector has no tag or table row named like the
+        address of the tag yet, the tag is bound by the first C{poll()}
+        after the source has been added. It is not read until then.
+
+        """
+        super(BufferConnector, self).add_tag(tag)
+        if not self._bind(tag):
+            self._unbound[tag] = None
+        self._changed[tag] = None
+        return tag
+
+    def _bind(self, tag: Tag) -> bool:
+        """Bind a tag to its source, return False if there is no source."""
+        if isinstance(tag.address, TableTag):
+            view = tag.address
+            self._rows[tag] = (view.table, view.index)
+            self._update_table_tags(view.table)
+            return True
+        elif isinstance(tag.address, Tag):
+            source = tag.address
+        else:
+            name = str(tag.address)
+            if name not in self.connector.tags:
+                table = next((t for t in self.connector.tables if name in t), None)
+                if table is None:
+                    return False
+                self._rows[tag] = (table, table.index(name))
+                self._update_table_tags(table)
+                return True
+            source = self.connector.tags[name]
+
+        self._sources[tag] = source
+        self._buffered.setdefault(source, []).append(tag)
+        return True
+
+    def remove_tag(self, tag_name: str) -> None:
+        """Remove a Tag and its binding."""
+        tag = self.tags[tag_name]
+        super(BufferConnector, self).remove_tag(tag_name)
+        self._changed.pop(tag, None)
+        self._unbound.pop(tag, None)
+        source = self._sources.pop(tag, None)
+        if source is not None:
+            self._buffered[source].remove(tag)
+            if not self._buffered[source]:
+                del self._buffered[source]
+        source_row = self._rows.pop(tag, None)
+        if source_row is not None:
+            self._update_table_tags(source_row[0])
+
+    def _update_table_tags(self, table: TagTable) -> None:
+        tags = [tag for tag, (t, _) in self._rows.items() if t is table]
+        if tags:
+            rows = np.array([self._rows[tag][1] for tag in tags], np.int64)
+            self._table_tags[table] = (tags, rows)
+        else:
+            self._table_tags.pop(table, None)
+
+    def enable_history(
+        self, capacity: int = 10000, tags: Iterable[Tag] = None
+    ) -> TagHistory:
+        """Append the values of every source cycle to a TagHistory.
+
+        A sample is appended each time the source emits C{polled()}, drain
+        the samples with C{history.drain(consumer)}.
+
+        :param capacity: maximum number of samples
+        :param tags: buffered tags of the columns, all tags if None
+
+        """
+        self.disable_history()
+        tags = list(self.tags.values()) if tags is None else list(tags)
+        history = TagHistory(tags, capacity)
+        for tag in tags:
+            history.set_value(tag, self._source_value(tag))
+
+        self.history = history
+        self.connector.polled.connect(self._on_source_polled)
+        return history
+
+    def disable_history(self) -> None:
+        """Stop appending source cycles to the history."""
+        if self.history is not None:
+            self.connector.polled.disconnect(self._on_source_polled)
+            self.history = None
+
+    def _source_value(self, tag: Tag) -> Any:
+        source = self._sources.get(tag)
+        if source is not None:
+            return source.value
+        if tag not in self._rows:
+            return None
+        table, row = self._rows[tag]
+        return table.get_raw(row)
+
+    def _on_source_polled(self) -> None:
+        if self.history is not None:
+            self.history.sample()
+
+    def _on_source_changed(self, changes: ChangeSet) -> None:
+        """Mark the buffered tags whose source changed."""
+        changed = self._changed
+        history = self.history
+        buffered = self._buffered
+        if buffered:
+            for source in changes.tags:
+                for tag in buffered.get(source, ()):
+                    changed[tag] = None
+                    if history is not None:
+                        history.set_value(tag, source.value)
+
+        for table, rows in changes.rows:
+            bound = self._table_tags.get(table)
+            if bound is not None:
+                tags, bound_rows = bound
+                positions = np.nonzero(np.isin(bound_rows, rows))[0]
+                for i in positions.tolist():
+                    changed[tags[i]] = None
+                if history is not None and len(positions):
+                    values = table.raw_values[bound_rows[positions]].tolist()
+                    for i, value in zip(positions.tolist(), values):
+                        history.set_value(tags[i], value)
+
+    def prepare_cycle(
+        self, tags: Iterable[Tag] = None, groups: List[ScanGroup] = None
+    ) -> PollCycle:
+        """Collect the buffered tags whose source changed since the last poll.
+
+        Explicitly given tags, e.g. the tags of the due scan groups, are
+        copied only if their source changed, too. Tags without source are
+        bound first, see C{add_tag()}.
+
+        """
+        unbound = self._unbound
+        for tag in list(unbound):
+            if self._bind(tag):
+                del unbound[tag]
+
+        changed = self._changed
+        if tags is None:
+            tags = [tag for tag in changed if self.is_polled(tag)]
+        else:
+            tags = [tag for tag in tags if tag in changed]
+        if unbound:
+            tags = [tag for tag in tags if tag not in unbound]
+        for tag in tags:
+            changed.pop(tag, None)
+        return super(BufferConnector, self).prepare_cycle(tags, groups)
+
+    def read_tags(self, cycle: PollCycle) -> None:
+        """Copy the values of the source tags.
+
+        Values of TagTable rows are taken from the table arrays with one
+        gather per table.
+
+        """
+        values = cycle.values
+        sources = self._sources
+        by_table: Dict[TagTable, List[Tag]] = {}
+
+        for tag in cycle.reads:
+            source = sources.get(tag)
+            if source is not None:
+                values.append((tag, source.value))
+            elif tag in self._rows:
+                by_table.setdefault(self._rows[tag][0], []).append(tag)
+
+        for table, tags in by_table.items():
+            rows = np.array([self._rows[tag][1] for tag in tags], np.int64)
+            raw_values = table.raw_values[rows].tolist()
+            valid = table.valid[rows].tolist()
+            values.extend(
+                (tag, raw if ok else None)
+                for tag, raw, ok in zip(tags, raw_values, valid)
+            )
+
+        for table, rows in cycle.table_reads:
+            self.read_table(cycle, table, rows)
 
     def write_to_plc(self, *args: Any, **kwargs: Any) -> None:
         """Write all data to PLC."""
         super(BufferConnector, self).write_to_plc(*args, **kwargs)
 
-    def read_from_plc(self, address: str, datatype: type) -> None:
-        """Read all data from PLC."""
-        tag = self.tags[address]
-        primarytag = self.connector.tags[str(tag.address)]
-        return primarytag.value
+    def read_from_plc(self, address: str, datatype: type) -> Any:
+        """Return the value of the source tag with the given name."""
+        return self.connector.tags[str(address)].value
@@ -0,0 +1,250 @@
+"""Decoding and encoding of PLC datatypes.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A DatatypeRegistry maps the C{plc_datatype} codes of tags to binary
+formats. All values of a block read are decoded in one pass: the registry
+groups the tags of a block by datatype and gathers their bytes with NumPy
+from a view of the buffer, no bytes object is sliced per tag.
+
+Set the registry of a connector to use it for block reads and writes::
+
+    >>> connector.datatypes = DatatypeRegistry(byteorder=">", unit_size=2)
+    >>> connector.add_tag(Tag("speed", 100, REAL, float))
+    >>> connector.add_tag(Tag("alarm", 102, bit(3), bool))
+
+The buffers returned by C{read_block()} then have to be bytes-like objects
+holding C{length * unit_size} bytes.
+
+"""
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+
+SINT = 1
+USINT = 2
+INT = 3
+UINT = 4
+DINT = 5
+UDINT = 6
+LINT = 7
+ULINT = 8
+REAL = 9
+LREAL = 10
+BOOL = 11
+
+BIT = 0x100
+STRING = 0x10000
+
+_FORMATS = {
+    SINT: "i1",
+    USINT: "u1",
+    INT: "i2",
+    UINT: "u2",
+    DINT: "i4",
+    UDINT: "u4",
+    LINT: "i8",
+    ULINT: "u8",
+    REAL: "f4",
+    LREAL: "f8",
+    BOOL: "?",
+}
+
+_NUMBER = 0
+_BIT = 1
+_STRING = 2
+
+
+def bit(n: int) -> int:
+    """Return the code of bit n of the address unit, e.g. for alarm words."""
+    return BIT + n
+
+
+def string(length: int) -> int:
+    """Return the code of a string of fixed length in bytes."""
+    return STRING + length
+
+
+class DatatypeRegistry(object):
+    """Map C{plc_datatype} codes to binary formats.
+
+    Bit codes address a single bit of the address unit (e.g. of a Modbus
+    register), string codes a zero padded string of fixed length.
+
+    :type byteorder: str
+    :ivar byteorder: "<" for little endian, ">" for big endian
+
+    :type unit_size: int
+    :ivar unit_size: size of an address unit in bytes, 1 for byte addressed
+                     PLCs, 2 for 16 bit registers
+
+    :type default: int
+    :ivar default: datatype of tags without C{plc_datatype}
+
+    :type encoding: str
+    :ivar encoding: encoding of strings
+
+    """
+
+    def __init__(
+        self,
+        byteorder: str = "<",
+        unit_size: int = 1,
+        default: Optional[int] = None,
+        encoding: str = "latin-1",
+    ) -> None:
+        self.byteorder = byteorder
+        self.unit_size = unit_size
+        self.default = default
+        self.encoding = encoding
+        self._formats: Dict[int, str] = dict(_FORMATS)
+        self._info: Dict[int, Tuple[int, np.dtype, int, int]] = {}
+
+    def register(self, code: int, fmt: str) -> None:
+        """Register a numeric datatype given as NumPy format, e.g. "f4"."""
+        self._formats[code] = fmt
+        self._info.pop(code, None)
+
+    def info(self, code: Optional[int]) -> Tuple[int, np.dtype, int, int]:
+        """Return kind, dtype, size in bytes and bit number of a datatype."""
+        if code is None or code < 0:
+            if self.default is None:
+                raise ValueError("no plc_datatype and no default datatype")
+            code = self.default
+
+        info = self._info.get(code)
+        if info is not None:
+            return info
+
+        if code >= STRING:
+            size = code - STRING
+            info = (_STRING, np.dtype("S{}".format(size)), size, 0)
+        elif code >= BIT:
+            unit = np.dtype("{}u{}".format(self.byteorder, self.unit_size))
+            info = (_BIT, unit, self.unit_size, code - BIT)
+        elif code in self._formats:
+            dtype = np.dtype(self._formats[code]).newbyteorder(self.byteorder)
+            info = (_NUMBER, dtype, dtype.itemsize, 0)
+        else:
+            raise ValueError("unknown plc_datatype {}".format(code))
+
+        self._info[code] = info
+        return info
+
+    def size(self, code: Optional[int]) -> int:
+        """Return the size of a datatype in bytes."""
+        return self.info(code)[2]
+
+    def units(self, code: Optional[int]) -> int:
+        """Return the number of address units occupied by a datatype."""
+        return max(1, -(-self.info(code)[2] // self.unit_size))
+
+    def units_array(self, codes: np.ndarray) -> np.ndarray:
+        """Vectorized version of C{units()}."""
+        sizes = np.empty(len(codes), np.int64)
+        for code in np.unique(codes).tolist():
+            sizes[codes == code] = self.units(code)
+        return sizes
+
+    def _codes(self, codes: Iterable[Optional[int]]) -> np.ndarray:
+        return np.array([-1 if c is None else c for c in codes], np.int64)
+
+    def decode(
+        self,
+        buffer: Any,
+        offsets: Any,
+        codes: Any,
+        dtype: Any = object,
+    ) -> np.ndarray:
+        """Decode the values at the given offsets of a buffer.
+
+        :param buffer: bytes-like object
+        :param offsets: offsets of the values in address units
+        :param codes: plc_datatype of each value, None or -1 for C{default}
+        :param dtype: dtype of the returned array, object for Python values
+        :return: array with the decoded values
+
+        """
+        raw = np.frombuffer(memoryview(buffer).cast("B"), np.uint8)
+        offsets = np.asarray(offsets, np.int64) * self.unit_size
+        codes = np.asarray(codes, np.int64) if isinstance(codes, np.ndarray) \
+            else self._codes(codes)
+        result = np.empty(len(offsets), dtype)
+
+        unique = np.unique(codes)
+        for code in unique.tolist():
+            if len(unique) == 1:
+                positions = slice(None)
+                group_offsets = offsets
+            else:
+                positions = np.nonzero(codes == code)[0]
+                group_offsets = offsets[positions]
+            result[positions] = self._decode_group(raw, group_offsets, code)
+
+        return result
+
+    def _decode_group(self, raw: np.ndarray, offsets: np.ndarray, code: int) -> Any:
+        kind, dtype, size, bit_number = self.info(code)
+        n = len(offsets)
+
+        if n and kind != _STRING and np.array_equal(
+            offsets, offsets[0] + size * np.arange(n)
+        ):
+            words = np.frombuffer(raw, dtype, n, int(offsets[0]))
+        else:
+            index = offsets[:, None] + np.arange(size)
+            words = raw[index].view(dtype).reshape(n)
+
+        if kind == _BIT:
+            return (words >> bit_number) & 1 == 1
+        if kind == _STRING:
+            return [
+                s.split(b"\0", 1)[0].decode(self.encoding) for s in words.tolist()
+            ]
+        return words
+
+    def encode(
+        self,
+        length: int,
+        offsets: Any,
+        codes: Any,
+        values: Sequence[Any],
+    ) -> bytes:
+        """Encode values into a buffer of C{length} address units.
+
+        Address units not covered by a value are zero. Bit datatypes can not
+        be encoded, as the other bits of their unit are unknown.
+
+        """
+        raw = np.zeros(length * self.unit_size, np.uint8)
+        offsets = np.asarray(offsets, np.int64) * self.unit_size
+        codes = np.asarray(codes, np.int64) if isinstance(codes, np.ndarray) \
+            else self._codes(codes)
+
+        for code in np.unique(codes).tolist():
+            kind, dtype, size, _ = self.info(code)
+            if kind == _BIT:
+                raise ValueError("bit datatypes can not be encoded in blocks")
+
+            positions = np.nonzero(codes == code)[0]
+            group_values = [values[i] for i in positions.tolist()]
+            if kind == _STRING:
+                group_values = [v.encode(self.encoding) for v in group_values]
+            data = np.asarray(group_values, dtype).view(np.uint8)
+            index = offsets[positions][:, None] + np.arange(size)
+            raw[index] = data.reshape(len(positions), size)
+
+        return raw.tobytes()
+
+    def decode_value(self, code: Optional[int], data: Any) -> Any:
+        """Decode a single value from the beginning of a buffer."""
+        return self.decode(data, [0], [code])[0]
+
+    def encode_value(self, code: Optional[int], value: Any) -> bytes:
+        """Encode a single value."""
+        return self.encode(self.units(code), [0], [code], [value])
+
+    def is_bit(self, code: Optional[int]) -> bool:
+        """Return True for bit datatypes."""
+        return self.info(code)[0] == _BIT
@@ -0,0 +1,235 @@
+"""Tags computed from other tags.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A DerivedTag is defined by an expression over input tags. A DependencyGraph
+added to the connector as processor recomputes each derived tag at most once
+per poll cycle, in topological order and only if one of its inputs changed::
+
+    >>> efficiency = DerivedTag("efficiency", "output / input",
+    ...                         {"output": power_out, "input": power_in})
+    >>> alarm = DerivedTag("overload", lambda e: e > 0.95, [efficiency],
+    ...                    datatype=bool)
+    >>> connector.add_processor(DependencyGraph([efficiency, alarm]))
+    >>> label = HMILabel(efficiency)
+
+The derived tags are computed before any signal of the cycle is emitted, so
+they can be used like any other tag in widgets, loggers, plots and alarms.
+
+"""
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, Set, Union
+import math
+import numpy as np
+from .connector import ChangeSet
+from .tag import Tag
+from .tagtable import TableTag
+
+
+EXPRESSION_NAMESPACE: Dict[str, Any] = {
+    name: getattr(math, name) for name in dir(math) if not name.startswith("_")
+}
+EXPRESSION_NAMESPACE.update({
+    "__builtins__": {}, "abs": abs, "min": min, "max": max, "round": round,
+    "int": int, "float": float, "bool": bool,
+})
+
+
+class DerivedTag(Tag):
+    """Read-only tag computed from input tags.
+
+    The expression is either a callable, which is called with the values of
+    the inputs in order, or a Python expression, which can use the names of
+    the inputs, the functions of the math module and abs, min, max, round,
+    int, float and bool. The result is None if any input value is None or
+    the expression raised an exception, which is stored in C{error}.
+
+    :type inputs: list(Tag)
+    :ivar inputs: input tags
+
+    :type expression: str or callable
+    :ivar expression: definition of the value
+
+    :type error: Exception
+    :ivar error: exception raised by the last computation, None if it
+                 succeeded
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        expression: Union[str, Callable[..., Any]],
+        inputs: Union[Sequence[Tag], Mapping[str, Tag]],
+        datatype: type = float,
+    ) -> None:
+        super(DerivedTag, self).__init__(name, None, None, datatype)
+        self.expression = expression
+        self.error: Any = None
+
+        if isinstance(inputs, Mapping):
+            self._names: List[str] = list(inputs.keys())
+            self.inputs: List[Tag] = list(inputs.values())
+        else:
+            self.inputs = list(inputs)
+            self._names = [tag.name for tag in self.inputs]
+
+        if callable(expression):
+            self._function = expression
+        else:
+            code = compile(expression, "<{}>".format(name), "eval")
+            names = self._names
+
+            def evaluate(*values: Any) -> Any:
+                return eval(code, EXPRESSION_NAMESPACE, dict(zip(names, values)))
+
+            self._function = evaluate
+
+    @property
+    def value(self) -> Any:
+        """Return the computed value."""
+        return Tag.value.fget(self)  # type: ignore
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        raise AttributeError("derived tag {} is read-only".format(self.name))
+
+    def subscribe(self, consumer: object) -> None:
+        """Register a consumer of the tag and of all its inputs.
+
+        With C{AbstractPLCConnector.poll_subscribed_only} the inputs are
+        polled as long as the derived tag is used.
+
+        """
+        super(DerivedTag, self).subscribe(consumer)
+        for tag in self.inputs:
+            tag.subscribe(consumer)
+
+    def unsubscribe(self, consumer: object) -> None:
+        """Remove a consumer from the tag and all its inputs."""
+        super(DerivedTag, self).unsubscribe(consumer)
+        for tag in self.inputs:
+            tag.unsubscribe(consumer)
+
+    def compute(self) -> Any:
+        """Return the value of the expression for the current input values."""
+        values = [tag.value for tag in self.inputs]
+        if any(value is None for value in values):
+            self.error = None
+            return None
+
+        try:
+            result = self._function(*values)
+        except Exception as e:
+            self.error = e
+            return None
+
+        self.error = None
+        return result
+
+    def update(self) -> bool:
+        """Recompute the value and emit C{value_changed()} if it changed."""
+        changed = self.update_raw_value(self.compute())
+        if changed:
+            self.value_changed.emit()
+        return changed
+
+
+class DependencyGraph(object):
+    """Recompute derived tags after each poll cycle.
+
+    Add the graph to the connector of the input tags with
+    C{AbstractPLCConnector.add_processor()}. Inputs may be other derived tags
+    of the same graph. Changed derived tags are added to the ChangeSet of the
+    cycle, so the connector emits their signals.
+
+    :type order: list(DerivedTag)
+    :ivar order: derived tags in topological order
+
+    """
+
+    def __init__(self, tags: Iterable[DerivedTag] = ()) -> None:
+        self.order: List[DerivedTag] = []
+        self._tags: List[DerivedTag] = []
+        self._views: Dict[Any, List[TableTag]] = {}
+        for tag in tags:
+            self._tags.append(tag)
+        self._sort()
+
+    def add(self, tag: DerivedTag) -> DerivedTag:
+        """Add a derived tag.
+
+        :raises ValueError: if the tag depends on itself
+
+        """
+        self._tags.append(tag)
+        try:
+            self._sort()
+        except ValueError:
+            self._tags.remove(tag)
+            raise
+        return tag
+
+    def remove(self, tag: DerivedTag) -> None:
+        """Remove a derived tag."""
+        self._tags.remove(tag)
+        self._sort()
+
+    def _sort(self) -> None:
+        """Sort the derived tags topologically (Kahn's algorithm)."""
+        tags = self._tags
+        members = set(tags)
+        dependents: Dict[DerivedTag, List[DerivedTag]] = {tag: [] for tag in tags}
+        pending = {}
+        for tag in tags:
+            parents = [t for t in set(tag.inputs) if t in members]
+            pending[tag] = len(parents)
+            for parent in parents:
+                dependents[parent].append(tag)  # type: ignore
+
+        ready = [tag for tag in tags if pending[tag] == 0]
+        order = []
+        while ready:
+            tag = ready.pop(0)
+            order.append(tag)
+            for child in dependents[tag]:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+
+        if len(order) != len(tags):
+            raise ValueError("circular dependency between derived tags")
+
+        self.order = order
+        self._views = {}
+        for tag in tags:
+            for input_tag in tag.inputs:
+                if isinstance(input_tag, TableTag):
+                    self._views.setdefault(input_tag.table, []).append(input_tag)
+
+    def update(self) -> List[DerivedTag]:
+        """Recompute all derived tags and emit their signals.
+
+        :return: changed derived tags
+
+        """
+        changed = [tag for tag in self.order if tag.update()]
+        return changed
+
+    def process(self, changes: ChangeSet) -> None:
+        """Recompute the derived tags whose inputs changed in the cycle."""
+        changed: Set[Tag] = set(changes.tags)
+        for table, rows in changes.rows:
+            views = self._views.get(table)
+            if views:
+                changed_rows = np.isin([view.index for view in views], rows)
+                changed.update(v for v, c in zip(views, changed_rows) if c)
+
+        if not changed:
+            return
+
+        for tag in self.order:
+            if any(input_tag in changed for input_tag in tag.inputs):
+                if tag.update_raw_value(tag.compute()):
+                    changed.add(tag)
+                    changes.tags.append(tag)
@@ -0,0 +1,210 @@
+"""Poll cycle statistics.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+Every finished poll cycle of a connector is recorded as a CycleRecord. The
+records are collected by a PollStatistics object in fixed size ring buffers,
+so recording costs only a few appends per cycle and can stay enabled in
+production. Percentiles and histograms are only calculated on request.
+
+"""
+from typing import Dict, List, Optional, Sequence
+from array import array
+from bisect import bisect_right
+import math
+
+
+class RollingSeries(object):
+    """Ring buffer holding the last C{size} float values.
+
+    :type size: int
+    :ivar size: maximum number of values
+
+    :type total: int
+    :ivar total: number of values added since the last reset
+
+    """
+
+    def __init__(self, size: int = 1000) -> None:
+        self.size = size
+        self.reset()
+
+    def __len__(self) -> int:
+        """Return number of stored values."""
+        return min(self.total, self.size)
+
+    def reset(self) -> None:
+        """Remove all values."""
+        self._values = array('d', [0.0]) * self.size
+        self.total = 0
+
+    def append(self, value: float) -> None:
+        """Add a value, the oldest value is dropped if the buffer is full."""
+        self._values[self.total % self.size] = value
+        self.total += 1
+
+    def values(self) -> List[float]:
+        """Return the stored values, oldest first."""
+        if self.total <= self.size:
+            return list(self._values[:self.total])
+        i = self.total % self.size
+        return list(self._values[i:]) + list(self._values[:i])
+
+    @property
+    def last(self) -> Optional[float]:
+        """Return the latest value."""
+        if self.total == 0:
+            return None
+        return self._values[(self.total - 1) % self.size]
+
+    def mean(self) -> float:
+        """Return mean of the stored values."""
+        n = len(self)
+        return sum(self._values[:n]) / n if n else 0.0
+
+    def max(self) -> float:
+        """Return maximum of the stored values."""
+        n = len(self)
+        return max(self._values[:n]) if n else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the p-th percentile (0 to 100) of the stored values.
+
+        Values between two ranks are interpolated linearly.
+
+        """
+        values = sorted(self._values[:len(self)])
+        if not values:
+            return 0.0
+
+        k = (len(values) - 1) * p / 100.0
+        lower = math.floor(k)
+        upper = math.ceil(k)
+        return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+    def histogram(self, edges: Sequence[float]) -> List[int]:
+        """Count the stored values per bin.
+
+        :param edges: ascending bin edges
+        :return: list with len(edges) + 1 counts, the first one counts all
+                 values below C{edges[0]}, the last one all values from
+                 C{edges[-1]} on
+
+        """
+        counts = [0] * (len(edges) + 1)
+        for value in self._values[:len(self)]:
+            counts[bisect_right(edges, value)] += 1
+        return counts
+
+
+class CycleRecord(object):
+    """Metrics of one poll cycle, times in seconds.
+
+    :ivar duration: time from preparing to finishing the cycle
+    :ivar read_time: time spent reading from the PLC
+    :ivar write_time: time spent writing to the PLC
+    :ivar tag_count: number of tags read and written
+    :ivar errors: number of connection errors
+    :ivar jitter: deviation of the timer tick from the timer interval, None if
+                  the cycle has not been started by the timer
+
+    """
+
+    def __init__(
+        self,
+        duration: float,
+        read_time: float,
+        write_time: float,
+        tag_count: int,
+        errors: int,
+        jitter: Optional[float] = None,
+    ) -> None:
+        self.duration = duration
+        self.read_time = read_time
+        self.write_time = write_time
+        self.tag_count = tag_count
+        self.errors = errors
+        self.jitter = jitter
+
+    def __repr__(self) -> str:
+        """Return readable representation."""
+        return "<CycleRecord duration={:.6f} tags={} errors={}>".format(
+            self.duration, self.tag_count, self.errors
+        )
+
+
+class PollStatistics(object):
+    """Rolling statistics of the poll cycles of a connector.
+
+    :type cycles: int
+    :ivar cycles: number of recorded cycles
+
+    :type errors: int
+    :ivar errors: number of connection errors in all recorded cycles
+
+    :type latency_target: float
+    :ivar latency_target: maximum desired time from changing a tag value to
+                          writing it to the PLC in seconds
+
+    :type latency_violations: int
+    :ivar latency_violations: number of writes exceeding C{latency_target}
+
+    """
+
+    METRICS = (
+        "duration", "read_time", "write_time", "tag_count", "jitter", "write_latency"
+    )
+
+    def __init__(self, size: int = 1000, latency_target: float = 0.05) -> None:
+        self.size = size
+        self.series: Dict[str, RollingSeries] = {
+            name: RollingSeries(size) for name in self.METRICS
+        }
+        self.cycles = 0
+        self.errors = 0
+        self.latency_target = latency_target
+        self.latency_violations = 0
+
+    def __getitem__(self, name: str) -> RollingSeries:
+        """Return the series of the given metric."""
+        return self.series[name]
+
+    def reset(self) -> None:
+        """Remove all recorded cycles."""
+        for series in self.series.values():
+            series.reset()
+        self.cycles = 0
+        self.errors = 0
+        self.latency_violations = 0
+
+    def add(self, record: CycleRecord) -> None:
+        """Record a finished cycle."""
+        series = self.series
+        series["duration"].append(record.duration)
+        series["read_time"].append(record.read_time)
+        series["write_time"].append(record.write_time)
+        series["tag_count"].append(record.tag_count)
+        if record.jitter is not None:
+            series["jitter"].append(record.jitter)
+        self.cycles += 1
+        self.errors += record.errors
+
+    def add_write_latency(self, latency: float) -> None:
+        """Record the time from changing a tag value to writing it."""
+        self.series["write_latency"].append(latency)
+        if latency > self.latency_target:
+            self.latency_violations += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return mean, median, 95th and 99th percentile and maximum of all metrics."""
+        return {
+            name: {
+                "mean": series.mean(),
+                "p50": series.percentile(50),
+                "p95": series.percentile(95),
+                "p99": series.percentile(99),
+                "max": series.max(),
+            }
+            for name, series in self.series.items()
+        }
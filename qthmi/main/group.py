@@ -0,0 +1,197 @@
+"""Poll several connectors in parallel.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A ConnectorGroup polls all of its connectors at the same time on a bounded
+thread pool, so the cycle time of the group follows the slowest PLC instead
+of the sum of all of them::
+
+    >>> group = ConnectorGroup(max_workers=4)
+    >>> for host in hosts:
+    ...     group.add_connector(ADSConnector(host), timeout=0.5)
+    >>> group.tags_changed.connect(dispatcher.dispatch)
+    >>> group.start_autopoll(200)
+
+The cycles of all connectors are prepared and finished in the GUI thread,
+only the PLC access runs in the pool. C{poll()} blocks the GUI thread until
+all connectors have finished or exceeded their timeouts, by default
+C{DEFAULT_TIMEOUT}. A connector that exceeds its timeout is not polled again
+before its running cycle has finished, the late cycle is applied with the
+next poll of the group.
+
+"""
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import time
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from .connector import AbstractPLCConnector, ChangeSet, PollCycle
+
+
+DEFAULT_TIMEOUT = 1.0  # seconds
+
+
+class ConnectorGroup(QObject):
+    """Poll several connectors in parallel.
+
+    The members must not be in threaded mode or poll on their own timers. The
+    signals C{tags_changed()} and C{polled()} of the members are still
+    emitted, C{tags_changed()} of the group is emitted once per group cycle
+    with the merged changes of all members.
+
+    :type connectors: list(AbstractPLCConnector)
+    :ivar connectors: members of the group
+
+    :type timeouts: dict
+    :ivar timeouts: timeout of each member in seconds, None for no timeout,
+                    which lets a hanging PLC block the GUI
+
+    :type late_cycles: int
+    :ivar late_cycles: number of member cycles that exceeded the timeout
+
+    """
+
+    polled = pyqtSignal()
+    tags_changed = pyqtSignal(object)
+    timedOut = pyqtSignal(object)
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        parent: QObject = None,
+    ) -> None:
+        super(ConnectorGroup, self).__init__(parent)
+        self.connectors: List[AbstractPLCConnector] = []
+        self.timeouts: Dict[AbstractPLCConnector, Optional[float]] = {}
+        self.default_timeout = timeout
+        self.late_cycles = 0
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[AbstractPLCConnector, Tuple[Future, PollCycle]] = {}
+        self._changes = ChangeSet()
+        self.autopoll_timer = QTimer(self)
+        self.autopoll_timer.timeout.connect(self.poll)
+
+    def add_connector(
+        self, connector: AbstractPLCConnector, timeout: float = None
+    ) -> None:
+        """Add a connector to the group.
+
+        :param timeout: maximum time to wait for a cycle of this connector in
+                        seconds, the default timeout of the group if None
+
+        """
+        self.connectors.append(connector)
+        self.timeouts[connector] = self.default_timeout if timeout is None else timeout
+        connector.tags_changed.connect(self._collect_changes)
+
+    def remove_connector(self, connector: AbstractPLCConnector) -> None:
+        """Remove a connector, a running cycle of it is dropped."""
+        self.connectors.remove(connector)
+        del self.timeouts[connector]
+        self._in_flight.pop(connector, None)
+        connector.tags_changed.disconnect(self._collect_changes)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Return the thread pool, it is created on first access."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers or len(self.connectors) or 1,
+                thread_name_prefix="qthmi-poll",
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Stop polling and wait for all running cycles to finish."""
+        self.stop_autopoll()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._in_flight.clear()
+
+    def _collect_changes(self, changes: ChangeSet) -> None:
+        self._changes.tags.extend(changes.tags)
+        self._changes.rows.extend(changes.rows)
+
+    def poll(self) -> None:
+        """Poll all connectors in parallel.
+
+        Late cycles of the previous poll are applied first. Then a cycle is
+        started for every connector that is not busy or down (see
+        C{AbstractPLCConnector.circuit_open}) and the results are
+        applied as soon as all connectors have finished or exceeded their
+        timeouts. Must be called from the GUI thread.
+
+        """
+        finished = [
+            (connector, future, cycle)
+            for connector, (future, cycle) in self._in_flight.items()
+            if future.done()
+        ]
+        for connector, _, _ in finished:
+            del self._in_flight[connector]
+
+        started = time.perf_counter()
+        submitted = []
+        for connector in self.connectors:
+            if connector in self._in_flight or connector.circuit_open:
+                continue
+            cycle = connector.prepare_cycle()
+            future = self.executor.submit(connector.exchange, cycle)
+            self._in_flight[connector] = (future, cycle)
+            submitted.append(connector)
+
+        def deadline(connector: AbstractPLCConnector) -> float:
+            timeout = self.timeouts[connector]
+            return float("inf") if timeout is None else started + timeout
+
+        for connector in sorted(submitted, key=deadline):
+            future, cycle = self._in_flight[connector]
+            remaining = deadline(connector) - time.perf_counter()
+            wait([future], timeout=None if remaining == float("inf")
+                 else max(0.0, remaining))
+            if future.done():
+                del self._in_flight[connector]
+                finished.append((connector, future, cycle))
+            else:
+                self.late_cycles += 1
+                self.timedOut.emit(connector)
+
+        self._finish(finished)
+
+    def _finish(
+        self, finished: List[Tuple[AbstractPLCConnector, Future, PollCycle]]
+    ) -> None:
+        """Apply the finished cycles and emit the merged changes.
+
+        Exceptions other than ConnectionError raised by C{exchange()} are
+        re-raised after all other cycles have been applied, the first one
+        if several members failed.
+
+        """
+        self._changes = ChangeSet()
+        error: Optional[BaseException] = None
+        for connector, future, cycle in finished:
+            exception = future.exception()
+            if exception is None:
+                connector.finish_cycle(cycle)
+            elif error is None:
+                error = exception
+
+        changes = self._changes
+        self._changes = ChangeSet()
+        if changes:
+            self.tags_changed.emit(changes)
+        self.polled.emit()
+        if error is not None:
+            raise error
+
+    def start_autopoll(self, poll_interval: int = 100) -> None:
+        """Poll the group periodically, the interval is given in ms."""
+        self.autopoll_timer.start(poll_interval)
+
+    def stop_autopoll(self) -> None:
+        """Stop periodic polling."""
+        self.autopoll_timer.stop()
@@ -0,0 +1,118 @@
+"""Ring buffer of tag values.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A TagHistory stores one sample of all its tags per poll cycle in
+preallocated arrays. Each consumer drains the samples added since its last
+read as one batch, so loggers and plots can be refreshed slower than the PLC
+is polled without losing values::
+
+    >>> history = buffer.enable_history(capacity=100000)
+    >>> timestamps, values = history.drain(logger)
+
+"""
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import time
+import numpy as np
+from .tag import Tag
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TagHistory(object):
+    """Preallocated ring buffer of timestamps and tag values.
+
+    Values are stored as float64, None and non-numeric values as NaN. If a
+    consumer does not drain the buffer for more than C{capacity} samples the
+    oldest samples are lost, their number is added to C{lost[consumer]}.
+
+    :type tags: list(Tag)
+    :ivar tags: tags of the columns
+
+    :type capacity: int
+    :ivar capacity: maximum number of samples
+
+    :type count: int
+    :ivar count: number of samples appended since creation
+
+    :type latest: numpy.ndarray
+    :ivar latest: current value of each column, appended by C{sample()}
+
+    :type lost: dict
+    :ivar lost: number of samples lost per consumer
+
+    """
+
+    def __init__(self, tags: Iterable[Tag], capacity: int = 10000) -> None:
+        self.tags: List[Tag] = list(tags)
+        self.capacity = capacity
+        self.count = 0
+        self.timestamps = np.zeros(capacity, np.float64)
+        self.values = np.full((capacity, len(self.tags)), np.nan)
+        self.latest = np.full(len(self.tags), np.nan)
+        self.lost: Dict[Hashable, int] = {}
+        self._columns: Dict[Tag, int] = {tag: i for i, tag in enumerate(self.tags)}
+        self._cursors: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        """Return number of stored samples."""
+        return min(self.count, self.capacity)
+
+    def column(self, tag: Tag) -> int:
+        """Return the column index of a tag."""
+        return self._columns[tag]
+
+    def set_value(self, tag: Tag, value: Any) -> None:
+        """Set the current value of a column, it is stored by C{sample()}."""
+        i = self._columns.get(tag)
+        if i is not None:
+            self.latest[i] = _to_float(value)
+
+    def sample(self, timestamp: Optional[float] = None) -> None:
+        """Append C{latest} as one sample.
+
+        :param timestamp: time of the sample, C{time.time()} if None
+
+        """
+        self.append(time.time() if timestamp is None else timestamp, self.latest)
+
+    def append(self, timestamp: float, values: Any) -> None:
+        """Append one sample with a value for each column."""
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.values[i] = values
+        self.count += 1
+
+    def drain(self, consumer: Hashable) -> Tuple[np.ndarray, np.ndarray]:
+        """Return all samples added since the last drain of the consumer.
+
+        The first drain of a consumer returns all stored samples.
+
+        :return: timestamps with shape (n,) and values with shape
+                 (n, len(tags)), both are copies
+
+        """
+        count = self.count
+        start = self._cursors.get(consumer, 0)
+        oldest = max(0, count - self.capacity)
+        if start < oldest:
+            if consumer in self._cursors:
+                self.lost[consumer] = self.lost.get(consumer, 0) + oldest - start
+            start = oldest
+        self._cursors[consumer] = count
+
+        index = np.arange(start, count) % self.capacity
+        return self.timestamps[index], self.values[index]
+
+    def release(self, consumer: Hashable) -> None:
+        """Forget the read position of a consumer."""
+        self._cursors.pop(consumer, None)
+        self.lost.pop(consumer, None)
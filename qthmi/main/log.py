@@ -11,9 +11,11 @@
 from abc import abstractmethod, abstractproperty
 from typing import List, Optional, TextIO, cast, Union
 import csv
+import math
 import time
 from PyQt5.QtCore import QObject
 from PyQt5.QtWidgets import QWidget
+from .history import TagHistory
 from .tag import Tag
 
 
@@ -53,7 +55,14 @@ class CSVWriter(QObject):
         self.dialect = dialect
 
     def open(self, filename: str) -> None:
-        """Open file for CSV output."""
+        """Open file for CSV output.
+
+        All tags are subscribed until the file is closed.
+
+        """
+        for tag in self.tags:
+            tag.subscribe(self)
+
         self._file = open(filename, "w")
         self._writer = cast(_CSVWriter, csv.writer(self._file, self.dialect))
 
@@ -67,6 +76,9 @@ class CSVWriter(QObject):
         if self._file is not None:
             self._file.close()
 
+        for tag in self.tags:
+            tag.unsubscribe(self)
+
         self._writer = None
 
     def write_value_to_tag(self) -> None:
@@ -93,3 +105,24 @@ class CSVWriter(QObject):
         data = [time.time()]
         data.extend([tag.value for tag in self.tags])
         self._writer.writerow([str(x) for x in data])
+
+    def write_history(self, history: TagHistory) -> int:
+        """Write all samples of a TagHistory added since the last call.
+
+        The tags of the writer have to be columns of the history. Missing
+        values are written as None like in C{writerow()}.
+
+        :return: number of written rows
+
+        """
+        if self._writer is None:
+            raise IOError("File not open")
+
+        timestamps, values = history.drain(self)
+        columns = [history.column(tag) for tag in self.tags]
+        rows = [
+            [str(t)] + [str(None if math.isnan(v) else v) for v in row]
+            for t, row in zip(timestamps.tolist(), values[:, columns].tolist())
+        ]
+        self._writer.writerows(rows)
+        return len(rows)
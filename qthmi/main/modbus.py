@@ -0,0 +1,621 @@
+"""Modbus/TCP connector.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+Tag addresses follow the six digit Modicon convention, the first digit
+selects the data area and the others are the one based register number::
+
+    000001 - 065536  coils
+    100001 - 165536  discrete inputs
+    300001 - 365536  input registers
+    400001 - 465536  holding registers
+
+Registers are decoded by a big endian DatatypeRegistry, tags without
+C{plc_datatype} are read as UINT. Coils and discrete inputs always occupy
+one address and are read as bool::
+
+    >>> connector = ModbusTCPConnector("192.168.0.10")
+    >>> connector.add_tag(Tag("speed", holding_register(100), REAL, float))
+    >>> connector.add_tag(Tag("alarm", holding_register(10), bit(3), bool))
+    >>> connector.add_tag(Tag("running", coil(0), datatype=bool))
+    >>> connector.start_autopoll(100)
+
+The tags are read with as few requests as possible, all requests of a cycle
+are sent over one persistent connection without waiting for the previous
+responses, up to C{max_in_flight} at a time.
+
+ModbusServer is a small in-process server for tests and benchmarks.
+
+"""
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union, cast
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from .connector import AbstractPLCConnector, ConnectionError, ReadBlock, TransportError
+from .datatypes import UINT, DatatypeRegistry
+from .tag import Tag
+from .tagtable import TagTable
+
+
+COIL = 0
+DISCRETE_INPUT = 100000
+INPUT_REGISTER = 300000
+HOLDING_REGISTER = 400000
+AREA_SIZE = 65536
+
+READ_COILS = 1
+READ_DISCRETE_INPUTS = 2
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_COIL = 5
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_COILS = 15
+WRITE_MULTIPLE_REGISTERS = 16
+MASK_WRITE_REGISTER = 22
+
+MAX_READ_BITS = 2000
+MAX_READ_REGISTERS = 125
+MAX_WRITE_BITS = 1968
+MAX_WRITE_REGISTERS = 123
+
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+
+_READ_FUNCTIONS = {
+    COIL: READ_COILS,
+    DISCRETE_INPUT: READ_DISCRETE_INPUTS,
+    INPUT_REGISTER: READ_INPUT_REGISTERS,
+    HOLDING_REGISTER: READ_HOLDING_REGISTERS,
+}
+
+_MBAP = struct.Struct(">HHHB")
+
+
+class ModbusException(ConnectionError):
+    """Exception response of the device, e.g. for an illegal address.
+
+    The connection stays usable, so only the affected request fails.
+
+    :type function: int
+    :ivar function: function code of the request
+
+    :type code: int
+    :ivar code: exception code, e.g. C{ILLEGAL_ADDRESS}
+
+    """
+
+    def __init__(self, function: int, code: int) -> None:
+        super(ModbusException, self).__init__(
+            "Modbus exception {} of function {}".format(code, function)
+        )
+        self.function = function
+        self.code = code
+
+
+def coil(n: int) -> int:
+    """Return the address of the zero based coil n."""
+    return COIL + n + 1
+
+
+def discrete_input(n: int) -> int:
+    """Return the address of the zero based discrete input n."""
+    return DISCRETE_INPUT + n + 1
+
+
+def input_register(n: int) -> int:
+    """Return the address of the zero based input register n."""
+    return INPUT_REGISTER + n + 1
+
+
+def holding_register(n: int) -> int:
+    """Return the address of the zero based holding register n."""
+    return HOLDING_REGISTER + n + 1
+
+
+def split_address(address: int) -> Tuple[int, int]:
+    """Return data area and zero based offset of an address.
+
+    :raises ValueError: if the address is not in a data area
+
+    """
+    area = address // 100000 * 100000
+    offset = address - area - 1
+    if area not in _READ_FUNCTIONS or not 0 <= offset < AREA_SIZE:
+        raise ValueError("invalid Modbus address {}".format(address))
+    return area, offset
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Receive exactly C{size} bytes, raise TransportError on EOF."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise TransportError("connection closed by peer")
+        data += chunk
+    return bytes(data)
+
+
+class ModbusTCPConnector(AbstractPLCConnector):
+    """Connector for Modbus/TCP devices.
+
+    The connection is opened by the first request and kept open. After a
+    transport error it is closed and opened again by the next cycle, see
+    C{AbstractPLCConnector.reconnect()}. Exception responses of the device
+    are reported as ModbusException and only fail the affected tags.
+
+    :type host: str
+    :ivar host: host name or IP address of the device
+
+    :type port: int
+    :ivar port: TCP port
+
+    :type unit: int
+    :ivar unit: unit identifier, e.g. of a device behind a gateway
+
+    :type timeout: float
+    :ivar timeout: socket timeout in seconds
+
+    :type max_in_flight: int
+    :ivar max_in_flight: maximum number of requests sent before waiting for
+                         their responses
+
+    :type requests: int
+    :ivar requests: number of requests sent
+
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 502,
+        unit: int = 1,
+        timeout: float = 1.0,
+        max_in_flight: int = 8,
+    ) -> None:
+        super(ModbusTCPConnector, self).__init__()
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.requests = 0
+        self.datatypes = DatatypeRegistry(">", 2, default=UINT)
+        self.max_block_length = MAX_READ_REGISTERS
+        self._socket: Optional[socket.socket] = None
+        self._transaction = 0
+
+    def connect(self) -> socket.socket:
+        """Open the connection if it is not open and return the socket."""
+        if self._socket is None:
+            try:
+                sock = socket.create_connection((self.host, self.port), self.timeout)
+            except OSError as e:
+                raise TransportError(
+                    "can not connect to {}:{}: {}".format(self.host, self.port, e)
+                )
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._socket = sock
+        return self._socket
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def reconnect(self) -> None:
+        """Close the connection and open it again."""
+        self.close()
+        self.connect()
+
+    def transact(self, pdus: Sequence[bytes]) -> List[Union[bytes, ModbusException]]:
+        """Send request PDUs and return their responses.
+
+        Up to C{max_in_flight} requests are sent before the first response
+        is awaited. Responses are matched by their transaction identifier.
+
+        :return: response PDU or ModbusException for an exception response,
+                 in the order of the requests
+        :raises TransportError: on transport errors, the connection is
+                                closed then
+
+        """
+        sock = self.connect()
+        results: List[Any] = [None] * len(pdus)
+        pending: Dict[int, int] = {}
+        sent = 0
+
+        try:
+            while sent < len(pdus) or pending:
+                frames = []
+                while sent < len(pdus) and len(pending) < self.max_in_flight:
+                    self._transaction = tid = (self._transaction + 1) & 0xFFFF
+                    pdu = pdus[sent]
+                    frames.append(_MBAP.pack(tid, 0, len(pdu) + 1, self.unit) + pdu)
+                    pending[tid] = sent
+                    sent += 1
+                if frames:
+                    sock.sendall(b"".join(frames))
+                    self.requests += len(frames)
+
+                tid, _, length, _ = _MBAP.unpack(_recv_exact(sock, _MBAP.size))
+                response = _recv_exact(sock, length - 1)
+                index = pending.pop(tid, None)
+                if index is None or not response:
+                    raise TransportError("invalid response {}".format(tid))
+
+                if response[0] & 0x80:
+                    results[index] = ModbusException(response[0] & 0x7F, response[1])
+                else:
+                    results[index] = response
+        except TransportError:
+            self.close()
+            raise
+        except OSError as e:
+            self.close()
+            raise TransportError(str(e))
+
+        return results
+
+    def _transact_all(self, pdus: Sequence[bytes]) -> None:
+        """Send requests, raise the first exception response."""
+        for result in self.transact(pdus):
+            if isinstance(result, ModbusException):
+                raise result
+
+    def tag_span(self, tag: Tag) -> Tuple[int, int]:
+        """Return start address and size, coils occupy one address."""
+        if tag.address < INPUT_REGISTER:
+            return tag.address, 1
+        return super(ModbusTCPConnector, self).tag_span(tag)
+
+    def table_spans(
+        self, table: TagTable, rows: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return start addresses and sizes, coils occupy one address."""
+        starts, sizes = super(ModbusTCPConnector, self).table_spans(table, rows)
+        sizes[starts < INPUT_REGISTER] = 1
+        return starts, sizes
+
+    def decode_block(self, block: ReadBlock, buffer: Sequence) -> List[Tuple[Tag, Any]]:
+        """Decode registers, coils are taken from the list of bools."""
+        if block.start < INPUT_REGISTER:
+            return [(tag, buffer[tag.address - block.start]) for tag in block.tags]
+        return super(ModbusTCPConnector, self).decode_block(block, buffer)
+
+    def decode_table_block(
+        self, table: TagTable, rows: np.ndarray, start: int, buffer: Sequence
+    ) -> np.ndarray:
+        """Decode registers, coils are taken from the list of bools."""
+        if start < INPUT_REGISTER:
+            return np.asarray(buffer)[table.addresses[rows] - start]
+        return super(ModbusTCPConnector, self).decode_table_block(
+            table, rows, start, buffer
+        )
+
+    def encode_block(self, block: ReadBlock, raw_values: Dict[Tag, Any]) -> Sequence:
+        """Encode registers as bytes, coils as list of bools."""
+        if block.start < INPUT_REGISTER:
+            buffer = [False] * block.length
+            for tag in block.tags:
+                buffer[tag.address - block.start] = bool(raw_values[tag])
+            return buffer
+        return super(ModbusTCPConnector, self).encode_block(block, raw_values)
+
+    def read_blocks(
+        self, spans: List[Tuple[int, int]]
+    ) -> List[Union[Sequence, ConnectionError]]:
+        """Read all blocks with pipelined requests.
+
+        :return: bytes for registers, list of bools for coils and discrete
+                 inputs
+
+        """
+        pdus = []
+        for start, length in spans:
+            area, offset = split_address(start)
+            pdus.append(struct.pack(">BHH", _READ_FUNCTIONS[area], offset, length))
+
+        try:
+            responses = self.transact(pdus)
+        except TransportError as e:
+            return [e]
+
+        buffers: List[Union[Sequence, ConnectionError]] = []
+        for (start, length), response in zip(spans, responses):
+            if isinstance(response, ModbusException):
+                buffers.append(response)
+            elif start < INPUT_REGISTER:
+                bits = np.unpackbits(
+                    np.frombuffer(response, np.uint8, offset=2), bitorder="little"
+                )
+                buffers.append(bits[:length].astype(bool).tolist())
+            else:
+                buffers.append(response[2:2 + 2 * length])
+        return buffers
+
+    def read_block(self, start: int, length: int) -> Sequence:
+        """Read a block of registers, coils or discrete inputs."""
+        buffer = self.read_blocks([(start, length)])[0]
+        if isinstance(buffer, ConnectionError):
+            raise buffer
+        return buffer
+
+    def write_block(self, start: int, values: Sequence) -> None:
+        """Write a block of holding registers or coils.
+
+        :param values: bytes for registers, list of bools for coils
+
+        """
+        area, offset = split_address(start)
+        pdus = []
+        if area == COIL:
+            bits = np.array([bool(value) for value in values])
+            for i in range(0, len(bits), MAX_WRITE_BITS):
+                chunk = bits[i:i + MAX_WRITE_BITS]
+                packed = np.packbits(chunk, bitorder="little").tobytes()
+                pdus.append(struct.pack(
+                    ">BHHB", WRITE_MULTIPLE_COILS, offset + i, len(chunk), len(packed)
+                ) + packed)
+        elif area == HOLDING_REGISTER:
+            data = bytes(values)
+            for i in range(0, len(data) // 2, MAX_WRITE_REGISTERS):
+                registers = data[2 * i:2 * (i + MAX_WRITE_REGISTERS)]
+                pdus.append(struct.pack(
+                    ">BHHB", WRITE_MULTIPLE_REGISTERS, offset + i,
+                    len(registers) // 2, len(registers)
+                ) + registers)
+        else:
+            raise ValueError("Modbus address {} is read-only".format(start))
+
+        self._transact_all(pdus)
+
+    def read_from_plc(self, address: int, datatype: Optional[int]) -> Any:
+        """Read a single value."""
+        if address < INPUT_REGISTER:
+            return self.read_block(address, 1)[0]
+        datatypes = cast(DatatypeRegistry, self.datatypes)
+        buffer = self.read_block(address, datatypes.units(datatype))
+        return datatypes.decode_value(datatype, buffer)
+
+    def write_to_plc(self, address: int, value: Any, datatype: Optional[int]) -> None:
+        """Write a single value.
+
+        Bits of holding registers are written with a mask write request, so
+        the other bits of the register are not changed.
+
+        """
+        area, offset = split_address(address)
+        datatypes = cast(DatatypeRegistry, self.datatypes)
+        if area == COIL:
+            self._transact_all([struct.pack(
+                ">BHH", WRITE_SINGLE_COIL, offset, 0xFF00 if value else 0
+            )])
+        elif area != HOLDING_REGISTER:
+            raise ValueError("Modbus address {} is read-only".format(address))
+        elif datatypes.is_bit(datatype):
+            mask = 1 << datatypes.info(datatype)[3]
+            self._transact_all([struct.pack(
+                ">BHHH", MASK_WRITE_REGISTER, offset, 0xFFFF & ~mask,
+                mask if value else 0
+            )])
+        else:
+            self.write_block(address, datatypes.encode_value(datatype, value))
+
+
+class _ModbusHandler(socketserver.BaseRequestHandler):
+    """Serve one client connection of a ModbusServer.
+
+    Requests are processed as they arrive, the responses are sent by a
+    second thread after the latency of the server, like over a slow link.
+
+    """
+
+    def handle(self) -> None:
+        server: ModbusServer = self.server.modbus  # type: ignore
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        server._connected(sock)
+        responses: queue.Queue = queue.Queue()
+        sender = threading.Thread(target=self._send, args=(sock, responses))
+        sender.start()
+        try:
+            while True:
+                tid, _, length, unit = _MBAP.unpack(_recv_exact(sock, _MBAP.size))
+                response = server.handle(_recv_exact(sock, length - 1))
+                frame = _MBAP.pack(tid, 0, len(response) + 1, unit) + response
+                responses.put((time.monotonic() + server.latency, frame))
+        except (ConnectionError, OSError, struct.error):
+            pass
+        finally:
+            responses.put(None)
+            sender.join()
+            server._disconnected(sock)
+
+    @staticmethod
+    def _send(sock: socket.socket, responses: queue.Queue) -> None:
+        while True:
+            item = responses.get()
+            if item is None:
+                return
+            due, frame = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                sock.sendall(frame)
+            except OSError:
+                return
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ModbusServer(object):
+    """In-process Modbus/TCP server.
+
+    Serves the read and write functions used by ModbusTCPConnector from
+    arrays, so connectors can be tested and benchmarked without hardware::
+
+        >>> server = ModbusServer()
+        >>> server.start()
+        >>> server.holding_registers[:3] = [1, 2, 3]
+        >>> connector = ModbusTCPConnector(*server.address)
+
+    :type coils: numpy.ndarray
+    :ivar coils: coil values
+
+    :type discrete_inputs: numpy.ndarray
+    :ivar discrete_inputs: discrete input values
+
+    :type input_registers: numpy.ndarray
+    :ivar input_registers: input register values
+
+    :type holding_registers: numpy.ndarray
+    :ivar holding_registers: holding register values
+
+    :type latency: float
+    :ivar latency: delay of each response in seconds
+
+    :type requests: int
+    :ivar requests: number of handled requests
+
+    :type connections: int
+    :ivar connections: number of accepted connections
+
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.coils = np.zeros(AREA_SIZE, bool)
+        self.discrete_inputs = np.zeros(AREA_SIZE, bool)
+        self.input_registers = np.zeros(AREA_SIZE, np.uint16)
+        self.holding_registers = np.zeros(AREA_SIZE, np.uint16)
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._sockets: Set[socket.socket] = set()
+        self._server = _TCPServer((host, port), _ModbusHandler)
+        self._server.modbus = self  # type: ignore
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Return host and port the server listens on."""
+        host, port = self._server.server_address[:2]
+        return str(host), port
+
+    def start(self) -> None:
+        """Serve clients in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,)
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close all client connections."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _connected(self, sock: socket.socket) -> None:
+        with self._lock:
+            self.connections += 1
+            self._sockets.add(sock)
+
+    def _disconnected(self, sock: socket.socket) -> None:
+        with self._lock:
+            self._sockets.discard(sock)
+
+    def handle(self, pdu: bytes) -> bytes:
+        """Return the response PDU of a request PDU."""
+        function = pdu[0]
+        with self._lock:
+            self.requests += 1
+            try:
+                return self._handle(function, pdu)
+            except struct.error:
+                return bytes([function | 0x80, ILLEGAL_VALUE])
+
+    def _handle(self, function: int, pdu: bytes) -> bytes:
+        areas = {
+            READ_COILS: self.coils,
+            READ_DISCRETE_INPUTS: self.discrete_inputs,
+            READ_HOLDING_REGISTERS: self.holding_registers,
+            READ_INPUT_REGISTERS: self.input_registers,
+        }
+
+        def exception(code: int) -> bytes:
+            return bytes([function | 0x80, code])
+
+        if function in areas:
+            offset, count = struct.unpack_from(">HH", pdu, 1)
+            limit = MAX_READ_BITS if function <= READ_DISCRETE_INPUTS \
+                else MAX_READ_REGISTERS
+            if not 1 <= count <= limit:
+                return exception(ILLEGAL_VALUE)
+            if offset + count > AREA_SIZE:
+                return exception(ILLEGAL_ADDRESS)
+            values = areas[function][offset:offset + count]
+            if function <= READ_DISCRETE_INPUTS:
+                data = np.packbits(values, bitorder="little").tobytes()
+            else:
+                data = values.astype(">u2").tobytes()
+            return struct.pack(">BB", function, len(data)) + data
+
+        if function == WRITE_SINGLE_COIL:
+            offset, value = struct.unpack_from(">HH", pdu, 1)
+            if value not in (0, 0xFF00):
+                return exception(ILLEGAL_VALUE)
+            self.coils[offset] = value == 0xFF00
+            return pdu[:5]
+
+        if function == WRITE_SINGLE_REGISTER:
+            offset, value = struct.unpack_from(">HH", pdu, 1)
+            self.holding_registers[offset] = value
+            return pdu[:5]
+
+        if function == MASK_WRITE_REGISTER:
+            offset, and_mask, or_mask = struct.unpack_from(">HHH", pdu, 1)
+            value = int(self.holding_registers[offset])
+            self.holding_registers[offset] = (value & and_mask) | (or_mask & ~and_mask)
+            return pdu[:7]
+
+        if function in (WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS):
+            offset, count, size = struct.unpack_from(">HHB", pdu, 1)
+            if offset + count > AREA_SIZE:
+                return exception(ILLEGAL_ADDRESS)
+            if function == WRITE_MULTIPLE_COILS:
+                if not 1 <= count <= MAX_WRITE_BITS or size != (count + 7) // 8:
+                    return exception(ILLEGAL_VALUE)
+                bits = np.unpackbits(
+                    np.frombuffer(pdu, np.uint8, size, 6), bitorder="little"
+                )
+                self.coils[offset:offset + count] = bits[:count]
+            else:
+                if not 1 <= count <= MAX_WRITE_REGISTERS or size != 2 * count:
+                    return exception(ILLEGAL_VALUE)
+                self.holding_registers[offset:offset + count] = np.frombuffer(
+                    pdu, ">u2", count, 6
+                )
+            return pdu[:5]
+
+        return exception(ILLEGAL_FUNCTION)
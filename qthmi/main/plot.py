@@ -61,6 +61,7 @@ class BaseObserver(HMIWidget):
         self.ax = ax
         self.plot_style = plot_style
         self.starttime: Optional[datetime] = None
+        self.tag.subscribe(self)
 
 
 class Observer(BaseObserver):
@@ -0,0 +1,453 @@
+"""Out-of-process poll engine.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+PLC access and decoding compete with the GUI for the interpreter lock, even
+in threaded mode. The ProcessPollEngine runs the poll loop of a connector in
+a separate process instead. The raw values are written to a SharedTagTable,
+a TagTable whose values live in a memory-mapped file, and the GUI reads them
+in place::
+
+    >>> table = SharedTagTable(capacity=50000)
+    >>> for i in range(50000):
+    ...     table.add("tag{}".format(i), i)
+    >>> engine = ProcessPollEngine(functools.partial(ADSConnector, host), table)
+    >>> engine.start()
+    >>> label = HMILabel(table.tag("tag42"))
+
+The connector is created in the poll process by calling C{factory}, so the
+factory has to be picklable, e.g. a module level function or a
+functools.partial of a class. Other processes on the same machine can map the
+table with C{SharedTagTable.attach(table.layout())}.
+
+The table is protected by a sequence counter: the poll process makes it odd
+before and even after writing a cycle. Readers retry if the counter is odd or
+changed while they were reading.
+
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import mmap
+import multiprocessing
+import os
+import pickle
+import queue
+import tempfile
+import time
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from .connector import CONNECTED, DOWN, AbstractPLCConnector, ChangeSet
+from .tagtable import TagTable
+
+
+_HEADER_SIZE = 16  # sequence counter and cycle number, both uint64
+
+
+def _shared_dir() -> Optional[str]:
+    """Return a RAM backed directory if available."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+class SharedTagTable(TagTable):
+    """TagTable with raw values in a memory-mapped file.
+
+    The capacity is fixed. Names, addresses and datatypes are kept in each
+    process, only raw values, valid flags and the cycle of the last change
+    of each row are shared.
+
+    Values assigned in the GUI are kept locally until the poll process has
+    written them, see C{ProcessPollEngine}.
+
+    :type path: str
+    :ivar path: path of the mapped file
+
+    :type owner: bool
+    :ivar owner: True if the table created the file, it is removed on
+                 C{close()}
+
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        dtype: Any = np.float64,
+        path: str = None,
+    ) -> None:
+        super(SharedTagTable, self).__init__(dtype, capacity)
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.owner = path is None
+        self._pending: Dict[int, Any] = {}
+
+        itemsize = self.dtype.itemsize
+        changed_offset = _HEADER_SIZE
+        values_offset = changed_offset + 8 * capacity
+        valid_offset = values_offset + itemsize * capacity
+        size = valid_offset + capacity
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="qthmi-", suffix=".table",
+                                        dir=_shared_dir())
+            os.ftruncate(fd, size)
+            os.close(fd)
+        self.path = path
+
+        with open(path, "r+b") as f:
+            self._mmap: Optional[mmap.mmap] = mmap.mmap(f.fileno(), size)
+        buffer = self._mmap
+        self._header = np.frombuffer(buffer, np.uint64, 2, 0)
+        self._changed = np.frombuffer(buffer, np.uint64, capacity, changed_offset)
+        self._raw_values = np.frombuffer(buffer, self.dtype, capacity, values_offset)
+        self._valid = np.frombuffer(buffer, bool, capacity, valid_offset)
+
+    @classmethod
+    def attach(cls, layout: Dict[str, Any]) -> 'SharedTagTable':
+        """Map an existing table described by C{layout()}."""
+        table = cls(layout["capacity"], layout["dtype"], layout["path"])
+        table.scan_group = layout["scan_group"]
+        for name, address, plc_datatype, datatype in zip(
+            layout["names"], layout["addresses"], layout["plc_datatypes"],
+            layout["datatypes"],
+        ):
+            table.add(name, address, None if plc_datatype < 0 else plc_datatype,
+                      datatype)
+        return table
+
+    def layout(self) -> Dict[str, Any]:
+        """Return a picklable description of the table for C{attach()}."""
+        return {
+            "path": self.path,
+            "capacity": self.capacity,
+            "dtype": self.dtype.str,
+            "names": list(self.names),
+            "addresses": self.addresses.tolist(),
+            "plc_datatypes": self.plc_datatypes.tolist(),
+            "datatypes": list(self.datatypes),
+            "scan_group": self.scan_group,
+        }
+
+    def close(self) -> None:
+        """Unmap the file, the last values stay readable as a local copy."""
+        if self._mmap is None:
+            return
+        self._header = self._header.copy()
+        self._changed = self._changed.copy()
+        self._raw_values = self._raw_values.copy()
+        self._valid = self._valid.copy()
+        self._mmap.close()
+        self._mmap = None
+        if self.owner:
+            os.remove(self.path)
+
+    def _grow(self) -> None:
+        raise ValueError("SharedTagTable is full")
+
+    @property
+    def cycle(self) -> int:
+        """Return the number of the last published cycle."""
+        return int(self._header[1])
+
+    def get_raw(self, index: int) -> Any:
+        """Return the raw value of a row, a pending local value first."""
+        if index in self._pending:
+            return self._pending[index]
+        return super(SharedTagTable, self).get_raw(index)
+
+    def set_raw(self, index: int, value: Any) -> None:
+        """Keep the value locally until it has been written to the PLC."""
+        self._pending[index] = value
+
+    def clear_pending(self, index: int) -> None:
+        """Drop the local value of a row."""
+        self._pending.pop(index, None)
+
+    def publish(self, updates: Iterable[Tuple[np.ndarray, Any]]) -> None:
+        """Write the values of one cycle, only called by the poll process.
+
+        :param updates: (rows, values) tuples
+
+        """
+        header = self._header
+        header[0] += 1
+        cycle = header[1] + 1
+        for rows, values in updates:
+            rows = np.asarray(rows, np.int64)
+            values = np.asarray(values, self.dtype)
+            changed = ~self._valid[rows] | (self._raw_values[rows] != values)
+            self._raw_values[rows] = values
+            self._valid[rows] = True
+            self._changed[rows[changed]] = cycle
+        header[1] = cycle
+        header[0] += 1
+
+    def changed_rows(self, since: int) -> Optional[Tuple[int, np.ndarray]]:
+        """Return the current cycle and the rows changed after cycle C{since}.
+
+        None is returned if the poll process is writing at the same time.
+
+        """
+        sequence = int(self._header[0])
+        if sequence % 2:
+            return None
+        cycle = int(self._header[1])
+        rows = np.nonzero(self._changed[:len(self)] > since)[0]
+        if int(self._header[0]) != sequence:
+            return None
+        return cycle, rows
+
+    def snapshot(self) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Return a consistent copy of the cycle, the raw values and valid flags."""
+        n = len(self)
+        while True:
+            sequence = int(self._header[0])
+            if not sequence % 2:
+                cycle = int(self._header[1])
+                values = self._raw_values[:n].copy()
+                valid = self._valid[:n].copy()
+                if int(self._header[0]) == sequence:
+                    return cycle, values, valid
+            time.sleep(0)
+
+
+def _run_engine(
+    factory: Callable[[], AbstractPLCConnector],
+    layout: Dict[str, Any],
+    interval: float,
+    writes: Any,
+    results: Any,
+    stop: Any,
+) -> None:
+    """Poll loop of the poll process.
+
+    Writes are received as (row, value, write id) tuples. The connection
+    state of the connector is updated after each cycle and no cycle is run
+    while C{circuit_open} is set. After a cycle is published the GUI process
+    gets an (errors, failed writes, done writes, cycle, state) tuple if
+    anything happened, the writes as (row, write id) tuples.
+
+    """
+    connector = factory()
+    table = SharedTagTable.attach(layout)
+    connector.add_table(table)
+    state = connector.connection_state
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            if not connector.circuit_open:
+                cycle = connector.prepare_cycle()
+                write_ids = {}
+                while True:
+                    try:
+                        index, value, write_id = writes.get_nowait()
+                    except queue.Empty:
+                        break
+                    view = table.tag(table.names[index])
+                    cycle.writes.append((view, value))
+                    write_ids[view] = write_id
+
+                connector.exchange(cycle)
+                connector.update_connection_state(not cycle.transport_failed)
+                table.publish(
+                    (rows, values) for t, rows, values in cycle.table_values
+                    if t is table
+                )
+
+                failed = set(cycle.failed_writes)
+                done = [(view.index, write_id) for view, write_id in write_ids.items()
+                        if view not in failed]
+                failed_ids = [(view.index, write_ids[view]) for view in failed
+                              if view in write_ids]
+                if (cycle.errors or write_ids
+                        or connector.connection_state != state):
+                    state = connector.connection_state
+                    results.put((cycle.errors, failed_ids, done, table.cycle, state))
+
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        table.close()
+
+
+class ProcessPollEngine(QObject):
+    """Poll a connector in a separate process.
+
+    Changes are picked up by a timer in the GUI process: C{value_changed()}
+    of the table views is emitted and C{tags_changed()} once per check with
+    all rows changed since the last check. Values assigned to table views are
+    sent to the poll process and written in its next cycle. They are kept
+    locally until the poll process has reported the cycle that wrote them,
+    values that could not be written are sent again.
+
+    The poll process keeps the connection state of its connector, see
+    C{AbstractPLCConnector.update_connection_state()}. Changes are reported
+    by C{connectionStateChanged(state)}, the table is marked C{stale} while
+    the connection is down.
+
+    :type table: SharedTagTable
+    :ivar table: table the poll process writes to
+
+    :type interval: float
+    :ivar interval: poll interval of the poll process in seconds
+
+    :type connection_state: str
+    :ivar connection_state: last state reported by the poll process
+
+    """
+
+    polled = pyqtSignal()
+    tags_changed = pyqtSignal(object)
+    connectionError = pyqtSignal(str)
+    connectionStateChanged = pyqtSignal(str)
+
+    def __init__(
+        self,
+        factory: Callable[[], AbstractPLCConnector],
+        table: SharedTagTable,
+        interval: float = 0.1,
+        parent: QObject = None,
+    ) -> None:
+        super(ProcessPollEngine, self).__init__(parent)
+        self.factory = factory
+        self.table = table
+        self.interval = interval
+        self.connection_state = CONNECTED
+        self._context = multiprocessing.get_context("spawn")
+        self._process: Optional[Any] = None
+        self._writes: Any = None
+        self._results: Any = None
+        self._stop: Any = None
+        self._last_cycle = table.cycle
+        self._write_id = 0
+        self._sent: Dict[int, int] = {}
+        self._written: Dict[int, int] = {}
+        self.check_timer = QTimer(self)
+        self.check_timer.timeout.connect(self.check)
+
+    @property
+    def running(self) -> bool:
+        """Return True if the poll process is alive."""
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, check_interval: int = 50) -> None:
+        """Start the poll process and check for changes every C{check_interval} ms.
+
+        :raises TypeError: if the factory can not be pickled
+
+        """
+        if self._process is not None:
+            return
+
+        try:
+            pickle.dumps(self.factory)
+        except Exception as e:
+            raise TypeError("connector factory is not picklable: {}".format(e))
+
+        ctx = self._context
+        self._writes = ctx.Queue()
+        self._results = ctx.Queue()
+        self._stop = ctx.Event()
+        self._process = ctx.Process(
+            target=_run_engine,
+            args=(self.factory, self.table.layout(), self.interval,
+                  self._writes, self._results, self._stop),
+            daemon=True,
+        )
+        self._process.start()
+        self.check_timer.start(check_interval)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the poll process."""
+        self.check_timer.stop()
+        if self._process is None:
+            return
+        self._stop.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._process = None
+
+    def check(self) -> None:
+        """Send changed values to the poll process and apply its changes."""
+        while self._results is not None:
+            try:
+                errors, failed, done, written_cycle, state = (
+                    self._results.get_nowait())
+            except queue.Empty:
+                break
+            self._restore_writes(failed)
+            for index, write_id in done:
+                if self._sent.get(index) == write_id:
+                    del self._sent[index]
+                    self._written[index] = written_cycle
+            for error in errors:
+                self.connectionError.emit(error)
+            if state != self.connection_state:
+                self._set_connection_state(state)
+
+        self._send_writes()
+
+        result = self.table.changed_rows(self._last_cycle)
+        if result is None:
+            return
+        cycle, rows = result
+        if cycle == self._last_cycle:
+            return
+        self._last_cycle = cycle
+
+        cleared = []
+        for index, written_cycle in list(self._written.items()):
+            if cycle >= written_cycle:
+                del self._written[index]
+                self.table.clear_pending(index)
+                cleared.append(index)
+        if cleared:
+            rows = np.union1d(rows, np.array(cleared, np.int64))
+
+        pending = self.table._pending
+        if pending:
+            rows = rows[[index not in pending for index in rows.tolist()]]
+        self.table.notify_views(rows)
+        if len(rows):
+            changes = ChangeSet()
+            changes.rows.append((self.table, rows))
+            self.tags_changed.emit(changes)
+        self.polled.emit()
+
+    def _send_writes(self) -> None:
+        """Send the values of dirty table views to the poll process.
+
+        Each write gets an id, the local value is kept until the poll
+        process has reported the write of the last sent id, see C{check()}.
+
+        """
+        if self._writes is None:
+            return
+        for view in self.table.views:
+            if view.dirty:
+                self._write_id += 1
+                self._writes.put((view.index, view.raw_value, self._write_id))
+                view.dirty = False
+                view.dirty_since = None
+                self._sent[view.index] = self._write_id
+                self._written.pop(view.index, None)
+
+    def _restore_writes(self, failed: Iterable[Tuple[int, int]]) -> None:
+        """Mark the views of failed writes dirty to send them again.
+
+        Failures of values replaced by a newer value are ignored.
+
+        """
+        table = self.table
+        for index, write_id in failed:
+            if self._sent.get(index) == write_id:
+                del self._sent[index]
+                table.tag(table.names[index]).dirty = True
+
+    def _set_connection_state(self, state: str) -> None:
+        """Apply a connection state reported by the poll process."""
+        self.connection_state = state
+        stale = state == DOWN
+        self.table.stale = stale
+        for view in self.table.views:
+            view.stale = stale
+        self.connectionStateChanged.emit(state)
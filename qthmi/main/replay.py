@@ -0,0 +1,346 @@
+"""Record poll cycles to a file and replay them.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A PollRecorder listens to the C{tags_changed()} signal of any connector and
+streams the changed raw values of every cycle with a timestamp to a compact
+binary file. A ReplayConnector feeds a recording back into the same tags::
+
+    >>> recorder = PollRecorder(connector)
+    >>> recorder.open("line3.rec")
+    ...
+    >>> recorder.close()
+
+    >>> replay = ReplayConnector("line3.rec", speed=10.0)
+    >>> replay.add_tags(tags)
+    >>> replay.start_autopoll(100)
+
+The file starts with a header (magic bytes, version, start time). It is
+followed by name records, which assign an id to a tag name on its first
+occurrence, and cycle records holding the timestamp relative to the start and
+the (id, type, value) entries of the changed tags.
+
+"""
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import struct
+import time
+from PyQt5.QtCore import QObject, pyqtSignal
+from .connector import AbstractPLCConnector, ChangeSet, PollCycle
+
+
+MAGIC = b"QTHMIREC"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHd")
+_NAME = struct.Struct("<cIH")
+_CYCLE = struct.Struct("<cdI")
+_ENTRY = struct.Struct("<IB")
+_LENGTH = struct.Struct("<I")
+
+_NAME_RECORD = b"N"
+_CYCLE_RECORD = b"C"
+
+TYPE_NONE = 0
+TYPE_BOOL = 1
+TYPE_INT = 2
+TYPE_FLOAT = 3
+TYPE_STR = 4
+TYPE_BYTES = 5
+
+_FIXED = {
+    TYPE_BOOL: struct.Struct("<?"),
+    TYPE_INT: struct.Struct("<q"),
+    TYPE_FLOAT: struct.Struct("<d"),
+}
+
+Cycle = Tuple[float, List[Tuple[str, Any]]]
+
+
+def _encode_value(value: Any) -> Tuple[int, bytes]:
+    if hasattr(value, "item"):  # numpy scalar
+        value = value.item()
+    if value is None:
+        return TYPE_NONE, b""
+    if isinstance(value, bool):
+        return TYPE_BOOL, _FIXED[TYPE_BOOL].pack(value)
+    if isinstance(value, int):
+        return TYPE_INT, _FIXED[TYPE_INT].pack(value)
+    if isinstance(value, float):
+        return TYPE_FLOAT, _FIXED[TYPE_FLOAT].pack(value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return TYPE_STR, _LENGTH.pack(len(data)) + data
+    if isinstance(value, (bytes, bytearray)):
+        return TYPE_BYTES, _LENGTH.pack(len(value)) + bytes(value)
+    raise TypeError("cannot record values of type {}".format(type(value).__name__))
+
+
+class PollRecorder(QObject):
+    """Record the changed raw values of every poll cycle of a connector.
+
+    :type connector: AbstractPLCConnector
+    :ivar connector: recorded connector
+
+    :type cycles: int
+    :ivar cycles: number of recorded cycles
+
+    """
+
+    def __init__(self, connector: AbstractPLCConnector, parent: QObject = None) -> None:
+        super(PollRecorder, self).__init__(parent)
+        self.connector = connector
+        self.cycles = 0
+        self._file: Optional[BinaryIO] = None
+        self._ids: Dict[str, int] = {}
+        self._start = 0.0
+
+    @property
+    def recording(self) -> bool:
+        """Return True while a file is open."""
+        return self._file is not None
+
+    def open(self, filename: str) -> None:
+        """Start recording to a file.
+
+        The current raw values of all tags and table rows that have been read
+        are written as the first cycle.
+
+        """
+        self.close()
+        self._file = open(filename, "wb")
+        self._ids = {}
+        self.cycles = 0
+        self._start = time.monotonic()
+        self._file.write(_HEADER.pack(MAGIC, VERSION, time.time()))
+
+        snapshot = [
+            (tag.name, tag.raw_value)
+            for tag in self.connector.tags.values()
+            if tag.raw_value is not None
+        ]
+        for table in self.connector.tables:
+            valid = table.valid.nonzero()[0]
+            values = table.raw_values[valid].tolist()
+            snapshot.extend(zip([table.names[i] for i in valid.tolist()], values))
+        self._write_cycle(snapshot)
+
+        self.connector.tags_changed.connect(self._on_tags_changed)
+
+    def close(self) -> None:
+        """Stop recording and close the file."""
+        if self._file is None:
+            return
+        self.connector.tags_changed.disconnect(self._on_tags_changed)
+        self._file.close()
+        self._file = None
+
+    def _on_tags_changed(self, changes: ChangeSet) -> None:
+        values = [(tag.name, tag.raw_value) for tag in changes.tags]
+        for table, rows in changes.rows:
+            names = table.names
+            values.extend(zip(
+                [names[i] for i in rows.tolist()], table.raw_values[rows].tolist()
+            ))
+        self._write_cycle(values)
+
+    def _write_cycle(self, values: List[Tuple[str, Any]]) -> None:
+        if self._file is None:
+            return
+
+        ids = self._ids
+        names = []
+        entries = []
+        for name, value in values:
+            id_ = ids.get(name)
+            if id_ is None:
+                id_ = ids[name] = len(ids)
+                data = name.encode("utf-8")
+                names.append(_NAME.pack(_NAME_RECORD, id_, len(data)) + data)
+            type_, payload = _encode_value(value)
+            entries.append(_ENTRY.pack(id_, type_) + payload)
+
+        timestamp = time.monotonic() - self._start
+        self._file.write(b"".join(names))
+        self._file.write(_CYCLE.pack(_CYCLE_RECORD, timestamp, len(entries)))
+        self._file.write(b"".join(entries))
+        self.cycles += 1
+
+
+class RecordingReader(object):
+    """Iterate over the cycles of a recording.
+
+    Every cycle is a tuple of the timestamp in seconds since the start of the
+    recording and a list of (tag name, raw value) tuples.
+
+    :type start_time: float
+    :ivar start_time: start of the recording as returned by C{time.time()}
+
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError("{} is not a recording".format(filename))
+        magic, version, self.start_time = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("{} is not a recording".format(filename))
+        if version != VERSION:
+            raise ValueError("unsupported recording version {}".format(version))
+
+    def __iter__(self) -> Iterator[Cycle]:
+        """Yield all cycles of the recording."""
+        with open(self.filename, "rb") as f:
+            data = f.read()
+
+        names: Dict[int, str] = {}
+        pos = _HEADER.size
+        end = len(data)
+        while pos < end:
+            kind = data[pos:pos + 1]
+            if kind == _NAME_RECORD:
+                _, id_, length = _NAME.unpack_from(data, pos)
+                pos += _NAME.size
+                names[id_] = data[pos:pos + length].decode("utf-8")
+                pos += length
+            elif kind == _CYCLE_RECORD:
+                _, timestamp, count = _CYCLE.unpack_from(data, pos)
+                pos += _CYCLE.size
+                values = []
+                for _ in range(count):
+                    id_, type_ = _ENTRY.unpack_from(data, pos)
+                    pos += _ENTRY.size
+                    value, pos = self._decode_value(data, pos, type_)
+                    values.append((names[id_], value))
+                yield timestamp, values
+            else:
+                raise ValueError("corrupt recording at byte {}".format(pos))
+
+    @staticmethod
+    def _decode_value(data: bytes, pos: int, type_: int) -> Tuple[Any, int]:
+        if type_ == TYPE_NONE:
+            return None, pos
+        fixed = _FIXED.get(type_)
+        if fixed is not None:
+            return fixed.unpack_from(data, pos)[0], pos + fixed.size
+        (length,) = _LENGTH.unpack_from(data, pos)
+        pos += _LENGTH.size
+        value = data[pos:pos + length]
+        if type_ == TYPE_STR:
+            return value.decode("utf-8"), pos + length
+        return value, pos + length
+
+
+class ReplayConnector(AbstractPLCConnector):
+    """Connector feeding a recording back into tags.
+
+    Recorded values are assigned by tag name, so the tags of the recorded
+    connector can be added unchanged. Every poll applies all recorded cycles
+    that are due according to the replay clock. With C{speed} set to 0 every
+    poll applies exactly one recorded cycle, which replays a recording as
+    fast as possible and deterministically. Writes are discarded.
+
+    :type speed: float
+    :ivar speed: replay speed, 1.0 for real time, 0 for as fast as possible
+
+    :type position: int
+    :ivar position: number of cycles replayed
+
+    """
+
+    replayFinished = pyqtSignal()
+
+    def __init__(self, filename: str, speed: float = 1.0) -> None:
+        super(ReplayConnector, self).__init__()
+        self.reader = RecordingReader(filename)
+        self.speed = speed
+        self.rewind()
+
+    def rewind(self) -> None:
+        """Restart the replay from the beginning."""
+        self._cycles = iter(self.reader)
+        self._next: Optional[Cycle] = next(self._cycles, None)
+        self._values: Dict[str, Any] = {}
+        self._clock_start: Optional[float] = None
+        self._end_reported = False
+        self.position = 0
+
+    @property
+    def finished(self) -> bool:
+        """Return True if all recorded cycles have been replayed."""
+        return self._next is None
+
+    def _advance(self) -> None:
+        """Apply all recorded cycles due at the current replay time."""
+        if self._next is None:
+            return
+
+        if not self.speed:
+            self._apply_next()
+            return
+
+        now = time.monotonic()
+        if self._clock_start is None:
+            self._clock_start = now - self._next[0] / self.speed
+        replay_time = (now - self._clock_start) * self.speed
+        while self._next is not None and self._next[0] <= replay_time:
+            self._apply_next()
+
+    def _apply_next(self) -> None:
+        assert self._next is not None
+        self._values.update(self._next[1])
+        self.position += 1
+        self._next = next(self._cycles, None)
+
+    def replay_all(self) -> int:
+        """Poll until the end of the recording, ignoring C{speed}.
+
+        :return: number of polls
+
+        """
+        speed = self.speed
+        self.speed = 0
+        polls = 0
+        try:
+            while not self.finished:
+                self.poll()
+                polls += 1
+        finally:
+            self.speed = speed
+        return polls
+
+    def read_tags(self, cycle: PollCycle) -> None:
+        """Advance the replay and look up the replayed values of the cycle."""
+        self._advance()
+        values = self._values
+
+        for tag in cycle.reads:
+            if tag.name in values:
+                cycle.values.append((tag, values[tag.name]))
+
+        for table, rows in cycle.table_reads:
+            names = table.names
+            found = [
+                (row, values[names[row]]) for row in rows.tolist()
+                if names[row] in values
+            ]
+            if found:
+                found_rows, found_values = zip(*found)
+                cycle.table_values.append((table, list(found_rows), found_values))
+
+    def finish_cycle(self, cycle: PollCycle) -> None:
+        """Apply the cycle, emit C{replayFinished()} after the last one."""
+        super(ReplayConnector, self).finish_cycle(cycle)
+        if self.finished and not self._end_reported:
+            self._end_reported = True
+            self.replayFinished.emit()
+
+    def read_from_plc(self, address: Any, datatype: Any) -> Any:
+        """Not used, recorded values are looked up by name in C{read_tags()}."""
+        return None
+
+    def write_to_plc(self, address: Any, value: Any, datatype: Any) -> None:
+        """Discard writes, a recording can not be changed."""
+        pass
@@ -0,0 +1,210 @@
+"""Simulated PLC for load tests and benchmarks.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+The SimulatedPLCConnector keeps a large address space in memory. Addresses
+can be driven by waveform generators, every request can be delayed by a
+configurable latency and connection errors can be injected, so realistic
+load can be produced without any hardware::
+
+    >>> connector = SimulatedPLCConnector(size=100000, latency=0.002)
+    >>> connector.add_generator(0, Sine(amplitude=10.0, period=5.0))
+    >>> connector.add_generator(1, BitPattern([0, 1, 3, 0]))
+    >>> connector.error_rate = 0.01
+
+"""
+from typing import Dict, Optional, Sequence
+import math
+import random
+import time
+import numpy as np
+from .connector import AbstractPLCConnector, TransportError
+
+
+class Generator(object):
+    """Base class for waveform generators."""
+
+    def value(self, t: float) -> float:
+        """Return the value at time t in seconds."""
+        raise NotImplementedError
+
+
+class Ramp(Generator):
+    """Sawtooth rising from C{start} to C{stop} within C{period} seconds."""
+
+    def __init__(self, start: float = 0.0, stop: float = 100.0,
+                 period: float = 10.0) -> None:
+        self.start = start
+        self.stop = stop
+        self.period = period
+
+    def value(self, t: float) -> float:
+        """Return the value at time t in seconds."""
+        return self.start + (self.stop - self.start) * ((t / self.period) % 1.0)
+
+
+class Sine(Generator):
+    """Sine wave."""
+
+    def __init__(self, amplitude: float = 1.0, period: float = 1.0,
+                 offset: float = 0.0, phase: float = 0.0) -> None:
+        self.amplitude = amplitude
+        self.period = period
+        self.offset = offset
+        self.phase = phase
+
+    def value(self, t: float) -> float:
+        """Return the value at time t in seconds."""
+        return self.offset + self.amplitude * math.sin(
+            2 * math.pi * t / self.period + self.phase
+        )
+
+
+class RandomWalk(Generator):
+    """Random walk limited to C{minimum} and C{maximum}.
+
+    The value changes by a random step of at most C{step} on every access.
+
+    """
+
+    def __init__(self, start: float = 0.0, step: float = 1.0,
+                 minimum: float = -100.0, maximum: float = 100.0,
+                 seed: Optional[int] = None) -> None:
+        self.current = start
+        self.step = step
+        self.minimum = minimum
+        self.maximum = maximum
+        self._random = random.Random(seed)
+
+    def value(self, t: float) -> float:
+        """Return the next value, t is ignored."""
+        self.current += self._random.uniform(-self.step, self.step)
+        self.current = min(self.maximum, max(self.minimum, self.current))
+        return self.current
+
+
+class BitPattern(Generator):
+    """Cycle through a list of integer words, e.g. for alarm words."""
+
+    def __init__(self, patterns: Sequence[int], period: float = 1.0) -> None:
+        self.patterns = list(patterns)
+        self.period = period
+
+    def value(self, t: float) -> float:
+        """Return the pattern active at time t in seconds."""
+        return self.patterns[int(t / self.period) % len(self.patterns)]
+
+
+class SimulatedPLCConnector(AbstractPLCConnector):
+    """Connector to an in-memory PLC.
+
+    All values are stored as floats. Reads and writes of single addresses and
+    blocks are supported.
+
+    :type memory: numpy.ndarray
+    :ivar memory: simulated address space
+
+    :type latency: float
+    :ivar latency: delay of every request in seconds
+
+    :type jitter: float
+    :ivar jitter: maximum random deviation of the delay in seconds
+
+    :type error_rate: float
+    :ivar error_rate: probability that a request starts a burst of connection
+                      errors
+
+    :type burst_length: int
+    :ivar burst_length: number of failing requests per error burst
+
+    :type requests: int
+    :ivar requests: number of requests
+
+    :type failed_requests: int
+    :ivar failed_requests: number of requests that raised a TransportError
+
+    """
+
+    def __init__(self, size: int = 65536, latency: float = 0.0,
+                 jitter: float = 0.0, seed: Optional[int] = None) -> None:
+        super(SimulatedPLCConnector, self).__init__()
+        self.memory = np.zeros(size, np.float64)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = 0.0
+        self.burst_length = 1
+        self.requests = 0
+        self.failed_requests = 0
+        self._generators: Dict[int, Generator] = {}
+        self._generator_addresses = np.zeros(0, np.int64)
+        self._failures_left = 0
+        self._random = random.Random(seed)
+        self._t0 = time.monotonic()
+
+    def add_generator(self, address: int, generator: Generator) -> Generator:
+        """Drive the value of an address by a generator."""
+        self._generators[address] = generator
+        self._generator_addresses = np.array(sorted(self._generators), np.int64)
+        return generator
+
+    def remove_generator(self, address: int) -> None:
+        """Remove the generator of an address."""
+        self._generators.pop(address)
+        self._generator_addresses = np.array(sorted(self._generators), np.int64)
+
+    def inject_errors(self, count: int) -> None:
+        """Let the next C{count} requests fail with a TransportError."""
+        self._failures_left = count
+
+    def _request(self) -> None:
+        """Simulate latency and connection errors of one request."""
+        self.requests += 1
+
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if not self._failures_left and self.error_rate:
+            if self._random.random() < self.error_rate:
+                self._failures_left = self.burst_length
+
+        if self._failures_left:
+            self._failures_left -= 1
+            self.failed_requests += 1
+            raise TransportError("simulated connection error")
+
+    def _update(self, start: int, stop: int) -> None:
+        """Evaluate all generators in the address range."""
+        addresses = self._generator_addresses
+        if not len(addresses):
+            return
+
+        t = time.monotonic() - self._t0
+        lo, hi = np.searchsorted(addresses, (start, stop))
+        for address in addresses[lo:hi].tolist():
+            self.memory[address] = self._generators[address].value(t)
+
+    def read_from_plc(self, address: int, datatype: int = None) -> float:
+        """Read the value of one address."""
+        self._request()
+        self._update(address, address + 1)
+        return float(self.memory[address])
+
+    def write_to_plc(self, address: int, value: float, datatype: int = None) -> None:
+        """Write the value of one address."""
+        self._request()
+        self.memory[address] = value
+
+    def read_block(self, start: int, length: int) -> np.ndarray:
+        """Read a contiguous block of addresses."""
+        self._request()
+        self._update(start, start + length)
+        return self.memory[start:start + length].copy()
+
+    def write_block(self, start: int, values: Sequence) -> None:
+        """Write a contiguous block of addresses."""
+        self._request()
+        self.memory[start:start + len(values)] = values
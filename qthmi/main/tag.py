@@ -8,11 +8,19 @@
 :last modified time: 2018-07-10 07:51:04
 
 """
-from typing import Any, Optional, Dict
+from typing import Any, Iterable, List, Optional, Dict
+from numbers import Number
+import time
+import weakref
+import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal
 
 
 RAW_VALUE_TYPE = Any
+DEADBAND_ABSOLUTE = "absolute"
+DEADBAND_PERCENT = "percent"
+
+_NOT_CACHED = object()
 
 
 class Tag(QObject, object):
@@ -34,20 +42,74 @@ class Tag(QObject, object):
 
     :ivar raw_value: the raw PLC value
 
+    :type write_only: bool
+    :ivar write_only: if set the tag is only written to the PLC but never read
+                      back when polling
+
+    :type scan_group: str
+    :ivar scan_group: name of the scan group of the connector the tag is
+                      polled with, None for the default group
+
+    :type high_priority: bool
+    :ivar high_priority: write the tag immediately if the connector is in
+                         write-through mode
+
+    :type dirty_since: float
+    :ivar dirty_since: time of the first unwritten change, see
+                       C{time.perf_counter()}
+
+    :type always_poll: bool
+    :ivar always_poll: poll the tag even if nobody subscribed to it, see
+                       C{AbstractPLCConnector.poll_subscribed_only}
+
+    :type deadband: float
+    :ivar deadband: numeric raw values only count as changed if they differ
+                    more than this from the last reported value, 0 means
+                    every change is reported
+
+    :type deadband_mode: str
+    :ivar deadband_mode: C{DEADBAND_ABSOLUTE} or C{DEADBAND_PERCENT} of the
+                         last reported value
+
+    :type suppressed_count: int
+    :ivar suppressed_count: number of raw value updates that did not emit
+                            C{value_changed()}
+
+    :type stale: bool
+    :ivar stale: set while the connection of the connector is down, the
+                 value is the last one read before the outage
+
+    The converted value is cached until the raw value or the datatype
+    changes, see C{invalidate_value()}.
+
     """
 
     value_changed = pyqtSignal()
+    dirtied = pyqtSignal()
 
     def __init__(
         self, name: str, address: int, plc_datatype: int = None, datatype: type = float
     ) -> None:
         super(Tag, self).__init__()
+        self._cache_raw: Any = _NOT_CACHED
+        self._cache_value: Any = None
         self.name = name
         self.address = address
         self.datatype = datatype
         self.dirty = False
+        self.dirty_since: Optional[float] = None
+        self.high_priority = False
+        self.write_only = False
+        self.scan_group: Optional[str] = None
+        self.always_poll = False
+        self._subscribers: weakref.WeakSet = weakref.WeakSet()
         self.plc_datatype = plc_datatype
+        self.deadband = 0.0
+        self.deadband_mode = DEADBAND_ABSOLUTE
+        self.suppressed_count = 0
+        self.stale = False
         self._raw_value: Any = None
+        self._reported_value: Any = None
 
     @property
     def value(self) -> Any:
@@ -58,15 +120,68 @@ class Tag(QObject, object):
         called.
 
         """
-        if self.raw_value is None:
-            return
+        raw = self._raw_value
+        if raw is self._cache_raw:
+            return self._cache_value
 
-        return self.datatype(self._raw_value)
+        value = None if raw is None else self._convert(raw)
+        self._cache_raw = raw
+        self._cache_value = value
+        return value
 
     @value.setter
     def value(self, value: Any) -> None:
+        self.invalidate_value()
         self._raw_value = value
-        self.dirty = True
+        self.mark_dirty()
+
+    def _convert(self, raw: Any) -> Any:
+        """Return the value for the given raw value, which is not None."""
+        return self._datatype(raw)
+
+    @property
+    def datatype(self) -> Any:
+        """Return the python datatype."""
+        return self._datatype
+
+    @datatype.setter
+    def datatype(self, datatype: Any) -> None:
+        self._datatype = datatype
+        self.invalidate_value()
+
+    def invalidate_value(self) -> None:
+        """Drop the cached value, it is converted again on the next access.
+
+        Called automatically if raw value or datatype are set. Only needs to
+        be called if the raw value object is changed in place.
+
+        """
+        self._cache_raw = _NOT_CACHED
+
+    def mark_dirty(self) -> None:
+        """Mark the tag to be written to the PLC and emit C{dirtied()}."""
+        if not self.dirty:
+            self.dirty = True
+            self.dirty_since = time.perf_counter()
+        self.dirtied.emit()
+
+    @property
+    def subscribed(self) -> bool:
+        """Return True if the tag has at least one live consumer."""
+        return len(self._subscribers) > 0
+
+    def subscribe(self, consumer: object) -> None:
+        """Register a consumer that needs the tag to be polled.
+
+        Consumers are held by weak references, so they unsubscribe when they
+        are deleted.
+
+        """
+        self._subscribers.add(consumer)
+
+    def unsubscribe(self, consumer: object) -> None:
+        """Remove a consumer registered with C{subscribe()}."""
+        self._subscribers.discard(consumer)
 
     @property
     def raw_value(self) -> Any:
@@ -75,8 +190,41 @@ class Tag(QObject, object):
 
     @raw_value.setter
     def raw_value(self, value: Any) -> None:
+        if self.update_raw_value(value):
+            self.value_changed.emit()
+
+    def update_raw_value(self, value: Any) -> bool:
+        """Set the raw value without emitting C{value_changed()}.
+
+        :return: True if the value changed compared to the last reported
+                 value, see C{deadband}
+
+        """
+        self.invalidate_value()
         self._raw_value = value
-        self.value_changed.emit()
+
+        if not self.is_change(value):
+            self.suppressed_count += 1
+            return False
+
+        self._reported_value = value
+        return True
+
+    def is_change(self, value: Any) -> bool:
+        """Return True if value differs from the last reported raw value."""
+        reported = self._reported_value
+
+        if self.deadband and isinstance(value, Number) and isinstance(reported, Number):
+            if self.deadband_mode == DEADBAND_PERCENT:
+                limit = abs(reported) * self.deadband / 100.0  # type: ignore
+            else:
+                limit = self.deadband
+            return abs(value - reported) > limit  # type: ignore
+
+        try:
+            return bool(value != reported)
+        except ValueError:  # e.g. numpy arrays
+            return True
 
 
 class ScaledTag(Tag):
@@ -89,11 +237,15 @@ class ScaledTag(Tag):
         >>> tag.value
         25.0
 
-    :type scale: numeric value
-    :ivar scale: factor for scaling the raw_value
+    :type scale_factor: numeric value
+    :ivar scale_factor: factor for scaling the raw_value
+
+    :type scale_offset: numeric value
+    :ivar scale_offset: offset added to the raw_value
 
-    :type offset: numeric value
-    :ivar offset: offset added to the raw_value
+    :type group: ScaledTagGroup
+    :ivar group: group computing the value of the tag, None if the value is
+                 computed on access
 
     """
 
@@ -101,34 +253,189 @@ class ScaledTag(Tag):
         self, name: str, address: int, plc_datatype: int = None, datatype: type = float
     ) -> None:
         super(ScaledTag, self).__init__(name, address, plc_datatype, datatype)
-        self.scale_factor = 1
-        self.scale_offset = 0
+        self.group: Optional[ScaledTagGroup] = None
+        self.group_index = -1
+        self._scale_factor: Any = 1
+        self._scale_offset: Any = 0
+
+    @property
+    def scale_factor(self) -> Any:
+        """Return the factor for scaling the raw value."""
+        return self._scale_factor
+
+    @scale_factor.setter
+    def scale_factor(self, value: Any) -> None:
+        self._scale_factor = value
+        self.invalidate_value()
+        if self.group is not None:
+            self.group.set_scale(self.group_index, value, self._scale_offset)
+
+    @property
+    def scale_offset(self) -> Any:
+        """Return the offset added to the scaled raw value."""
+        return self._scale_offset
+
+    @scale_offset.setter
+    def scale_offset(self, value: Any) -> None:
+        self._scale_offset = value
+        self.invalidate_value()
+        if self.group is not None:
+            self.group.set_scale(self.group_index, self._scale_factor, value)
+
+    def invalidate_value(self) -> None:
+        """Drop the cached value, also in the group of the tag."""
+        self._cache_raw = _NOT_CACHED
+        group = getattr(self, "group", None)
+        if group is not None:
+            group.invalidate(self.group_index)
 
     @property
     def value(self) -> Optional[float]:
         """Return converted, scaled and offset value for use in GUI.
 
+        If the tag belongs to a ScaledTagGroup the value computed by the
+        group is returned, as long as the raw value did not change since.
+
         If value is set the new value will be transferred to the PLC the
         next time the C{poll()} function of the C{BufferedPLCConnector}
         object is called.
 
         """
-        if self._raw_value is not None:
-            value = self._raw_value * self.scale_factor + self.scale_offset
-            value = self.datatype(value)
-        else:
-            value = None
-
-        return value
+        group = self.group
+        if group is not None and not group.stale[self.group_index]:
+            return group.value(self.group_index)
+        return Tag.value.fget(self)  # type: ignore
 
     @value.setter
     def value(self, value: float) -> None:
+        self.invalidate_value()
         self._raw_value = (value - self.scale_offset) / self.scale_factor
-        self.dirty = True
+        self.mark_dirty()
+
+    def _convert(self, raw: Any) -> Any:
+        return self._datatype(raw * self._scale_factor + self._scale_offset)
+
+
+class ScaledTagGroup(object):
+    """Compute the values of many ScaledTags with one NumPy operation.
+
+    Factors and offsets of the tags are kept in arrays. A raw value update
+    marks the value of the tag stale, C{update()} recomputes all stale values
+    at once and caches them until the next raw value change. Add the group to
+    the connector with C{AbstractPLCConnector.add_processor()} to update it
+    after each poll cycle, before any signal is emitted::
+
+        >>> group = ScaledTagGroup(tags)
+        >>> connector.add_processor(group)
+
+    Raw values that can not be converted to float are scaled per tag on
+    access.
+
+    :type tags: list(ScaledTag)
+    :ivar tags: tags of the group
+
+    :type stale: numpy.ndarray
+    :ivar stale: True for tags whose value has to be recomputed
+
+    """
+
+    def __init__(self, tags: Iterable[ScaledTag] = ()) -> None:
+        self.tags: List[ScaledTag] = []
+        self.factors = np.ones(16)
+        self.offsets = np.zeros(16)
+        self.stale = np.ones(16, bool)
+        self._values = np.zeros(16)
+        self._valid = np.zeros(16, bool)
+        self._converted: Dict[int, Any] = {}
+        for tag in tags:
+            self.add(tag)
+
+    def __len__(self) -> int:
+        """Return number of tags."""
+        return len(self.tags)
+
+    def add(self, tag: ScaledTag) -> None:
+        """Add a tag, a tag can only belong to one group."""
+        if tag.group is not None:
+            raise ValueError("tag {} already belongs to a group".format(tag.name))
+
+        index = len(self.tags)
+        if index == len(self.factors):
+            self._grow()
+
+        self.tags.append(tag)
+        tag.group = self
+        tag.group_index = index
+        self.set_scale(index, tag.scale_factor, tag.scale_offset)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.factors)
+        for attr, fill in (("factors", 1), ("offsets", 0), ("stale", True),
+                           ("_values", 0), ("_valid", False)):
+            old = getattr(self, attr)
+            new = np.full(capacity, fill, old.dtype)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    def set_scale(self, index: int, factor: Any, offset: Any) -> None:
+        """Set factor and offset of a tag."""
+        self.factors[index] = factor
+        self.offsets[index] = offset
+        self.stale[index] = True
+
+    def invalidate(self, index: int) -> None:
+        """Mark the value of a tag stale."""
+        self.stale[index] = True
+
+    def value(self, index: int) -> Any:
+        """Return the cached value of a tag."""
+        if not self._valid[index]:
+            return None
+        if self.tags[index].datatype is float:
+            return self._values[index]
+        return self._converted[index]
+
+    def update(self) -> int:
+        """Recompute all stale values.
+
+        :return: number of recomputed values
+
+        """
+        rows = np.nonzero(self.stale[:len(self.tags)])[0]
+        if not len(rows):
+            return 0
+
+        tags = self.tags
+        row_list = rows.tolist()
+        raw_values = [tags[i]._raw_value for i in row_list]
+        try:
+            raw = np.array(
+                [0.0 if v is None else v for v in raw_values], np.float64
+            )
+        except (TypeError, ValueError):
+            return 0
+
+        self._values[rows] = raw * self.factors[rows] + self.offsets[rows]
+        self._valid[rows] = [v is not None for v in raw_values]
+        for i in row_list:
+            datatype = tags[i].datatype
+            if datatype is not float and self._valid[i]:
+                self._converted[i] = datatype(self._values[i].item())
+        self.stale[rows] = False
+        return len(row_list)
+
+    def process(self, changes: Any) -> None:
+        """Update the group after a poll cycle, see C{update()}."""
+        self.update()
 
 
 class TextTag(Tag):
-    """Tag that supplies defined texts constraint to integer values."""
+    """Tag that supplies defined texts constraint to integer values.
+
+    Change C{text_definitions} via C{add_text()} and C{pop_text()}, so the
+    cached text is updated.
+
+    """
 
     def __init__(self, name: str, address: int, plc_datatype: int=None) -> None:
         super(TextTag, self).__init__(name, address, plc_datatype)
@@ -146,6 +453,7 @@ class TextTag(Tag):
 
         """
         self.text_definitions[key] = text
+        self.invalidate_value()
 
     def pop_text(self, key: int) -> str:
         """Remove text message for the given key.
@@ -154,6 +462,7 @@ class TextTag(Tag):
         :return: text message
 
         """
+        self.invalidate_value()
         return self.text_definitions.pop(key)
 
     def get_text(self, key: int) -> str:
@@ -166,7 +475,14 @@ class TextTag(Tag):
     @property
     def value(self) -> str:
         """Return the current text value."""
-        return self.get_text(self.raw_value)
+        raw = self._raw_value
+        if raw is self._cache_raw:
+            return self._cache_value
+
+        value = self.get_text(raw)
+        self._cache_raw = raw
+        self._cache_value = value
+        return value
 
     @value.setter  # just a dummy setter to avoid mypy error
     def value(self, value: str) -> None:
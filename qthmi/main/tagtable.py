@@ -0,0 +1,301 @@
+"""Array-backed storage for large tag databases.
+
+:author: Stefan Lehmann <stlm@posteo.de>
+:license: MIT, see license file or https://opensource.org/licenses/MIT
+
+A TagTable keeps names, addresses and datatypes of its rows in parallel
+arrays and all raw values in one typed NumPy array. No QObject is created for
+a row until a widget binds to it via C{TagTable.tag()}, which returns a
+TableTag view of the row::
+
+    >>> table = TagTable()
+    >>> for i in range(50000):
+    ...     table.add("tag{}".format(i), i)
+    >>> connector.add_table(table)
+    >>> label = HMILabel(table.tag("tag42"))
+
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .tag import Tag
+
+
+class TableTag(Tag):
+    """Tag view of a TagTable row.
+
+    The raw value is stored in the table, so the view behaves like a Tag but
+    does not keep a value of its own. Changes of polled values are detected
+    by the table, C{deadband} is not used.
+
+    :type table: TagTable
+    :ivar table: table holding the row
+
+    :type index: int
+    :ivar index: row index
+
+    """
+
+    table: Optional['TagTable'] = None
+
+    def __init__(self, table: 'TagTable', index: int) -> None:
+        plc_datatype = int(table.plc_datatypes[index])
+        super(TableTag, self).__init__(
+            table.names[index],
+            int(table.addresses[index]),
+            None if plc_datatype < 0 else plc_datatype,
+            table.datatypes[index],
+        )
+        self.scan_group = table.scan_group
+        self.table = table
+        self.index = index
+        self._reported_value = self._raw_value
+
+    @property  # type: ignore
+    def _raw_value(self) -> Any:
+        if self.table is None:
+            return None
+        return self.table.get_raw(self.index)
+
+    @_raw_value.setter
+    def _raw_value(self, value: Any) -> None:
+        if self.table is not None:
+            self.table.set_raw(self.index, value)
+
+
+class TagTable(object):
+    """Compact store for tens of thousands of tags.
+
+    :type names: list(str)
+    :ivar names: tag names
+
+    :type addresses: numpy.ndarray
+    :ivar addresses: PLC addresses
+
+    :type plc_datatypes: numpy.ndarray
+    :ivar plc_datatypes: identifiers of the PLC datatypes, -1 if not set
+
+    :type datatypes: list(type)
+    :ivar datatypes: python datatypes
+
+    :type raw_values: numpy.ndarray
+    :ivar raw_values: raw PLC values
+
+    :type valid: numpy.ndarray
+    :ivar valid: False for rows that have not been read yet
+
+    :type scan_group: str
+    :ivar scan_group: scan group all rows are polled with
+
+    :type stale: bool
+    :ivar stale: set while the connection of the connector is down
+
+    """
+
+    def __init__(self, dtype: Any = np.float64, capacity: int = 1024) -> None:
+        capacity = max(capacity, 1)
+        self.dtype = np.dtype(dtype)
+        self.names: List[str] = []
+        self.datatypes: List[type] = []
+        self.scan_group: Optional[str] = None
+        self.stale = False
+        self._addresses = np.zeros(capacity, np.int64)
+        self._plc_datatypes = np.full(capacity, -1, np.int64)
+        self._raw_values = np.zeros(capacity, self.dtype)
+        self._valid = np.zeros(capacity, bool)
+        self._index: Dict[str, int] = {}
+        self._views: Dict[int, TableTag] = {}
+
+    def __len__(self) -> int:
+        """Return number of rows."""
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        """Return True if the table has a row with the given name."""
+        return name in self._index
+
+    @property
+    def addresses(self) -> np.ndarray:
+        """Return addresses of all rows."""
+        return self._addresses[:len(self)]
+
+    @property
+    def plc_datatypes(self) -> np.ndarray:
+        """Return PLC datatypes of all rows."""
+        return self._plc_datatypes[:len(self)]
+
+    @property
+    def raw_values(self) -> np.ndarray:
+        """Return raw values of all rows."""
+        return self._raw_values[:len(self)]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Return the valid flags of all rows."""
+        return self._valid[:len(self)]
+
+    @property
+    def views(self) -> Iterable[TableTag]:
+        """Return all views created so far."""
+        return self._views.values()
+
+    def add(
+        self,
+        name: str,
+        address: int,
+        plc_datatype: int = None,
+        datatype: type = float,
+    ) -> int:
+        """Add a row and return its index."""
+        if name in self._index:
+            raise KeyError("tag {} already defined".format(name))
+
+        index = len(self)
+        if index == len(self._raw_values):
+            self._grow()
+
+        self.names.append(name)
+        self.datatypes.append(datatype)
+        self._addresses[index] = address
+        self._plc_datatypes[index] = -1 if plc_datatype is None else plc_datatype
+        self._index[name] = index
+        return index
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._raw_values)
+        for attr in ("_addresses", "_plc_datatypes", "_raw_values", "_valid"):
+            old = getattr(self, attr)
+            new = np.zeros(capacity, old.dtype)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    def index(self, name: str) -> int:
+        """Return the row index of the given tag name."""
+        return self._index[name]
+
+    def tag(self, name: str) -> TableTag:
+        """Return the Tag view of a row, it is created on first access."""
+        index = self._index[name]
+        view = self._views.get(index)
+        if view is None:
+            view = self._views[index] = TableTag(self, index)
+        return view
+
+    def get_raw(self, index: int) -> Any:
+        """Return the raw value of a row, None if it has not been read yet."""
+        if not self._valid[index]:
+            return None
+        return self._raw_values[index].item()
+
+    def set_raw(self, index: int, value: Any) -> None:
+        """Set the raw value of a row, None marks the row as not read."""
+        if value is None:
+            self._valid[index] = False
+        else:
+            self._raw_values[index] = value
+            self._valid[index] = True
+
+    def update(self, rows: np.ndarray, values: Any, notify: bool = True) -> np.ndarray:
+        """Store read values and notify the views of changed rows.
+
+        Rows with a dirty view are skipped, so pending GUI changes are not
+        overwritten.
+
+        :param rows: row indices
+        :param values: raw values in the order of C{rows}
+        :param notify: emit C{value_changed()} of the views of changed rows
+        :return: indices of the changed rows
+
+        """
+        rows = np.asarray(rows, np.int64)
+        values = np.asarray(values, self.dtype)
+
+        dirty = [i for i, view in self._views.items() if view.dirty]
+        if dirty:
+            keep = ~np.isin(rows, dirty)
+            rows = rows[keep]
+            values = values[keep]
+
+        changed = ~self._valid[rows] | (self._raw_values[rows] != values)
+        self._raw_values[rows] = values
+        self._valid[rows] = True
+        changed_rows = rows[changed]
+        self.notify_views(changed_rows, notify)
+        return changed_rows
+
+    def notify_views(self, rows: np.ndarray, notify: bool = True) -> None:
+        """Report the current raw values of the given rows to their views.
+
+        :param rows: indices of changed rows
+        :param notify: emit C{value_changed()} of the views
+
+        """
+        if not self._views:
+            return
+
+        if len(rows) > len(self._views):
+            rows = rows[np.isin(rows, list(self._views))]
+        for index in rows.tolist():
+            view = self._views.get(index)
+            if view is not None:
+                view._reported_value = view.raw_value
+                if notify:
+                    view.value_changed.emit()
+
+    def rows(self, subscribed_only: bool = False) -> np.ndarray:
+        """Return the indices of the rows to be polled.
+
+        :param subscribed_only: only return rows with a subscribed view or
+                                with C{always_poll} set on their view
+
+        """
+        if not subscribed_only:
+            return np.arange(len(self))
+        return np.array(sorted(
+            index for index, view in self._views.items()
+            if view.subscribed or view.always_poll
+        ), np.int64)
+
+
+def plan_table_blocks(
+    starts: np.ndarray,
+    sizes: np.ndarray,
+    max_gap: int = 0,
+    max_length: int = None,
+) -> List[Tuple[int, int, np.ndarray]]:
+    """Merge row addresses into contiguous blocks with vectorized operations.
+
+    Works like C{connector.plan_blocks()} but on address arrays.
+
+    :param starts: start address of each row
+    :param sizes: size of each row
+    :param max_gap: maximum number of unused address units inside a block
+    :param max_length: maximum length of a block, None for no limit
+    :return: list of (start, length, positions) tuples, positions are
+             indices into C{starts}
+
+    """
+    if len(starts) == 0:
+        return []
+
+    order = np.argsort(starts, kind="stable")
+    s = starts[order]
+    ends = np.maximum.accumulate(s + sizes[order])
+    breaks = np.nonzero(s[1:] - ends[:-1] > max_gap)[0] + 1
+
+    if max_length is not None:
+        chunk = max(1, max_length - int(sizes.max()) + 1)
+        segment = np.zeros(len(s), np.int64)
+        segment[breaks] = 1
+        segment = np.cumsum(segment)
+        segment_start = s[np.concatenate(([0], breaks))][segment]
+        part = (s - segment_start) // chunk
+        breaks = np.nonzero(
+            (segment[1:] != segment[:-1]) | (part[1:] != part[:-1])
+        )[0] + 1
+
+    blocks = []
+    for positions in np.split(np.arange(len(s)), breaks):
+        start = int(s[positions[0]])
+        end = int(ends[positions[-1]])
+        blocks.append((start, end - start, order[positions]))
+    return blocks
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from qthmi.main import benchmark
+from qthmi.main.connector import BufferConnector
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class Benchmark_Test(unittest.TestCase):
+
+    def test_bench_poll(self):
+        result = benchmark.bench_poll(20, widgets=True, min_time=0.0)
+        self.assertEqual(result["tags"], 20)
+        self.assertTrue(result["widgets"])
+        self.assertGreater(result["cycles_per_second"], 0)
+        self.assertGreaterEqual(result["dispatch_per_tag"], 0)
+
+    def test_bench_buffer_copies_changed_values(self):
+        reads = []
+        read_tags = BufferConnector.read_tags
+
+        def record(connector, cycle):
+            reads.append(len(cycle.reads))
+            read_tags(connector, cycle)
+
+        with mock.patch.object(BufferConnector, "read_tags", autospec=True,
+                               side_effect=record):
+            result = benchmark.bench_buffer(20, min_time=0.0)
+        self.assertEqual(reads, [20] * len(reads))
+        self.assertGreaterEqual(len(reads), 3)
+        self.assertGreater(result["cycles_per_second"], 0)
+
+    def test_bench_modbus(self):
+        result = benchmark.bench_modbus(300, min_time=0.0)
+        self.assertEqual(result["requests_per_cycle"], 3)
+        self.assertGreater(result["requests_per_second"], 0)
+
+    def test_memory_per_tag(self):
+        self.assertGreater(benchmark.memory_per_tag(20), 0)
+
+    def test_main_writes_json(self):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            benchmark.main(["--tags", "10", "--min-time", "0", "-o", path])
+            with open(path) as f:
+                data = json.load(f)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(
+            [(r["benchmark"], r.get("widgets")) for r in data["results"]],
+            [("poll", False), ("poll", True), ("buffer", None)],
+        )
+        self.assertIn("bytes_per_tag", data["results"][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,14 @@
 __author__ = 'Stefan Lehmann'
 
+import threading
+import time
 import unittest
-from qthmi.main.connector import AbstractPLCConnector, BufferConnector
+from unittest import mock
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from qthmi.main.connector import (
+    CONNECTED, DEGRADED, DOWN, AbstractPLCConnector, BufferConnector,
+    ConnectionError, TagDispatcher, TransportError, plan_blocks)
+from qthmi.main.tagtable import TagTable
 from qthmi.main.tag import Tag, TextTag
 
 
@@ -17,6 +24,31 @@ class RingBufferTestConnector(AbstractPLCConnector):
         self.ringbuffer[address] = value
 
 
+class BlockTestConnector(RingBufferTestConnector):
+    def __init__(self):
+        super(BlockTestConnector, self).__init__()
+        self.block_requests = []
+        self.single_requests = 0
+        self.single_writes = []
+        self.block_writes = []
+
+    def read_from_plc(self, address, datatype):
+        self.single_requests += 1
+        return super(BlockTestConnector, self).read_from_plc(address, datatype)
+
+    def read_block(self, start, length):
+        self.block_requests.append((start, length))
+        return [self.ringbuffer[i] for i in range(start, start + length)]
+
+    def write_to_plc(self, address, value, datatype):
+        self.single_writes.append(address)
+        super(BlockTestConnector, self).write_to_plc(address, value, datatype)
+
+    def write_block(self, start, values):
+        self.block_writes.append((start, len(values)))
+        self.ringbuffer[start:start + len(values)] = values
+
+
 class AbstractPLCConnector_Test (unittest.TestCase):
 
     def setUp(self):
@@ -54,6 +86,591 @@ class AbstractPLCConnector_Test (unittest.TestCase):
         self.connector.poll()
         self.assertEqual(self.connector.tags["first tag"].value, 15)
 
+    def test_poll_records_statistics(self):
+        records = []
+        self.connector.emit_statistics = True
+        self.connector.cycleMeasured.connect(records.append)
+        self.connector.tags["first tag"].value = 15
+        self.connector.poll()
+        self.assertEqual(self.connector.statistics.cycles, 1)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].tag_count, 3)
+        self.assertEqual(records[0].errors, 0)
+        self.assertGreaterEqual(records[0].duration,
+                                records[0].read_time + records[0].write_time)
+
+
+class PlanBlocks_Test(unittest.TestCase):
+
+    def span(self, tag):
+        return tag.address, 1
+
+    def test_adjacent_addresses_are_merged(self):
+        tags = [Tag(str(i), i) for i in (3, 1, 2)]
+        blocks = plan_blocks(tags, self.span)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual((blocks[0].start, blocks[0].length), (1, 3))
+        self.assertEqual([t.address for t in blocks[0].tags], [1, 2, 3])
+
+    def test_gap_splits_blocks(self):
+        tags = [Tag(str(i), i) for i in (0, 5, 20)]
+        blocks = plan_blocks(tags, self.span, max_gap=4)
+        self.assertEqual([(b.start, b.length) for b in blocks], [(0, 6), (20, 1)])
+
+    def test_max_length_splits_blocks(self):
+        tags = [Tag(str(i), i) for i in range(10)]
+        blocks = plan_blocks(tags, self.span, max_length=4)
+        self.assertEqual([b.length for b in blocks], [4, 4, 2])
+
+
+class BlockRead_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = BlockTestConnector()
+        for i in (10, 11, 12, 50):
+            self.connector.add_tag(Tag("tag{}".format(i), i, datatype=int))
+
+    def test_poll_uses_block_reads(self):
+        self.connector.block_gap = 4
+        self.connector.poll()
+        self.assertEqual(self.connector.block_requests, [(10, 3), (50, 1)])
+        self.assertEqual(self.connector.single_requests, 0)
+        self.assertEqual(self.connector.tags["tag12"].value, 12)
+        self.assertEqual(self.connector.tags["tag50"].value, 50)
+
+    def test_non_integer_address_is_read_single(self):
+        self.connector.ringbuffer = dict(enumerate(range(100)))
+        self.connector.ringbuffer["x"] = 7
+        self.connector.add_tag(Tag("x", "x", datatype=int))
+        self.connector.poll()
+        self.assertEqual(self.connector.single_requests, 1)
+        self.assertEqual(self.connector.tags["x"].value, 7)
+
+
+class BlockWrite_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = BlockTestConnector()
+        for i in (10, 11, 12, 50):
+            self.connector.add_tag(Tag("tag{}".format(i), i, datatype=int))
+
+    def test_adjacent_dirty_tags_are_written_as_block(self):
+        for i in (10, 11, 12, 50):
+            self.connector.tags["tag{}".format(i)].value = i * 2
+        self.connector.poll()
+        self.assertEqual(self.connector.block_writes, [(10, 3)])
+        self.assertEqual(self.connector.single_writes, [50])
+        self.assertEqual(self.connector.ringbuffer[10:13], [20, 22, 24])
+        self.assertFalse(any(tag.dirty for tag in self.connector.tags.values()))
+
+    def test_written_values_are_read_back(self):
+        self.connector.tags["tag11"].value = 99
+        self.connector.poll()
+        self.assertEqual(self.connector.tags["tag11"].value, 99)
+
+    def test_write_only_tags_are_not_read_back(self):
+        tag = self.connector.tags["tag50"]
+        tag.write_only = True
+        self.connector.ringbuffer[50] = 5
+        self.connector.poll()
+        self.assertIsNone(tag.value)
+        self.assertEqual(self.connector.block_requests, [(10, 3)])
+
+
+class SlowTestConnector(RingBufferTestConnector):
+    def __init__(self):
+        super(SlowTestConnector, self).__init__()
+        self.io_threads = set()
+        self.active = 0
+        self.overlaps = 0
+
+    def read_from_plc(self, address, datatype):
+        self.io_threads.add(threading.get_ident())
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+        time.sleep(0.05)
+        self.active -= 1
+        return super(SlowTestConnector, self).read_from_plc(address, datatype)
+
+
+class ThreadedPoll_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.connector = SlowTestConnector()
+        self.tag = self.connector.add_tag(Tag("first tag", 10, 2, int))
+        self.connector.set_threaded(True)
+
+    def tearDown(self):
+        self.connector.set_threaded(False)
+
+    def wait_for_poll(self):
+        loop = QEventLoop()
+        self.connector.polled.connect(loop.quit)
+        QTimer.singleShot(2000, loop.quit)
+        loop.exec_()
+
+    def test_request_poll_does_not_block(self):
+        t0 = time.perf_counter()
+        self.connector.request_poll()
+        self.assertLess(time.perf_counter() - t0, 0.05)
+        self.assertIsNone(self.tag.value)
+        self.wait_for_poll()
+        self.assertEqual(self.tag.value, 10)
+
+    def test_plc_is_accessed_from_worker_thread(self):
+        signal_threads = []
+        self.tag.value_changed.connect(
+            lambda: signal_threads.append(threading.get_ident()))
+        self.connector.request_poll()
+        self.wait_for_poll()
+        self.assertNotIn(threading.get_ident(), self.connector.io_threads)
+        self.assertEqual(signal_threads, [threading.get_ident()])
+
+    def test_poll_waits_for_worker_cycle(self):
+        self.connector.request_poll()
+        time.sleep(0.01)
+        self.connector.ringbuffer[10] = 11
+        self.connector.poll()
+        self.assertEqual(self.tag.value, 11)
+        self.assertIn(threading.get_ident(), self.connector.io_threads)
+        self.wait_for_poll()
+        self.assertEqual(self.connector.overlaps, 0)
+        self.assertEqual(len(self.connector.io_threads), 2)
+
+    def test_value_changed_during_cycle_is_kept(self):
+        self.connector.request_poll()
+        self.tag.value = 42
+        self.wait_for_poll()
+        self.assertEqual(self.tag.value, 42)
+        self.assertTrue(self.tag.dirty)
+
+
+class ScanGroup_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("qthmi.main.connector.time.monotonic",
+                             lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.connector = BlockTestConnector()
+        self.connector.block_gap = 0
+        self.fast = self.connector.add_tag(Tag("fast", 1, datatype=int))
+        self.slow = self.connector.add_tag(Tag("slow", 2, datatype=int))
+        self.other = self.connector.add_tag(Tag("other", 3, datatype=int))
+        self.fast.scan_group = "fast"
+        self.slow.scan_group = "slow"
+        self.connector.add_scan_group("fast", 100)
+        self.connector.add_scan_group("slow", 1000)
+        self.connector.start_autopoll(500)
+        self.addCleanup(self.connector.stop_autopoll)
+
+    def tick(self, seconds):
+        self.now += seconds
+        self.connector._on_autopoll_timeout()
+
+    def test_timer_interval_is_gcd(self):
+        self.assertEqual(self.connector.autopoll_timer.interval(), 100)
+        self.assertEqual(self.connector.cycletime, 500)
+
+    def test_due_groups_are_merged_into_one_read(self):
+        self.tick(0)
+        self.assertEqual(self.connector.block_requests, [(1, 3)])
+
+    def test_only_due_groups_are_read(self):
+        self.tick(0)
+        self.connector.block_requests = []
+        self.tick(0.1)
+        self.assertEqual(self.connector.block_requests, [(1, 1)])
+        self.tick(0.4)
+        self.assertEqual(self.connector.block_requests, [(1, 1), (1, 1), (3, 1)])
+
+    def test_group_statistics(self):
+        for _ in range(5):
+            self.tick(0.1)
+        fast = self.connector.scan_groups["fast"]
+        self.assertEqual(fast.cycles, 5)
+        self.assertEqual(fast.overruns, 0)
+        self.assertEqual(self.connector.scan_groups["slow"].cycles, 1)
+
+    def test_missed_ticks_count_as_overrun(self):
+        self.tick(0)
+        self.tick(0.35)
+        fast = self.connector.scan_groups["fast"]
+        self.assertEqual(fast.cycles, 2)
+        self.assertEqual(fast.overruns, 1)
+
+
+class AdaptiveInterval_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        for name in ("monotonic", "perf_counter"):
+            patcher = mock.patch("qthmi.main.connector.time." + name,
+                                 lambda: self.now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.delay = 0.0
+        self.connector = RingBufferTestConnector()
+        self.connector.read_from_plc = self.read_from_plc
+        self.connector.add_tag(Tag("tag", 1, datatype=int))
+        self.intervals = []
+        self.connector.intervalChanged.connect(self.intervals.append)
+        self.connector.enable_adaptive_interval(100, 1000)
+        self.connector.start_autopoll(100)
+        self.addCleanup(self.connector.stop_autopoll)
+
+    def read_from_plc(self, address, datatype):
+        self.now += self.delay
+        return address
+
+    def tick(self, seconds=0.0):
+        self.now += seconds
+        self.connector._on_autopoll_timeout()
+
+    def test_interval_is_stretched_on_overrun(self):
+        self.delay = 0.3
+        self.tick()
+        self.assertEqual(self.intervals, [375])
+        self.assertEqual(self.connector.effective_interval, 375)
+
+    def test_missed_ticks_are_skipped(self):
+        self.delay = 0.3
+        self.tick()
+        self.delay = 0.0
+        self.tick(0.1)
+        self.assertEqual(self.connector.statistics.cycles, 1)
+        self.tick(0.3)
+        self.assertEqual(self.connector.statistics.cycles, 2)
+
+    def test_interval_shrinks_with_headroom(self):
+        self.delay = 0.3
+        self.tick()
+        self.delay = 0.0
+        self.tick(0.4)
+        self.assertEqual(self.intervals, [375, 300])
+
+    def test_interval_limits(self):
+        self.delay = 2.0
+        self.tick()
+        self.assertEqual(self.connector.effective_interval, 1000)
+        self.delay = 0.0
+        for _ in range(20):
+            self.tick(1.0)
+        self.assertEqual(self.connector.effective_interval, 100)
+
+    def test_interval_does_not_shrink_below_nominal(self):
+        self.connector.add_scan_group("totalizer", 60000)
+        self.connector.start_autopoll(1000)
+        self.connector.enable_adaptive_interval(100, 5000)
+        self.assertEqual(self.connector.effective_interval, 1000)
+        for _ in range(20):
+            self.tick(1.0)
+        self.assertEqual(self.connector.effective_interval, 1000)
+        self.assertEqual(self.connector.interval_scale, 1.0)
+
+        self.delay = 2.0
+        self.tick(1.0)
+        self.assertEqual(self.connector.effective_interval, 2500)
+        self.delay = 0.0
+        for _ in range(20):
+            self.tick(3.0)
+        self.assertEqual(self.connector.effective_interval, 1000)
+
+    def test_disable_restores_nominal_interval(self):
+        self.delay = 0.3
+        self.tick()
+        self.connector.disable_adaptive_interval()
+        self.assertEqual(self.connector.effective_interval, 100)
+        self.assertEqual(self.intervals[-1], 100)
+
+
+class SubscribedPoll_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = RingBufferTestConnector()
+        self.connector.poll_subscribed_only = True
+        self.watched = self.connector.add_tag(Tag("watched", 1, datatype=int))
+        self.hidden = self.connector.add_tag(Tag("hidden", 2, datatype=int))
+        self.consumer = mock.Mock()
+        self.watched.subscribe(self.consumer)
+
+    def test_only_subscribed_tags_are_read(self):
+        self.connector.poll()
+        self.assertEqual(self.watched.value, 1)
+        self.assertIsNone(self.hidden.value)
+
+    def test_always_poll(self):
+        self.hidden.always_poll = True
+        self.connector.poll()
+        self.assertEqual(self.hidden.value, 2)
+
+    def test_unsubscribed_tags_are_still_written(self):
+        self.watched.unsubscribe(self.consumer)
+        self.watched.value = 50
+        self.connector.poll()
+        self.assertEqual(self.connector.ringbuffer[1], 50)
+
+
+class TagsChanged_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = RingBufferTestConnector()
+        self.first = self.connector.add_tag(Tag("first tag", 10, 2, int))
+        self.second = self.connector.add_tag(Tag("second tag", 20, 4, float))
+        self.changes = []
+        self.connector.tags_changed.connect(self.changes.append)
+
+    def test_one_signal_per_cycle(self):
+        self.connector.poll()
+        self.assertEqual(len(self.changes), 1)
+        self.assertEqual(set(self.changes[0].tags), {self.first, self.second})
+
+    def test_only_changed_tags(self):
+        self.connector.poll()
+        self.connector.ringbuffer[20] = 21
+        self.connector.poll()
+        self.assertEqual(self.changes[1].tags, [self.second])
+        self.connector.poll()
+        self.assertEqual(len(self.changes), 2)
+
+    def test_table_rows(self):
+        table = self.connector.add_table(TagTable())
+        table.add("a", 1)
+        table.add("b", 2)
+        self.connector.poll()
+        self.connector.ringbuffer[2] = 5
+        self.connector.poll()
+        (changed_table, rows), = self.changes[1].rows
+        self.assertIs(changed_table, table)
+        self.assertEqual(rows.tolist(), [1])
+
+    def test_dispatcher_without_tag_signals(self):
+        self.connector.emit_tag_signals = False
+        dispatcher = TagDispatcher(self.connector)
+        table = self.connector.add_table(TagTable())
+        table.add("a", 1)
+        calls = []
+        emitted = []
+        dispatcher.bind(self.first, lambda: calls.append("first"))
+        dispatcher.bind(table.tag("a"), lambda: calls.append("a"))
+        self.first.value_changed.connect(lambda: emitted.append(1))
+        table.tag("a").value_changed.connect(lambda: emitted.append(1))
+        self.connector.poll()
+        self.assertEqual(calls, ["first", "a"])
+        self.assertEqual(emitted, [])
+
+
+class WriteThrough_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.connector = BlockTestConnector()
+        self.connector.write_through = True
+        self.tag = self.connector.add_tag(Tag("command", 5, datatype=int))
+        self.tag.high_priority = True
+
+    def test_changes_are_written_without_poll(self):
+        self.tag.value = 1
+        self.tag.value = 2
+        self.assertEqual(self.connector.single_writes, [])
+        self.app.processEvents()
+        self.assertEqual(self.connector.single_writes, [5])
+        self.assertEqual(self.connector.ringbuffer[5], 2)
+        self.assertFalse(self.tag.dirty)
+
+    def test_latency_is_recorded(self):
+        self.tag.value = 1
+        self.app.processEvents()
+        latency = self.connector.statistics["write_latency"]
+        self.assertEqual(len(latency), 1)
+        self.assertLess(latency.last, 1.0)
+
+    def test_normal_priority_waits_for_poll(self):
+        self.tag.high_priority = False
+        self.tag.value = 1
+        self.app.processEvents()
+        self.assertEqual(self.connector.single_writes, [])
+        self.connector.poll()
+        self.assertEqual(self.connector.single_writes, [5])
+        self.assertEqual(len(self.connector.statistics["write_latency"]), 1)
+
+
+class FailingTestConnector(RingBufferTestConnector):
+    def __init__(self):
+        super(FailingTestConnector, self).__init__()
+        self.down = False
+        self.bad_addresses = set()
+        self.requests = 0
+        self.reconnects = 0
+
+    def read_from_plc(self, address, datatype):
+        self.requests += 1
+        if self.down:
+            raise TransportError("timeout")
+        if address in self.bad_addresses:
+            raise ConnectionError("invalid address {}".format(address))
+        return super(FailingTestConnector, self).read_from_plc(address, datatype)
+
+    def write_to_plc(self, address, value, datatype):
+        self.requests += 1
+        if self.down:
+            raise TransportError("timeout")
+        super(FailingTestConnector, self).write_to_plc(address, value, datatype)
+
+    def reconnect(self):
+        self.reconnects += 1
+
+
+class ConnectionState_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = FailingTestConnector()
+        self.connector.failure_threshold = 2
+        self.connector.backoff_initial = 10.0
+        self.tags = [Tag("tag{}".format(i), i, datatype=int) for i in range(10)]
+        self.connector.add_tags(self.tags)
+        self.errors = mock.Mock()
+        self.connector.connectionError.connect(self.errors)
+        self.states = mock.Mock()
+        self.connector.connectionStateChanged.connect(self.states)
+
+    def test_cycle_is_aborted_on_first_error(self):
+        self.tags[3].value = 7
+        self.tags[5].value = 8
+        self.connector.down = True
+        self.connector.poll()
+        self.assertEqual(self.connector.requests, 1)
+        self.errors.assert_called_once_with("timeout")
+        self.assertTrue(self.tags[3].dirty)
+        self.assertTrue(self.tags[5].dirty)
+        self.assertEqual(self.connector.connection_state, DEGRADED)
+
+        self.connector.fail_fast = False
+        self.connector.poll()
+        self.assertEqual(self.connector.requests, 13)
+        self.assertEqual(self.errors.call_count, 2)
+
+    def test_tag_error_does_not_abort(self):
+        self.connector.bad_addresses.add(3)
+        self.connector.ringbuffer[7] = 70
+        for _ in range(3):
+            self.connector.poll()
+        self.assertEqual(self.connector.requests, 30)
+        self.assertEqual(self.errors.call_count, 3)
+        self.errors.assert_called_with("invalid address 3")
+        self.assertEqual(self.tags[7].value, 70)
+        self.assertEqual(self.connector.connection_state, CONNECTED)
+        self.states.assert_not_called()
+
+    def test_circuit_breaker(self):
+        self.connector.poll()
+        self.connector.down = True
+        self.connector.poll()
+        self.connector.poll()
+        self.assertEqual(self.connector.connection_state, DOWN)
+        self.assertEqual(
+            [c[0][0] for c in self.states.call_args_list], [DEGRADED, DOWN]
+        )
+        self.assertTrue(all(tag.stale for tag in self.tags))
+        self.assertEqual(self.tags[4].value, 4)
+
+        requests = self.connector.requests
+        self.assertTrue(self.connector.circuit_open)
+        self.connector.poll()
+        self.assertEqual(self.connector.requests, requests)
+
+        self.connector._retry_at = 0.0
+        self.connector.poll()
+        self.assertEqual(self.connector.reconnects, 1)
+        self.assertGreater(self.connector._retry_at - time.monotonic(), 15.0)
+
+        self.connector.down = False
+        self.connector._retry_at = 0.0
+        self.connector.poll()
+        self.assertEqual(self.connector.connection_state, CONNECTED)
+        self.assertEqual(self.connector.failure_count, 0)
+        self.assertFalse(any(tag.stale for tag in self.tags))
+        self.states.assert_called_with(CONNECTED)
+
+
+class NotifyingTestConnector(RingBufferTestConnector):
+    def __init__(self):
+        super(NotifyingTestConnector, self).__init__()
+        self.subscriptions = []
+        self.reads = []
+
+    def read_from_plc(self, address, datatype):
+        self.reads.append(address)
+        return super(NotifyingTestConnector, self).read_from_plc(address, datatype)
+
+    def subscribe_notification(self, tag):
+        self.subscriptions.append(tag)
+
+    def unsubscribe_notification(self, tag):
+        self.subscriptions.remove(tag)
+
+    def push(self, values):
+        """Report changed values from an I/O thread."""
+        def run():
+            for tag, value in values:
+                self.notify(tag, value)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+
+class Notification_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.connector = NotifyingTestConnector()
+        self.notified = self.connector.add_tag(Tag("notified", 1, datatype=int))
+        self.polled = self.connector.add_tag(Tag("polled", 2, datatype=int))
+        self.connector.add_notification(self.notified)
+
+    def test_unsupported(self):
+        connector = RingBufferTestConnector()
+        self.assertFalse(connector.supports_notifications)
+        self.assertRaises(NotImplementedError, connector.add_notification,
+                          connector.add_tag(Tag("tag", 0)))
+
+    def test_notified_tags_are_not_polled(self):
+        self.assertEqual(self.connector.subscriptions, [self.notified])
+        self.connector.poll()
+        self.assertEqual(self.connector.reads, [2])
+
+        self.notified.value = 5
+        self.connector.poll()
+        self.assertEqual(self.connector.ringbuffer[1], 5)
+
+        self.connector.remove_notification(self.notified)
+        self.assertEqual(self.connector.subscriptions, [])
+        self.connector.poll()
+        self.assertIn(1, self.connector.reads)
+
+    def test_notifications_are_applied_in_batches(self):
+        changed = mock.Mock()
+        self.notified.value_changed.connect(changed)
+        tags_changed = mock.Mock()
+        self.connector.tags_changed.connect(tags_changed)
+
+        self.connector.push([(self.notified, 3), (self.notified, 4)])
+        self.assertIsNone(self.notified.value)
+        self.app.processEvents()
+
+        self.assertEqual(self.notified.value, 4)
+        changed.assert_called_once_with()
+        tags_changed.assert_called_once()
+        self.assertEqual(tags_changed.call_args[0][0].tags, [self.notified])
+
+        self.connector.remove_tag("notified")
+        self.assertEqual(self.connector.notified_tags, {})
+
 
 class BufferConnector_Test(unittest.TestCase):
     def setUp(self):
@@ -72,6 +689,84 @@ class BufferConnector_Test(unittest.TestCase):
         self.buffer.poll()
         self.assertEqual(self.buffer.tags["first tag"].value, 10)
 
+    def test_only_changed_sources_are_copied(self):
+        self.buffer.add_tag(Tag("second tag", "second tag"))
+        self.connector.poll()
+        self.buffer.poll()
+
+        self.connector.ringbuffer[20] = 5
+        self.connector.poll()
+        with mock.patch.object(
+            self.buffer, "read_tags", wraps=self.buffer.read_tags
+        ) as read_tags:
+            self.buffer.poll()
+        cycle = read_tags.call_args[0][0]
+        self.assertEqual(cycle.reads, [self.buffer.tags["second tag"]])
+        self.assertEqual(self.buffer.tags["second tag"].value, 5.0)
+
+    def test_explicit_tags_are_filtered(self):
+        second = self.buffer.add_tag(Tag("second tag", "second tag"))
+        self.connector.poll()
+        self.buffer.poll()
+
+        self.connector.ringbuffer[20] = 5
+        self.connector.poll()
+        with mock.patch.object(
+            self.buffer, "read_tags", wraps=self.buffer.read_tags
+        ) as read_tags:
+            self.buffer.poll(list(self.buffer.tags.values()))
+        self.assertEqual(read_tags.call_args[0][0].reads, [second])
+
+    def test_source_added_later(self):
+        tag = self.buffer.add_tag(Tag("late", "third tag"))
+        self.buffer.poll()
+        self.assertIsNone(tag.value)
+
+        self.connector.add_tag(Tag("third tag", 30, 2, int))
+        self.connector.poll()
+        self.buffer.poll()
+        self.assertEqual(tag.value, 30)
+
+        self.connector.ringbuffer[30] = 31
+        self.connector.poll()
+        self.buffer.poll()
+        self.assertEqual(tag.value, 31)
+
+    def test_source_tag_object(self):
+        source = self.connector.tags["first tag"]
+        self.buffer.add_tag(Tag("direct", source, datatype=int))
+        self.connector.poll()
+        self.buffer.poll()
+        self.assertEqual(self.buffer.tags["direct"].value, 10)
+
+    def test_table_source(self):
+        table = TagTable()
+        table.add("row", 30, datatype=int)
+        self.connector.add_table(table)
+        tag = self.buffer.add_tag(Tag("row", "row", datatype=int))
+        self.buffer.poll()
+        self.assertIsNone(tag.value)
+
+        self.connector.poll()
+        self.buffer.poll()
+        self.assertEqual(tag.value, 30)
+
+        self.buffer.remove_tag("row")
+        self.assertEqual(self.buffer._table_tags, {})
+
+    def test_table_view_source(self):
+        table = TagTable()
+        table.add("row", 30, datatype=int)
+        self.connector.add_table(table)
+        by_view = self.buffer.add_tag(Tag("by view", table.tag("row"), datatype=int))
+        by_name = self.buffer.add_tag(Tag("by name", "row", datatype=int))
+        for value in (1, 2, 3):
+            self.connector.ringbuffer[30] = value
+            self.connector.poll()
+            self.buffer.poll()
+            self.assertEqual(by_view.value, value)
+            self.assertEqual(by_name.value, value)
+
 
 if __name__ == '__main__':
    unittest.main()
\ No newline at end of file
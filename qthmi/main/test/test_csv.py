@@ -1,6 +1,9 @@
+import csv
 import unittest
 import os
+import tempfile
 from qthmi.main.connector import AbstractPLCConnector
+from qthmi.main.history import TagHistory
 from qthmi.main.log import CSVWriter
 from qthmi.main.tag import Tag
 
@@ -66,5 +69,27 @@ class CSVWriter_Test(unittest.TestCase):
         self.csvwriter.tags.append(self.tag1)
         self.assertRaises(IOError, self.csvwriter.writerow)
 
+    def test_write_history(self):
+        history = TagHistory([self.tag1, self.tag2, self.tag3])
+        history.append(1.0, [1, 2, 3])
+        history.append(2.0, [4, float("nan"), 6])
+        self.csvwriter = CSVWriter(dialect=csv.excel())
+        self.csvwriter.tags.extend([self.tag3, self.tag2])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "history.csv")
+            self.csvwriter.open(filename)
+            self.assertEqual(self.csvwriter.write_history(history), 2)
+            self.assertEqual(self.csvwriter.write_history(history), 0)
+            self.csvwriter.close()
+            with open(filename) as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual(rows, [
+            ["Timestamp", "Tag3", "Tag2"],
+            ["1.0", "3.0", "2.0"],
+            ["2.0", "6.0", "None"],
+        ])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
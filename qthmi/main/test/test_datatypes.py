@@ -0,0 +1,131 @@
+import struct
+import unittest
+import numpy as np
+from qthmi.main.connector import AbstractPLCConnector
+from qthmi.main.datatypes import (
+    BOOL, DINT, INT, LREAL, REAL, UINT, DatatypeRegistry, bit, string
+)
+from qthmi.main.tag import Tag
+from qthmi.main.tagtable import TagTable
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class ByteTestConnector(AbstractPLCConnector):
+    """Byte addressed PLC with little endian values."""
+
+    def __init__(self):
+        super(ByteTestConnector, self).__init__()
+        self.memory = bytearray(64)
+        self.block_requests = []
+        self.single_writes = []
+        self.datatypes = DatatypeRegistry("<", 1)
+
+    def read_block(self, start, length):
+        self.block_requests.append((start, length))
+        return bytes(self.memory[start:start + length])
+
+    def write_block(self, start, values):
+        self.memory[start:start + len(values)] = values
+
+    def read_from_plc(self, address, datatype):
+        size = self.datatypes.size(datatype)
+        return self.datatypes.decode_value(
+            datatype, self.memory[address:address + size]
+        )
+
+    def write_to_plc(self, address, value, datatype):
+        self.single_writes.append(address)
+
+
+class DatatypeRegistry_Test(unittest.TestCase):
+
+    def test_sizes(self):
+        registry = DatatypeRegistry(unit_size=2)
+        self.assertEqual(registry.size(REAL), 4)
+        self.assertEqual(registry.units(REAL), 2)
+        self.assertEqual(registry.units(BOOL), 1)
+        self.assertEqual(registry.units(string(5)), 3)
+        self.assertEqual(registry.units(bit(15)), 1)
+        self.assertEqual(
+            registry.units_array(np.array([INT, LREAL, INT])).tolist(), [1, 4, 1]
+        )
+        self.assertRaises(ValueError, registry.size, None)
+        self.assertRaises(ValueError, registry.size, 99)
+
+    def test_decode_mixed_block(self):
+        registry = DatatypeRegistry("<")
+        buffer = struct.pack("<hidf?", -2, 100000, 1.5, 0.25, True) + b"ab\0c"
+        values = registry.decode(
+            buffer,
+            [0, 2, 6, 14, 18, 19, 18],
+            [INT, DINT, LREAL, REAL, BOOL, string(4), bit(0)],
+        )
+        self.assertEqual(values.tolist(), [-2, 100000, 1.5, 0.25, True, "ab", True])
+        self.assertIsInstance(values.tolist()[0], int)
+
+    def test_decode_contiguous_values_without_copy(self):
+        registry = DatatypeRegistry("<")
+        buffer = np.arange(10, dtype="<f8").tobytes()
+        values = registry.decode(buffer, [8, 16, 24], [LREAL] * 3, np.float64)
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0])
+
+    def test_big_endian_registers(self):
+        registry = DatatypeRegistry(">", unit_size=2, default=UINT)
+        buffer = struct.pack(">Hf", 0x8001, 2.5)
+        values = registry.decode(buffer, [0, 1, 0, 0], [None, REAL, bit(0), bit(15)])
+        self.assertEqual(values.tolist(), [0x8001, 2.5, True, True])
+        self.assertFalse(registry.decode_value(bit(1), buffer))
+
+    def test_encode(self):
+        registry = DatatypeRegistry(">", unit_size=2)
+        data = registry.encode(4, [0, 1, 3], [INT, REAL, string(2)], [-1, 2.5, "x"])
+        self.assertEqual(data, struct.pack(">hf", -1, 2.5) + b"x\0")
+        self.assertEqual(registry.encode_value(DINT, 7), struct.pack(">i", 7))
+        self.assertRaises(ValueError, registry.encode, 1, [0], [bit(0)], [True])
+
+
+class ConnectorDatatypes_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = ByteTestConnector()
+        struct.pack_into("<hf", self.connector.memory, 0, 12, 1.5)
+        struct.pack_into("<d", self.connector.memory, 8, 2.25)
+        self.connector.memory[16] = 0b101
+        self.tags = [
+            Tag("int", 0, INT, int),
+            Tag("real", 2, REAL, float),
+            Tag("lreal", 8, LREAL, float),
+            Tag("bit0", 16, bit(0), bool),
+            Tag("bit1", 16, bit(1), bool),
+        ]
+        self.connector.add_tags(self.tags)
+
+    def test_block_read(self):
+        self.connector.poll()
+        self.assertEqual(self.connector.block_requests, [(0, 17)])
+        self.assertEqual(
+            [tag.value for tag in self.tags], [12, 1.5, 2.25, True, False]
+        )
+
+    def test_block_write(self):
+        self.tags[0].value = -5
+        self.tags[1].value = 0.5
+        self.tags[3].value = False
+        self.connector.poll()
+        self.assertEqual(struct.unpack_from("<hf", self.connector.memory), (-5, 0.5))
+        self.assertEqual(self.connector.single_writes, [16])
+
+    def test_table(self):
+        table = TagTable()
+        table.add("int", 0, INT)
+        table.add("lreal", 8, LREAL)
+        table.add("bit2", 16, bit(2))
+        self.connector.add_table(table)
+        self.connector.poll()
+        self.assertEqual(table.raw_values.tolist(), [12.0, 2.25, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest import mock
+from qthmi.main.derived import DependencyGraph, DerivedTag
+from qthmi.main.simulation import SimulatedPLCConnector
+from qthmi.main.tag import Tag
+from qthmi.main.tagtable import TagTable
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class DerivedTag_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.a = Tag("a", 0, datatype=float)
+        self.b = Tag("b", 1, datatype=float)
+
+    def test_expression(self):
+        tag = DerivedTag("ratio", "sqrt(x) / y", {"x": self.a, "y": self.b})
+        self.a.raw_value = 16
+        self.b.raw_value = 2
+        self.assertTrue(tag.update())
+        self.assertEqual(tag.value, 2.0)
+        self.assertFalse(tag.update())
+
+    def test_callable(self):
+        tag = DerivedTag("sum", lambda a, b: a + b, [self.a, self.b], int)
+        self.assertIsNone(tag.compute())
+        self.a.raw_value = 1
+        self.b.raw_value = 2.5
+        tag.update()
+        self.assertEqual(tag.value, 3)
+
+    def test_errors(self):
+        tag = DerivedTag("ratio", "a / b", [self.a, self.b])
+        self.a.raw_value = 1
+        self.b.raw_value = 0
+        tag.update()
+        self.assertIsNone(tag.value)
+        self.assertIsInstance(tag.error, ZeroDivisionError)
+
+        tag = DerivedTag("builtin", "open(a)", [self.a])
+        self.assertIsNone(tag.compute())
+        self.assertIsInstance(tag.error, NameError)
+
+    def test_read_only(self):
+        tag = DerivedTag("copy", "a", [self.a])
+        with self.assertRaises(AttributeError):
+            tag.value = 1
+        self.assertFalse(tag.dirty)
+
+
+class DependencyGraph_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = SimulatedPLCConnector(size=10)
+        self.a = Tag("a", 0, datatype=float)
+        self.b = Tag("b", 1, datatype=float)
+        self.connector.add_tags([self.a, self.b])
+        self.connector.memory[:2] = [2, 3]
+
+    def test_topological_order_and_signals(self):
+        total = DerivedTag("total", "a + b", [self.a, self.b])
+        double = DerivedTag("double", "total * 2", [total])
+        graph = self.connector.add_processor(DependencyGraph([double, total]))
+        self.assertEqual(graph.order, [total, double])
+
+        changed = mock.Mock()
+        double.value_changed.connect(changed)
+        tags_changed = mock.Mock()
+        self.connector.tags_changed.connect(tags_changed)
+
+        self.connector.poll()
+        self.assertEqual(double.value, 10.0)
+        changed.assert_called_once_with()
+        self.assertIn(double, tags_changed.call_args[0][0].tags)
+
+        with mock.patch.object(total, "compute") as compute:
+            self.connector.poll()
+            compute.assert_not_called()
+
+        self.connector.memory[1] = 4
+        self.connector.poll()
+        self.assertEqual(double.value, 12.0)
+        self.assertEqual(changed.call_count, 2)
+
+    def test_only_changed_inputs_are_recomputed(self):
+        from_a = DerivedTag("from_a", "a", [self.a])
+        from_b = DerivedTag("from_b", "b", [self.b])
+        self.connector.add_processor(DependencyGraph([from_a, from_b]))
+        self.connector.poll()
+
+        self.connector.memory[0] = 5
+        with mock.patch.object(from_b, "compute") as compute:
+            self.connector.poll()
+            compute.assert_not_called()
+        self.assertEqual(from_a.value, 5.0)
+
+    def test_circular_dependency(self):
+        first = DerivedTag("first", "a", [self.a])
+        second = DerivedTag("second", "first", [first])
+        first.inputs.append(second)
+        graph = DependencyGraph()
+        graph.add(second)
+        self.assertRaises(ValueError, graph.add, first)
+        self.assertEqual(graph.order, [second])
+
+    def test_subscribed_only(self):
+        total = DerivedTag("total", "a + b", [self.a, self.b])
+        double = DerivedTag("double", "total * 2", [total])
+        self.connector.add_processor(DependencyGraph([total, double]))
+        self.connector.poll_subscribed_only = True
+        self.connector.poll()
+        self.assertIsNone(double.value)
+
+        consumer = mock.Mock()
+        double.subscribe(consumer)
+        self.assertTrue(self.a.subscribed)
+        self.connector.poll()
+        self.assertEqual(double.value, 10.0)
+
+        double.unsubscribe(consumer)
+        self.assertFalse(self.b.subscribed)
+        self.assertFalse(total.subscribed)
+
+    def test_table_inputs(self):
+        table = TagTable()
+        table.add("t", 2, datatype=float)
+        view = table.tag("t")
+        self.connector.add_table(table)
+        tag = DerivedTag("neg", "-t", [view])
+        self.connector.add_processor(DependencyGraph([tag]))
+        self.connector.memory[2] = 7
+        self.connector.poll()
+        self.assertEqual(tag.value, -7.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from qthmi.main.diagnostics import CycleRecord, PollStatistics, RollingSeries
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class RollingSeries_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.series = RollingSeries(4)
+
+    def test_empty_series(self):
+        self.assertEqual(len(self.series), 0)
+        self.assertIsNone(self.series.last)
+        self.assertEqual(self.series.percentile(50), 0.0)
+
+    def test_oldest_values_are_dropped(self):
+        for i in range(6):
+            self.series.append(i)
+        self.assertEqual(self.series.values(), [2, 3, 4, 5])
+        self.assertEqual(self.series.last, 5)
+        self.assertEqual(self.series.total, 6)
+
+    def test_percentiles(self):
+        for i in (4, 1, 3, 2):
+            self.series.append(i)
+        self.assertEqual(self.series.percentile(0), 1)
+        self.assertEqual(self.series.percentile(50), 2.5)
+        self.assertEqual(self.series.percentile(100), 4)
+        self.assertEqual(self.series.mean(), 2.5)
+        self.assertEqual(self.series.max(), 4)
+
+    def test_histogram(self):
+        for i in (0.5, 1.5, 1.7, 5.0):
+            self.series.append(i)
+        self.assertEqual(self.series.histogram([1, 2, 3]), [1, 2, 0, 1])
+
+
+class PollStatistics_Test(unittest.TestCase):
+
+    def test_add_record(self):
+        statistics = PollStatistics(10)
+        statistics.add(CycleRecord(0.1, 0.06, 0.02, 100, 2, jitter=0.001))
+        statistics.add(CycleRecord(0.3, 0.2, 0.05, 100, 0))
+        self.assertEqual(statistics.cycles, 2)
+        self.assertEqual(statistics.errors, 2)
+        self.assertEqual(len(statistics["jitter"]), 1)
+        summary = statistics.summary()
+        self.assertAlmostEqual(summary["duration"]["mean"], 0.2)
+        self.assertAlmostEqual(summary["duration"]["max"], 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
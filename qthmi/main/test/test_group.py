@@ -0,0 +1,108 @@
+import time
+import unittest
+from unittest import mock
+from qthmi.main.group import DEFAULT_TIMEOUT, ConnectorGroup
+from qthmi.main.simulation import SimulatedPLCConnector
+from qthmi.main.tag import Tag
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class ConnectorGroup_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.group = ConnectorGroup(max_workers=4)
+        self.connectors = []
+        self.tags = []
+        for i in range(4):
+            connector = SimulatedPLCConnector(size=10, latency=0.05)
+            connector.memory[0] = i + 1
+            tag = Tag("tag{}".format(i), 0, datatype=int)
+            connector.add_tag(tag)
+            self.group.add_connector(connector)
+            self.connectors.append(connector)
+            self.tags.append(tag)
+
+    def tearDown(self):
+        self.group.shutdown()
+
+    def test_connectors_are_polled_in_parallel(self):
+        t0 = time.perf_counter()
+        self.group.poll()
+        elapsed = time.perf_counter() - t0
+        self.assertEqual([tag.value for tag in self.tags], [1, 2, 3, 4])
+        self.assertLess(elapsed, 0.15)
+
+    def test_changes_are_merged(self):
+        changed = mock.Mock()
+        polled = mock.Mock()
+        self.group.tags_changed.connect(changed)
+        self.group.polled.connect(polled)
+
+        self.group.poll()
+        self.assertEqual(changed.call_count, 1)
+        self.assertEqual(set(changed.call_args[0][0].tags), set(self.tags))
+
+        self.group.poll()
+        self.assertEqual(changed.call_count, 1)
+        self.assertEqual(polled.call_count, 2)
+
+    def test_timeout(self):
+        slow = self.connectors[0]
+        slow.latency = 0.3
+        self.group.timeouts[slow] = 0.05
+        timed_out = mock.Mock()
+        self.group.timedOut.connect(timed_out)
+
+        self.group.poll()
+        timed_out.assert_called_once_with(slow)
+        self.assertIsNone(self.tags[0].value)
+        self.assertEqual([tag.value for tag in self.tags[1:]], [2, 3, 4])
+
+        # busy connector is not polled again
+        self.group.poll()
+        self.assertEqual(slow.requests, 1)
+
+        time.sleep(0.3)
+        slow.latency = 0.0
+        self.group.poll()
+        self.assertEqual(self.tags[0].value, 1)
+        self.assertEqual(slow.requests, 2)
+        self.assertEqual(self.group.late_cycles, 1)
+
+    def test_default_timeout(self):
+        self.assertEqual(self.group.timeouts[self.connectors[0]], DEFAULT_TIMEOUT)
+        slow = self.connectors[0]
+        slow.latency = 0.3
+        self.group.default_timeout = 0.05
+        self.group.remove_connector(slow)
+        self.group.add_connector(slow)
+
+        t0 = time.perf_counter()
+        self.group.poll()
+        self.assertLess(time.perf_counter() - t0, 0.2)
+        self.assertEqual(self.group.late_cycles, 1)
+        time.sleep(0.3)
+
+    def test_exception_of_one_member(self):
+        broken = self.connectors[0]
+        polled = mock.Mock()
+        self.group.polled.connect(polled)
+        with mock.patch.object(broken, "read_tags", side_effect=ValueError("bug")):
+            with self.assertRaises(ValueError):
+                self.group.poll()
+        self.assertIsNone(self.tags[0].value)
+        self.assertEqual([tag.value for tag in self.tags[1:]], [2, 3, 4])
+        self.assertEqual(self.connectors[1].statistics.cycles, 1)
+        polled.assert_called_once_with()
+
+    def test_remove_connector(self):
+        self.group.remove_connector(self.connectors[0])
+        self.group.poll()
+        self.assertIsNone(self.tags[0].value)
+        self.assertEqual(self.connectors[0].requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+from qthmi.main.connector import BufferConnector
+from qthmi.main.history import TagHistory
+from qthmi.main.simulation import SimulatedPLCConnector
+from qthmi.main.tag import Tag
+from qthmi.main.tagtable import TagTable
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class TagHistory_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = [Tag("a", 0), Tag("b", 1)]
+        self.history = TagHistory(self.tags, capacity=4)
+
+    def test_drain_per_consumer(self):
+        for i in range(3):
+            self.history.set_value(self.tags[0], i)
+            self.history.sample(float(i))
+
+        timestamps, values = self.history.drain("first")
+        self.assertEqual(timestamps.tolist(), [0.0, 1.0, 2.0])
+        self.assertEqual(values[:, 0].tolist(), [0.0, 1.0, 2.0])
+        self.assertTrue(np.isnan(values[:, 1]).all())
+
+        self.history.set_value(self.tags[1], "text")
+        self.history.set_value(self.tags[1], True)
+        self.history.sample(3.0)
+        timestamps, values = self.history.drain("first")
+        self.assertEqual(timestamps.tolist(), [3.0])
+        self.assertEqual(values.tolist(), [[2.0, 1.0]])
+        self.assertEqual(len(self.history.drain("first")[0]), 0)
+        self.assertEqual(len(self.history.drain("second")[0]), 4)
+
+    def test_overrun(self):
+        self.history.drain("consumer")
+        for i in range(6):
+            self.history.append(float(i), [i, i])
+
+        self.assertEqual(len(self.history), 4)
+        timestamps, values = self.history.drain("consumer")
+        self.assertEqual(timestamps.tolist(), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(self.history.lost, {"consumer": 2})
+
+        self.history.release("consumer")
+        self.assertEqual(self.history.lost, {})
+
+
+class BufferHistory_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = SimulatedPLCConnector(size=10)
+        self.connector.add_tag(Tag("a", 0))
+        table = TagTable()
+        table.add("b", 1)
+        self.connector.add_table(table)
+        self.buffer = BufferConnector(self.connector)
+        self.buffer.add_tags([Tag("a", "a"), Tag("b", "b")])
+
+    def test_every_source_cycle_is_sampled(self):
+        history = self.buffer.enable_history(capacity=100)
+        for i in range(5):
+            self.connector.memory[0] = i
+            self.connector.memory[1] = 2 * i
+            self.connector.poll()
+
+        timestamps, values = history.drain(self)
+        self.assertEqual(len(timestamps), 5)
+        self.assertTrue((np.diff(timestamps) >= 0).all())
+        self.assertEqual(values[:, history.column(self.buffer.tags["a"])].tolist(),
+                         [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(values[:, history.column(self.buffer.tags["b"])].tolist(),
+                         [0.0, 2.0, 4.0, 6.0, 8.0])
+
+        self.buffer.poll()
+        self.assertEqual(self.buffer.tags["a"].value, 4.0)
+
+        self.buffer.disable_history()
+        self.connector.poll()
+        self.assertEqual(history.count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
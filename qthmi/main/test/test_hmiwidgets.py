@@ -1,7 +1,8 @@
 import unittest
+from PyQt5.QtWidgets import QApplication
 from qthmi.main.connector import AbstractPLCConnector
 from qthmi.main.tag import Tag
-from qthmi.main.widgets import HMITextMapper
+from qthmi.main.widgets import HMILabel, HMITextMapper
 
 
 __author__ = 'Stefan Lehmann'
@@ -51,5 +52,25 @@ class HMITextMapper_Test(unittest.TestCase):
         self.assertEqual(self.textmapper.text, "")
 
 
+class Subscription_Test(unittest.TestCase):
+    def setUp(self):
+        self.app = QApplication.instance() or QApplication([])
+        self.tag = Tag("tag", 0)
+
+    def test_hmi_object_subscribes(self):
+        textmapper = HMITextMapper(self.tag)
+        self.assertTrue(self.tag.subscribed)
+        del textmapper
+        self.assertFalse(self.tag.subscribed)
+
+    def test_widget_subscribes_while_visible(self):
+        label = HMILabel(self.tag)
+        self.assertFalse(self.tag.subscribed)
+        label.show()
+        self.assertTrue(self.tag.subscribed)
+        label.hide()
+        self.assertFalse(self.tag.subscribed)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
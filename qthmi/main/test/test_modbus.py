@@ -0,0 +1,166 @@
+import struct
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from qthmi.main.connector import CONNECTED, DEGRADED
+from qthmi.main.datatypes import DINT, INT, REAL, bit
+from qthmi.main.modbus import (
+    HOLDING_REGISTER, ILLEGAL_ADDRESS, ModbusException, ModbusServer,
+    ModbusTCPConnector, coil, discrete_input, holding_register, input_register,
+    split_address
+)
+from qthmi.main.tag import Tag
+from qthmi.main.tagtable import TagTable
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class Address_Test(unittest.TestCase):
+
+    def test_split_address(self):
+        self.assertEqual(split_address(holding_register(0)), (HOLDING_REGISTER, 0))
+        self.assertEqual(holding_register(99), 400100)
+        self.assertEqual(coil(0), 1)
+        self.assertRaises(ValueError, split_address, 200001)
+        self.assertRaises(ValueError, split_address, 400000)
+
+
+class ModbusTCPConnector_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ModbusServer()
+        self.server.start()
+        self.connector = ModbusTCPConnector(*self.server.address)
+
+    def tearDown(self):
+        self.connector.close()
+        self.server.stop()
+
+    def test_read_areas(self):
+        registers = struct.unpack(">3H", struct.pack(">fh", 1.5, -3))
+        self.server.holding_registers[10:13] = registers
+        self.server.holding_registers[20] = 0b1000
+        self.server.input_registers[5] = 42
+        self.server.coils[7] = True
+        self.server.discrete_inputs[2] = True
+
+        tags = [
+            Tag("real", holding_register(10), REAL, float),
+            Tag("int", holding_register(12), INT, int),
+            Tag("bit", holding_register(20), bit(3), bool),
+            Tag("input", input_register(5), datatype=int),
+            Tag("coil", coil(7), datatype=bool),
+            Tag("coil6", coil(6), datatype=bool),
+            Tag("input_bit", discrete_input(2), datatype=bool),
+        ]
+        self.connector.add_tags(tags)
+        self.connector.poll()
+
+        self.assertEqual(
+            [tag.value for tag in tags], [1.5, -3, True, 42, True, False, True]
+        )
+        self.assertEqual(self.connector.requests, 4)
+        self.assertEqual(self.server.connections, 1)
+
+        self.connector.poll()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_blocks_are_limited_and_pipelined(self):
+        self.server.holding_registers[:300] = np.arange(300)
+        tags = [Tag("r{}".format(i), holding_register(i), datatype=int)
+                for i in range(300)]
+        self.connector.add_tags(tags)
+        self.server.latency = 0.1
+
+        start = time.perf_counter()
+        self.connector.poll()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([tag.value for tag in tags], list(range(300)))
+        self.assertEqual(self.server.requests, 3)
+        self.assertLess(elapsed, 0.25)
+
+    def test_table(self):
+        self.server.input_registers[:4] = [5, 6, 7, 8]
+        self.server.coils[1] = True
+        table = TagTable(np.int64)
+        for i in range(4):
+            table.add("r{}".format(i), input_register(i))
+        table.add("c0", coil(0))
+        table.add("c1", coil(1))
+        self.connector.add_table(table)
+        self.connector.poll()
+        self.assertEqual(table.raw_values.tolist(), [5, 6, 7, 8, 0, 1])
+
+    def test_write(self):
+        self.server.holding_registers[20] = 0b0001
+        real = Tag("real", holding_register(10), REAL, float)
+        flag = Tag("flag", holding_register(20), bit(3), bool)
+        coils = [Tag("c{}".format(i), coil(i), datatype=bool) for i in range(3)]
+        single = Tag("single", coil(9), bit(0), bool)
+        self.connector.add_tags([real, flag, single] + coils)
+
+        real.value = 2.5
+        flag.value = True
+        single.value = True
+        for tag in coils:
+            tag.value = tag is not coils[1]
+        self.connector.poll()
+
+        self.assertEqual(
+            struct.unpack(">f", self.server.holding_registers[10:12].astype(">u2")
+                          .tobytes()),
+            (2.5,),
+        )
+        self.assertEqual(self.server.holding_registers[20], 0b1001)
+        self.assertEqual(self.server.coils[:3].tolist(), [True, False, True])
+        self.assertTrue(self.server.coils[9])
+        self.assertFalse(any(tag.dirty for tag in [real, flag, single] + coils))
+
+    def test_read_only_area(self):
+        self.assertRaises(ValueError, self.connector.write_to_plc,
+                          input_register(0), 1, None)
+
+    def test_exception_response(self):
+        errors = mock.Mock()
+        self.connector.connectionError.connect(errors)
+        self.connector.add_tag(Tag("bad", holding_register(65535), REAL, float))
+        self.connector.poll()
+        errors.assert_called_once_with("Modbus exception 2 of function 3")
+        self.assertIsNotNone(self.connector._socket)
+        self.assertEqual(self.connector.connection_state, CONNECTED)
+
+    def test_bad_address_next_to_good_tag(self):
+        errors = mock.Mock()
+        self.connector.connectionError.connect(errors)
+        good = self.connector.add_tag(
+            Tag("good", holding_register(65533), datatype=int))
+        self.connector.add_tag(Tag("bad", holding_register(65535), DINT, int))
+        for value in range(5):
+            self.server.holding_registers[65533] = value
+            self.connector.poll()
+            self.assertEqual(good.value, value)
+        self.assertEqual(errors.call_count, 5)
+        self.assertEqual(self.connector.connection_state, CONNECTED)
+
+        with self.assertRaises(ModbusException) as context:
+            self.connector.read_block(holding_register(65535), 2)
+        self.assertEqual(context.exception.code, ILLEGAL_ADDRESS)
+
+    def test_server_down(self):
+        tag = self.connector.add_tag(Tag("tag", holding_register(0), datatype=int))
+        self.connector.poll()
+        self.server.stop()
+        errors = mock.Mock()
+        self.connector.connectionError.connect(errors)
+        self.connector.poll()
+        errors.assert_called_once()
+        self.assertEqual(self.connector.connection_state, DEGRADED)
+        self.assertIsNone(self.connector._socket)
+        self.assertEqual(tag.value, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import queue
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from PyQt5.QtCore import QCoreApplication
+from qthmi.main.connector import CONNECTED, DEGRADED, ConnectionError
+from qthmi.main.process import ProcessPollEngine, SharedTagTable
+from qthmi.main.simulation import SimulatedPLCConnector
+
+
+__author__ = 'Stefan Lehmann'
+
+
+def make_connector():
+    connector = SimulatedPLCConnector(size=100)
+    connector.memory[:10] = np.arange(10, 20)
+    return connector
+
+
+class RejectingConnector(SimulatedPLCConnector):
+    """Reject the first two writes and fail the reads of one cycle."""
+
+    def __init__(self):
+        super(RejectingConnector, self).__init__(size=100)
+        self.rejected = 0
+
+    def write_to_plc(self, address, value, datatype=None):
+        if self.rejected < 2:
+            self.rejected += 1
+            if self.rejected == 2:
+                self.inject_errors(1)
+            raise ConnectionError("write rejected")
+        super(RejectingConnector, self).write_to_plc(address, value, datatype)
+
+
+class SharedTagTable_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.table = SharedTagTable(capacity=8)
+        for i in range(4):
+            self.table.add("tag{}".format(i), i, datatype=int)
+        self.other = SharedTagTable.attach(self.table.layout())
+
+    def tearDown(self):
+        self.other.close()
+        self.table.close()
+        self.assertFalse(os.path.exists(self.table.path))
+
+    def test_capacity_is_fixed(self):
+        for i in range(4, 8):
+            self.table.add("tag{}".format(i), i)
+        self.assertRaises(ValueError, self.table.add, "tag8", 8)
+
+    def test_publish_is_visible_in_other_mapping(self):
+        self.other.publish([(np.array([0, 2]), [5, 7])])
+        self.assertEqual(self.table.cycle, 1)
+        self.assertEqual(self.table.tag("tag2").value, 7)
+        self.assertIsNone(self.table.tag("tag1").value)
+        self.assertEqual(self.other.names, self.table.names)
+
+        cycle, rows = self.table.changed_rows(0)
+        self.assertEqual((cycle, rows.tolist()), (1, [0, 2]))
+
+        self.other.publish([(np.array([0, 1, 2]), [5, 6, 8])])
+        cycle, rows = self.table.changed_rows(1)
+        self.assertEqual((cycle, rows.tolist()), (2, [1, 2]))
+
+        cycle, values, valid = self.table.snapshot()
+        self.assertEqual(values.tolist(), [5, 6, 8, 0])
+        self.assertEqual(valid.tolist(), [True, True, True, False])
+
+    def test_reader_retries_while_writing(self):
+        self.other._header[0] += 1
+        self.assertIsNone(self.table.changed_rows(0))
+        self.other._header[0] += 1
+        self.assertIsNotNone(self.table.changed_rows(0))
+
+    def test_local_values(self):
+        view = self.table.tag("tag0")
+        view.value = 3
+        self.other.publish([(np.array([0]), [1])])
+        self.assertEqual(view.value, 3)
+        self.table.clear_pending(0)
+        self.assertEqual(view.value, 1)
+
+    def test_close_keeps_values(self):
+        self.other.publish([(np.array([3]), [9])])
+        self.other.close()
+        self.assertEqual(self.other.get_raw(3), 9)
+
+
+class ProcessPollEngine_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.table = SharedTagTable(capacity=16)
+        for i in range(10):
+            self.table.add("tag{}".format(i), i, datatype=int)
+        self.engine = ProcessPollEngine(make_connector, self.table, interval=0.01)
+
+    def tearDown(self):
+        self.engine.stop()
+        self.table.close()
+
+    def wait_for(self, condition, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+            self.engine.check()
+
+    def test_factory_must_be_picklable(self):
+        engine = ProcessPollEngine(lambda: make_connector(), self.table)
+        self.assertRaises(TypeError, engine.start)
+
+    def test_poll_in_process(self):
+        view = self.table.tag("tag3")
+        changed = mock.Mock()
+        view.value_changed.connect(changed)
+        tags_changed = mock.Mock()
+        self.engine.tags_changed.connect(tags_changed)
+
+        self.engine.start()
+        self.assertTrue(self.engine.running)
+        self.wait_for(lambda: self.table.cycle > 0)
+        self.assertEqual(self.table.raw_values.tolist(), list(range(10, 20)))
+        self.assertEqual(view.value, 13)
+        changed.assert_called_once_with()
+        rows = tags_changed.call_args[0][0].rows[0][1]
+        self.assertEqual(rows.tolist(), list(range(10)))
+
+        view.value = 42
+        self.engine.check()
+        self.assertFalse(view.dirty)
+        self.wait_for(lambda: 3 not in self.table._pending)
+        self.assertEqual(self.table.raw_values[3], 42)
+        self.assertEqual(view.value, 42)
+
+        self.engine.stop()
+        self.assertFalse(self.engine.running)
+
+    def test_write_is_kept_until_reported(self):
+        engine = self.engine
+        engine._writes = queue.Queue()
+        engine._results = queue.Queue()
+        rows = np.arange(10)
+        values = np.ones(10)
+        self.table.publish([(rows, values)])
+        engine.check()
+
+        # the poll process runs ahead of check()
+        self.table.publish([(rows, values)])
+        self.table.publish([(rows, values)])
+        view = self.table.tag("tag3")
+        view.value = 5
+        engine.check()
+        self.assertEqual(view.value, 5)
+        index, value, write_id = engine._writes.get_nowait()
+        self.assertEqual((index, value), (3, 5))
+
+        for _ in range(3):
+            self.table.publish([(rows, values)])
+            engine.check()
+        self.assertEqual(view.value, 5)
+
+        values[3] = 5
+        self.table.publish([(rows, values)])
+        engine._results.put(([], [], [(3, write_id)], self.table.cycle, CONNECTED))
+        engine.check()
+        self.assertNotIn(3, self.table._pending)
+        self.assertEqual(view.value, 5)
+
+    def test_failed_writes_are_sent_again(self):
+        engine = self.engine = ProcessPollEngine(
+            RejectingConnector, self.table, interval=0.01)
+        errors = mock.Mock()
+        engine.connectionError.connect(errors)
+        states = mock.Mock()
+        engine.connectionStateChanged.connect(states)
+        view = self.table.tag("tag5")
+
+        engine.start()
+        self.wait_for(lambda: self.table.cycle > 0)
+        view.value = 7
+        self.wait_for(lambda: self.table.raw_values[5] == 7)
+        self.wait_for(lambda: 5 not in self.table._pending)
+        self.assertEqual(view.value, 7)
+        self.assertFalse(view.dirty)
+        self.assertEqual(errors.call_count, 3)
+        errors.assert_any_call("write rejected")
+        errors.assert_any_call("simulated connection error")
+        self.wait_for(lambda: engine.connection_state == CONNECTED)
+        self.assertEqual([c[0][0] for c in states.call_args_list],
+                         [DEGRADED, CONNECTED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from qthmi.main.replay import PollRecorder, RecordingReader, ReplayConnector
+from qthmi.main.simulation import SimulatedPLCConnector
+from qthmi.main.tag import Tag
+from qthmi.main.tagtable import TagTable
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class Replay_Test(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix=".rec")
+        os.close(fd)
+
+        self.connector = SimulatedPLCConnector(size=100)
+        self.tags = [
+            Tag("int", 0, datatype=int),
+            Tag("float", 1, datatype=float),
+        ]
+        self.connector.add_tags(self.tags)
+        self.table = TagTable()
+        self.table.add("row0", 10)
+        self.table.add("row1", 11)
+        self.connector.add_table(self.table)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def record(self):
+        recorder = PollRecorder(self.connector)
+        self.connector.memory[:2] = (1, 1.5)
+        self.connector.poll()
+        recorder.open(self.filename)
+        self.connector.memory[10] = 7.0
+        self.connector.poll()
+        self.connector.poll()  # nothing changed, nothing recorded
+        self.connector.memory[1] = 2.5
+        self.connector.poll()
+        recorder.close()
+        self.assertEqual(recorder.cycles, 3)
+
+    def test_roundtrip(self):
+        self.record()
+        cycles = list(RecordingReader(self.filename))
+        self.assertEqual(len(cycles), 3)
+        self.assertEqual(
+            sorted(cycles[0][1]),
+            [("float", 1.5), ("int", 1.0), ("row0", 0.0), ("row1", 0.0)],
+        )
+        self.assertEqual(cycles[1][1], [("row0", 7.0)])
+        self.assertEqual(cycles[2][1], [("float", 2.5)])
+        timestamps = [c[0] for c in cycles]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_value_types(self):
+        tag = Tag("text", "text")
+        self.connector.add_tag(tag)
+        recorder = PollRecorder(self.connector)
+        recorder.open(self.filename)
+        for value in ("äbc", True, np.int32(-3), b"\x00\x01", 2 ** 40):
+            recorder._write_cycle([("text", value)])
+        recorder.close()
+
+        values = [c[1][0][1] for c in list(RecordingReader(self.filename))[1:]]
+        self.assertEqual(values, ["äbc", True, -3, b"\x00\x01", 2 ** 40])
+        self.assertIsInstance(values[1], bool)
+
+    def test_invalid_file(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"no recording")
+        self.assertRaises(ValueError, RecordingReader, self.filename)
+
+    def replay(self, speed):
+        replay = ReplayConnector(self.filename, speed)
+        tags = [Tag("int", 0, datatype=int), Tag("float", 1, datatype=float)]
+        replay.add_tags(tags)
+        table = TagTable()
+        table.add("row0", 10)
+        table.add("row1", 11)
+        replay.add_table(table)
+        return replay, tags, table
+
+    def test_replay_as_fast_as_possible(self):
+        self.record()
+        replay, tags, table = self.replay(0)
+        finished = mock.Mock()
+        replay.replayFinished.connect(finished)
+
+        replay.poll()
+        self.assertEqual([tag.value for tag in tags], [1, 1.5])
+        replay.poll()
+        self.assertEqual(table.tag("row0").value, 7.0)
+        self.assertFalse(finished.called)
+        replay.poll()
+        self.assertEqual(tags[1].value, 2.5)
+        self.assertTrue(replay.finished)
+        self.assertEqual(finished.call_count, 1)
+
+        replay.rewind()
+        self.assertEqual(replay.replay_all(), 3)
+        self.assertEqual(replay.position, 3)
+
+    def test_replay_speed(self):
+        with mock.patch("qthmi.main.replay.time.monotonic", return_value=0.0):
+            recorder = PollRecorder(self.connector)
+            recorder.open(self.filename)
+        for t, value in ((10.0, 1.0), (20.0, 2.0)):
+            self.connector.memory[0] = value
+            with mock.patch("qthmi.main.replay.time.monotonic", return_value=t):
+                self.connector.poll()
+        recorder.close()
+
+        replay, tags, _ = self.replay(10.0)
+        for t, expected in ((100.0, None), (100.5, None), (101.0, 1), (102.0, 2)):
+            with mock.patch("qthmi.main.replay.time.monotonic", return_value=t):
+                replay.poll()
+            self.assertEqual(tags[0].raw_value, expected)
+        self.assertTrue(replay.finished)
+
+
+if __name__ == '__main__':
+    unittest.main()
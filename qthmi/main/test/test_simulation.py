@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+from qthmi.main.connector import ConnectionError
+from qthmi.main.simulation import (
+    BitPattern, RandomWalk, Ramp, SimulatedPLCConnector, Sine
+)
+from qthmi.main.tag import Tag
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class Generator_Test(unittest.TestCase):
+
+    def test_ramp(self):
+        ramp = Ramp(0.0, 100.0, period=10.0)
+        self.assertEqual(ramp.value(0.0), 0.0)
+        self.assertEqual(ramp.value(5.0), 50.0)
+        self.assertEqual(ramp.value(12.5), 25.0)
+
+    def test_sine(self):
+        sine = Sine(amplitude=2.0, period=4.0, offset=1.0)
+        self.assertAlmostEqual(sine.value(0.0), 1.0)
+        self.assertAlmostEqual(sine.value(1.0), 3.0)
+        self.assertAlmostEqual(sine.value(3.0), -1.0)
+
+    def test_random_walk_stays_in_limits(self):
+        walk = RandomWalk(step=5.0, minimum=-1.0, maximum=1.0, seed=1)
+        values = [walk.value(0.0) for _ in range(100)]
+        self.assertTrue(all(-1.0 <= v <= 1.0 for v in values))
+        self.assertGreater(len(set(values)), 1)
+
+    def test_bit_pattern(self):
+        pattern = BitPattern([0, 1, 6], period=0.5)
+        self.assertEqual(
+            [pattern.value(t) for t in (0.0, 0.5, 1.2, 1.5)], [0, 1, 6, 0]
+        )
+
+
+class SimulatedPLCConnector_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = SimulatedPLCConnector(size=1000, seed=0)
+
+    def test_read_write(self):
+        self.connector.write_to_plc(10, 3.5)
+        self.assertEqual(self.connector.read_from_plc(10), 3.5)
+        self.connector.write_block(20, [1, 2, 3])
+        self.assertEqual(self.connector.read_block(19, 5).tolist(), [0, 1, 2, 3, 0])
+        self.assertEqual(self.connector.requests, 4)
+
+    def test_generators_are_evaluated_on_read(self):
+        self.connector.add_generator(5, Ramp(0.0, 10.0, period=10.0))
+        self.connector.add_generator(500, BitPattern([7]))
+        with mock.patch('qthmi.main.simulation.time.monotonic',
+                        return_value=self.connector._t0 + 3.0):
+            self.assertEqual(self.connector.read_from_plc(5), 3.0)
+            self.assertEqual(self.connector.read_block(0, 10)[5], 3.0)
+            self.assertEqual(self.connector.memory[500], 0)
+            self.assertEqual(self.connector.read_from_plc(500), 7)
+
+        self.connector.remove_generator(5)
+        self.connector.memory[5] = 1.0
+        self.assertEqual(self.connector.read_from_plc(5), 1.0)
+
+    def test_latency(self):
+        self.connector.latency = 0.01
+        self.connector.jitter = 0.005
+        with mock.patch('qthmi.main.simulation.time.sleep') as sleep:
+            self.connector.read_from_plc(0)
+        delay = sleep.call_args[0][0]
+        self.assertTrue(0.005 <= delay <= 0.015)
+
+    def test_injected_errors(self):
+        self.connector.inject_errors(2)
+        self.assertRaises(ConnectionError, self.connector.read_from_plc, 0)
+        self.assertRaises(ConnectionError, self.connector.read_block, 0, 10)
+        self.assertEqual(self.connector.read_from_plc(0), 0.0)
+        self.assertEqual(self.connector.failed_requests, 2)
+
+    def test_error_bursts(self):
+        self.connector.error_rate = 1.0
+        self.connector.burst_length = 3
+        for _ in range(6):
+            self.assertRaises(ConnectionError, self.connector.read_from_plc, 0)
+        self.assertEqual(self.connector.failed_requests, 6)
+
+    def test_poll(self):
+        tags = [Tag("tag{}".format(i), i, datatype=int) for i in range(100)]
+        self.connector.add_tags(tags)
+        self.connector.memory[:100] = range(100, 200)
+        self.connector.poll()
+        self.assertEqual([tag.value for tag in tags], list(range(100, 200)))
+        self.assertEqual(self.connector.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,151 @@
 from qthmi.main.connector import AbstractPLCConnector
-from qthmi.main.tag import TextTag
+from qthmi.main.simulation import SimulatedPLCConnector
+from qthmi.main.tag import Tag, ScaledTag, ScaledTagGroup, TextTag, DEADBAND_PERCENT
 
 __author__ = 'Stefan Lehmann'
 
 import unittest
 
 
+class ChangeDetection_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tag = Tag("tag", 0)
+        self.emitted = []
+        self.tag.value_changed.connect(lambda: self.emitted.append(self.tag.raw_value))
+
+    def test_emit_only_on_change(self):
+        for raw in (1, 1, 2, 2, 2, 1):
+            self.tag.raw_value = raw
+        self.assertEqual(self.emitted, [1, 2, 1])
+        self.assertEqual(self.tag.suppressed_count, 3)
+
+    def test_absolute_deadband(self):
+        self.tag.deadband = 0.5
+        for raw in (10.0, 10.3, 10.6, 10.2):
+            self.tag.raw_value = raw
+        self.assertEqual(self.emitted, [10.0, 10.6])
+        self.assertEqual(self.tag.raw_value, 10.2)
+
+    def test_percent_deadband(self):
+        self.tag.deadband = 10
+        self.tag.deadband_mode = DEADBAND_PERCENT
+        for raw in (100.0, 105.0, 111.0, 120.0, 125.0):
+            self.tag.raw_value = raw
+        self.assertEqual(self.emitted, [100.0, 111.0, 125.0])
+
+    def test_connector_counts_suppressed_emissions(self):
+        connector = TextTag_Test.AddOneTestConnector()
+        connector.read_from_plc = lambda *args: 5
+        connector.add_tag(self.tag)
+        connector.poll()
+        connector.poll()
+        self.assertEqual(connector.suppressed_count, 1)
+
+
+class ValueCache_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.conversions = []
+
+        def datatype(raw):
+            self.conversions.append(raw)
+            return float(raw)
+
+        self.datatype = datatype
+
+    def test_value_is_converted_once(self):
+        tag = Tag("tag", 0, datatype=self.datatype)
+        self.assertIsNone(tag.value)
+        tag.raw_value = 2
+        self.assertEqual([tag.value for _ in range(3)], [2.0, 2.0, 2.0])
+        self.assertEqual(self.conversions, [2])
+
+        tag.raw_value = 3
+        tag.value = 4
+        self.assertEqual(tag.value, 4.0)
+        self.assertEqual(self.conversions, [2, 4])
+
+        tag.datatype = int
+        self.assertIsInstance(tag.value, int)
+
+    def test_scaled_tag(self):
+        tag = ScaledTag("tag", 0, datatype=self.datatype)
+        tag.raw_value = 2
+        self.assertEqual(tag.value, 2.0)
+        tag.scale_factor = 3
+        self.assertEqual(tag.value, 6.0)
+        tag.scale_offset = 1
+        self.assertEqual(tag.value, 7.0)
+        self.assertEqual(tag.value, 7.0)
+        self.assertEqual(self.conversions, [2, 6, 7])
+
+    def test_text_tag(self):
+        tag = TextTag("tag", 0)
+        tag.raw_value = 1
+        self.assertEqual(tag.value, "")
+        tag.add_text(1, "one")
+        self.assertEqual(tag.value, "one")
+        tag.pop_text(1)
+        self.assertEqual(tag.value, "")
+
+
+class ScaledTagGroup_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = SimulatedPLCConnector(size=10)
+        self.tags = []
+        for i in range(3):
+            tag = ScaledTag("tag{}".format(i), i)
+            tag.scale_factor = i + 1
+            tag.scale_offset = 10
+            self.tags.append(self.connector.add_tag(tag))
+        self.tags[2].datatype = int
+        self.group = self.connector.add_processor(ScaledTagGroup(self.tags))
+
+    def test_values_are_computed_once_per_cycle(self):
+        self.assertEqual([tag.value for tag in self.tags], [None, None, None])
+        self.connector.memory[:3] = (1.0, 2.0, 3.5)
+        self.connector.poll()
+        self.assertFalse(self.group.stale[:3].any())
+        self.assertEqual([tag.value for tag in self.tags], [11.0, 14.0, 20])
+        self.assertIsInstance(self.tags[2].value, int)
+        self.assertEqual(self.group.update(), 0)
+
+    def test_values_are_available_in_slots(self):
+        values = []
+        self.tags[1].value_changed.connect(lambda: values.append(self.tags[1].value))
+        self.connector.memory[1] = 4.0
+        self.connector.poll()
+        self.assertEqual(values, [18.0])
+
+    def test_changes_invalidate_cache(self):
+        self.connector.poll()
+        self.tags[0].raw_value = 5
+        self.assertTrue(self.group.stale[0])
+        self.assertEqual(self.tags[0].value, 15)
+
+        self.tags[1].scale_factor = 3
+        self.assertEqual(self.tags[1].value, 10)
+        self.group.update()
+        self.assertEqual(self.group.factors[1], 3)
+
+        self.tags[0].value = 20
+        self.assertEqual(self.tags[0].raw_value, 10)
+        self.assertEqual(self.tags[0].value, 20)
+
+    def test_tag_in_one_group_only(self):
+        self.assertRaises(ValueError, ScaledTagGroup, [self.tags[0]])
+
+    def test_group_grows(self):
+        tags = [ScaledTag("t{}".format(i), i) for i in range(40)]
+        group = ScaledTagGroup(tags)
+        for i, tag in enumerate(tags):
+            tag.update_raw_value(i)
+        group.update()
+        self.assertEqual([tag.value for tag in tags], list(range(40)))
+
+
 class TextTag_Test(unittest.TestCase):
 
     class AddOneTestConnector(AbstractPLCConnector):
@@ -0,0 +1,130 @@
+import unittest
+import numpy as np
+from qthmi.main.connector import AbstractPLCConnector
+from qthmi.main.tagtable import TagTable, plan_table_blocks
+
+
+__author__ = 'Stefan Lehmann'
+
+
+class RingBufferTestConnector(AbstractPLCConnector):
+    def __init__(self):
+        super(RingBufferTestConnector, self).__init__()
+        self.ringbuffer = list(range(100))
+        self.block_requests = []
+
+    def read_from_plc(self, address, datatype):
+        return self.ringbuffer[address]
+
+    def write_to_plc(self, address, value, datatype):
+        self.ringbuffer[address] = value
+
+
+class BlockTestConnector(RingBufferTestConnector):
+    def read_block(self, start, length):
+        self.block_requests.append((start, length))
+        return self.ringbuffer[start:start + length]
+
+
+class TagTable_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.table = TagTable(capacity=2)
+        for i in range(5):
+            self.table.add("tag{}".format(i), 10 + i, datatype=int)
+
+    def test_table_grows(self):
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(self.table.addresses.tolist(), [10, 11, 12, 13, 14])
+        self.assertEqual(self.table.index("tag3"), 3)
+
+    def test_duplicate_name_raises(self):
+        self.assertRaises(KeyError, self.table.add, "tag0", 0)
+
+    def test_views_are_created_on_demand(self):
+        self.assertEqual(list(self.table.views), [])
+        view = self.table.tag("tag2")
+        self.assertIs(self.table.tag("tag2"), view)
+        self.assertEqual(view.address, 12)
+        self.assertIsNone(view.value)
+
+    def test_update_notifies_changed_views(self):
+        view = self.table.tag("tag1")
+        emitted = []
+        view.value_changed.connect(lambda: emitted.append(view.value))
+        changed = self.table.update([0, 1, 2], [5, 6, 7])
+        self.assertEqual(changed.tolist(), [0, 1, 2])
+        changed = self.table.update([0, 1, 2], [5, 8, 7])
+        self.assertEqual(changed.tolist(), [1])
+        self.assertEqual(emitted, [6, 8])
+
+    def test_view_value_is_stored_in_table(self):
+        view = self.table.tag("tag4")
+        view.value = 3
+        self.assertTrue(view.dirty)
+        self.assertEqual(self.table.raw_values[4], 3)
+
+    def test_update_skips_dirty_views(self):
+        self.table.tag("tag1")
+        view = self.table.tag("tag2")
+        view.value = 9
+        changed = self.table.update([0, 1, 2], [5, 6, 7])
+        self.assertEqual(changed.tolist(), [0, 1])
+        self.assertEqual(self.table.raw_values[2], 9)
+
+
+class PlanTableBlocks_Test(unittest.TestCase):
+
+    def test_blocks(self):
+        starts = np.array([20, 0, 1, 2, 9])
+        blocks = plan_table_blocks(starts, np.ones(5, np.int64), max_gap=6)
+        self.assertEqual([(b[0], b[1]) for b in blocks], [(0, 10), (20, 1)])
+        self.assertEqual(blocks[0][2].tolist(), [1, 2, 3, 4])
+
+    def test_max_length(self):
+        blocks = plan_table_blocks(np.arange(10), np.ones(10, np.int64), max_length=4)
+        self.assertEqual([(b[0], b[1]) for b in blocks], [(0, 4), (4, 4), (8, 2)])
+
+
+class TablePoll_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.table = TagTable()
+        for i in (10, 11, 12, 50):
+            self.table.add("tag{}".format(i), i, datatype=int)
+
+    def test_poll_table_single_reads(self):
+        connector = RingBufferTestConnector()
+        connector.add_table(self.table)
+        connector.poll()
+        self.assertEqual(self.table.raw_values.tolist(), [10, 11, 12, 50])
+
+    def test_poll_table_block_reads(self):
+        connector = BlockTestConnector()
+        connector.block_gap = 0
+        connector.add_table(self.table)
+        view = self.table.tag("tag50")
+        connector.poll()
+        self.assertEqual(connector.block_requests, [(10, 3), (50, 1)])
+        self.assertEqual(view.value, 50)
+
+    def test_view_is_written(self):
+        connector = BlockTestConnector()
+        connector.add_table(self.table)
+        self.table.tag("tag11").value = 77
+        connector.poll()
+        self.assertEqual(connector.ringbuffer[11], 77)
+        self.assertEqual(self.table.raw_values[1], 77)
+
+    def test_subscribed_rows_only(self):
+        connector = BlockTestConnector()
+        connector.poll_subscribed_only = True
+        connector.add_table(self.table)
+        view = self.table.tag("tag12")
+        view.subscribe(connector)
+        connector.poll()
+        self.assertEqual(connector.block_requests, [(12, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,13 +31,38 @@ from .tag import Tag
 from . import resources_rc  # noqa: F401
 
 
+class _VisibilityWatcher(QObject):
+    """Subscribe the tag of a HMI widget while the widget is visible."""
+
+    def eventFilter(self, obj: QObject, event: QEvent) -> bool:
+        """Subscribe on show events, unsubscribe on hide events."""
+        tag = getattr(obj, "tag", None)
+        if tag is not None:
+            if event.type() == QEvent.Show:
+                tag.subscribe(obj)
+            elif event.type() == QEvent.Hide:
+                tag.unsubscribe(obj)
+        return False
+
+
 class HMIObject(QObject):
-    """Basic HMI class."""
+    """Basic HMI class.
+
+    HMI widgets subscribe to their tag while they are visible, all other HMI
+    objects subscribe to it as long as they live, see C{Tag.subscribe()}.
+
+    """
 
     def __init__(self, tag: Tag=None, parent: QWidget = None) -> None:
         super(HMIObject, self).__init__(parent)
         self.tag = tag
 
+        if isinstance(self, QWidget):
+            self._visibility_watcher = _VisibilityWatcher(self)
+            self.installEventFilter(self._visibility_watcher)
+        elif tag is not None:
+            tag.subscribe(self)
+
     @abstractmethod
     def read_value_from_tag(self) -> None:
         """Read a value from the tag."""